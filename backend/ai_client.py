@@ -2,133 +2,244 @@
 Unified AI client that supports multiple providers (OpenAI, Gemini)
 """
 import os
-from typing import Optional, Dict, Any, List
-import google.generativeai as genai
-from openai import OpenAI
+import asyncio
+import base64
+import io
+from typing import Optional, Dict, Any, List, Tuple
+from llm_registry import registry as llm_registry
+from ocr_cache import ocr_cache
+from image_preprocessing import IMAGE_DETAIL
 
 class AIClient:
     def __init__(self, provider: str = None):
         self.provider = provider or os.getenv('AI_PROVIDER', 'openai')
-        
+
+        # Clients come from the shared registry so their connection pools
+        # are reused across AIClient instances
         if self.provider == 'gemini':
-            genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
             self.model_name = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
-            self.client = genai.GenerativeModel(self.model_name)
+            self.client = llm_registry.get_gemini_model(self.model_name)
         elif self.provider == 'openai':
-            self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+            self.client, self.async_client = llm_registry.get_openai_clients()
             self.model_name = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
         else:
             raise ValueError(f"Unsupported AI provider: {self.provider}")
-    
+
+    def _build_gemini_request(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        response_format: Optional[Dict]
+    ) -> Tuple[Any, str]:
+        """
+        Convert OpenAI-style messages into a Gemini model and prompt
+        """
+        prompt_parts = []
+        system_instruction = None
+
+        for msg in messages:
+            if msg['role'] == 'system':
+                system_instruction = msg['content']
+            elif msg['role'] == 'user':
+                prompt_parts.append(msg['content'])
+            elif msg['role'] == 'assistant':
+                prompt_parts.append(f"Assistant: {msg['content']}")
+
+        # Combine parts
+        full_prompt = "\n\n".join(prompt_parts)
+
+        # Configure generation
+        generation_config = {'temperature': temperature}
+        if max_tokens is not None:
+            generation_config['max_output_tokens'] = max_tokens
+
+        # For JSON mode, add instruction to the prompt instead of config
+        # (older SDK versions may not support response_mime_type)
+        if response_format and response_format.get('type') == 'json_object':
+            full_prompt = full_prompt + "\n\nIMPORTANT: Return your response as valid JSON only. Do not include any text before or after the JSON."
+
+        # Reuse a cached model for this system instruction and config
+        model = llm_registry.get_gemini_model(
+            self.model_name,
+            system_instruction=system_instruction,
+            generation_config=generation_config
+        )
+
+        return model, full_prompt
+
+    def _build_openai_chat_kwargs(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        response_format: Optional[Dict],
+        model: Optional[str]
+    ) -> Dict[str, Any]:
+        kwargs = {
+            'model': model or self.model_name,
+            'messages': messages,
+            'temperature': temperature
+        }
+
+        if max_tokens is not None:
+            kwargs['max_tokens'] = max_tokens
+
+        if response_format:
+            kwargs['response_format'] = response_format
+
+        return kwargs
+
+    def _build_openai_vision_kwargs(self, prompt: str, image_data: bytes, mime_type: str) -> Dict[str, Any]:
+        # Encode image to base64
+        base64_image = base64.b64encode(image_data).decode('utf-8')
+
+        return {
+            'model': "gpt-4o-mini",
+            'messages': [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{base64_image}",
+                                "detail": IMAGE_DETAIL
+                            }
+                        }
+                    ]
+                }
+            ],
+            'max_tokens': 1000
+        }
+
     def chat_completion(
-        self, 
-        messages: List[Dict[str, str]], 
+        self,
+        messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_tokens: int = 4000,
-        response_format: Optional[Dict] = None
+        max_tokens: Optional[int] = 4000,
+        response_format: Optional[Dict] = None,
+        model: Optional[str] = None
     ) -> str:
         """
         Send a chat completion request to the configured AI provider
         """
         if self.provider == 'gemini':
-            # Convert messages to Gemini format
-            prompt_parts = []
-            system_instruction = None
-            
-            for msg in messages:
-                if msg['role'] == 'system':
-                    system_instruction = msg['content']
-                elif msg['role'] == 'user':
-                    prompt_parts.append(msg['content'])
-                elif msg['role'] == 'assistant':
-                    prompt_parts.append(f"Assistant: {msg['content']}")
-            
-            # Combine parts
-            full_prompt = "\n\n".join(prompt_parts)
-            
-            # Configure generation
-            generation_config = {
-                'temperature': temperature,
-                'max_output_tokens': max_tokens,
-            }
-            
-            # For JSON mode, add instruction to the prompt instead of config
-            # (older SDK versions may not support response_mime_type)
-            if response_format and response_format.get('type') == 'json_object':
-                full_prompt = full_prompt + "\n\nIMPORTANT: Return your response as valid JSON only. Do not include any text before or after the JSON."
-            
-            # Create model with system instruction if provided
-            if system_instruction:
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    system_instruction=system_instruction,
-                    generation_config=generation_config
-                )
-            else:
-                model = genai.GenerativeModel(
-                    self.model_name,
-                    generation_config=generation_config
-                )
-            
-            response = model.generate_content(full_prompt)
+            gemini_model, full_prompt = self._build_gemini_request(
+                messages, temperature, max_tokens, response_format
+            )
+            response = gemini_model.generate_content(full_prompt)
             return response.text
-            
+
         elif self.provider == 'openai':
-            kwargs = {
-                'model': self.model_name,
-                'messages': messages,
-                'temperature': temperature,
-                'max_tokens': max_tokens
-            }
-            
-            if response_format:
-                kwargs['response_format'] = response_format
-            
+            kwargs = self._build_openai_chat_kwargs(
+                messages, temperature, max_tokens, response_format, model
+            )
             response = self.client.chat.completions.create(**kwargs)
             return response.choices[0].message.content
-    
+
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = 4000,
+        response_format: Optional[Dict] = None,
+        model: Optional[str] = None
+    ) -> str:
+        """
+        Async variant of chat_completion that does not block the event loop
+        """
+        if self.provider == 'gemini':
+            gemini_model, full_prompt = self._build_gemini_request(
+                messages, temperature, max_tokens, response_format
+            )
+            response = await gemini_model.generate_content_async(full_prompt)
+            return response.text
+
+        elif self.provider == 'openai':
+            kwargs = self._build_openai_chat_kwargs(
+                messages, temperature, max_tokens, response_format, model
+            )
+            response = await self.async_client.chat.completions.create(**kwargs)
+            return response.choices[0].message.content
+
+    def _vision_cache_scope(self, prompt: str) -> str:
+        model = self.model_name if self.provider == 'gemini' else "gpt-4o-mini"
+        return ocr_cache.scope(self.provider, model, prompt)
+
+    def _vision_cache_get(self, prompt: str, image_data: bytes, use_cache: bool) -> Tuple[Optional[str], bool]:
+        """(cached text or None, whether to store the result)."""
+        if not ocr_cache.enabled:
+            return None, False
+        if not use_cache:
+            ocr_cache.record_bypass()
+            return None, False
+        return ocr_cache.get(self._vision_cache_scope(prompt), image_data), True
+
     def vision_completion(
         self,
         prompt: str,
         image_data: bytes,
-        mime_type: str = "image/jpeg"
+        mime_type: str = "image/jpeg",
+        use_cache: bool = True
     ) -> str:
         """
-        Send an image + text prompt to the AI for vision tasks
+        Send an image + text prompt to the AI for vision tasks.
+        Results are cached by image content (see ocr_cache).
         """
+        cached, store = self._vision_cache_get(prompt, image_data, use_cache)
+        if cached is not None:
+            return cached
+
         if self.provider == 'gemini':
             import PIL.Image
-            import io
-            
+
             # Convert bytes to PIL Image
             image = PIL.Image.open(io.BytesIO(image_data))
-            
+
             # Generate content with image
             response = self.client.generate_content([prompt, image])
-            return response.text
-            
+            text = response.text
+
         elif self.provider == 'openai':
-            import base64
-            
-            # Encode image to base64
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-            
             response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
+                **self._build_openai_vision_kwargs(prompt, image_data, mime_type)
             )
-            return response.choices[0].message.content
+            text = response.choices[0].message.content
+
+        if store:
+            ocr_cache.set(self._vision_cache_scope(prompt), image_data, text)
+        return text
+
+    async def avision_completion(
+        self,
+        prompt: str,
+        image_data: bytes,
+        mime_type: str = "image/jpeg",
+        use_cache: bool = True
+    ) -> str:
+        """
+        Async variant of vision_completion that does not block the event loop
+        """
+        # Perceptual hashing decodes the image, so look up off the event loop
+        cached, store = await asyncio.to_thread(self._vision_cache_get, prompt, image_data, use_cache)
+        if cached is not None:
+            return cached
+
+        if self.provider == 'gemini':
+            import PIL.Image
+
+            image = PIL.Image.open(io.BytesIO(image_data))
+            response = await self.client.generate_content_async([prompt, image])
+            text = response.text
+
+        elif self.provider == 'openai':
+            response = await self.async_client.chat.completions.create(
+                **self._build_openai_vision_kwargs(prompt, image_data, mime_type)
+            )
+            text = response.choices[0].message.content
+
+        if store:
+            await asyncio.to_thread(ocr_cache.set, self._vision_cache_scope(prompt), image_data, text)
+        return text
@@ -0,0 +1,283 @@
+"""
+Stub LLM providers and sample data shared by the benchmark scripts.
+
+The fakes mimic just enough of the LangChain chat model surface
+(with_structured_output / ainvoke) to exercise the planner code paths
+without network access. Latency is simulated with asyncio.sleep so the
+event loop behaves as it would while waiting on a real provider.
+"""
+
+import asyncio
+import atexit
+import base64
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# The provider clients refuse to construct without a key; the fakes never use it
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+# Stub responses must never land in the real caches or saved trees: every
+# SQLite file the app opens goes to a scratch directory removed on exit
+BENCH_DATA_DIR = tempfile.mkdtemp(prefix="planner-bench-")
+atexit.register(shutil.rmtree, BENCH_DATA_DIR, ignore_errors=True)
+for variable, filename in (
+    ("LLM_CACHE_DB_PATH", "llm_cache.db"),
+    ("REFINE_MEMO_DB_PATH", "refine_memo.db"),
+    ("OCR_CACHE_DB_PATH", "ocr_cache.db"),
+    ("TASK_TREE_DB_PATH", "task_trees.db"),
+):
+    os.environ[variable] = os.path.join(BENCH_DATA_DIR, filename)
+
+from prompts import prompt_text  # noqa: E402
+
+
+def make_tree(categories: int = 3, projects: int = 2, tasks: int = 3, subtasks: int = 2) -> Dict[str, Any]:
+    """Build a synthetic task tree with the requested fan-out at each level."""
+    return {
+        "categories": [
+            {
+                "name": f"Category {c}",
+                "projects": [
+                    {
+                        "name": f"Project {c}.{p}",
+                        "dependencies": [],
+                        "tasks": [
+                            {
+                                "name": f"Task {c}.{p}.{t}",
+                                "dependencies": [f"Task {c}.{p}.{t - 1}"] if t else [],
+                                "subtasks": [
+                                    {"name": f"Subtask {c}.{p}.{t}.{s}", "dependencies": []}
+                                    for s in range(subtasks)
+                                ],
+                            }
+                            for t in range(tasks)
+                        ],
+                    }
+                    for p in range(projects)
+                ],
+            }
+            for c in range(categories)
+        ]
+    }
+
+
+OUTLINE_LINE = re.compile(
+    r"^(?P<marker>## |# |  - |- )(?P<name>.*?)(?: \[(?P<handle>[cpts]\d+)\])?(?: \(after: (?P<after>.*)\))?$"
+)
+OUTLINE_LEVELS = {"# ": 0, "## ": 1, "- ": 2, "  - ": 3}
+OUTLINE_CHILD_KEYS = ("projects", "tasks", "subtasks", None)
+
+
+def parse_tree_outline(outline: str) -> Dict[str, Any]:
+    """
+    Parse a tree_outline outline back into a task tree (handles become
+    ids), so stubs can answer with the items a prompt sent. Lines that are
+    not outline items are ignored.
+    """
+    task_tree: Dict[str, Any] = {"categories": []}
+    parents: List[Optional[Dict[str, Any]]] = [None, None, None]
+
+    for line in outline.splitlines():
+        match = OUTLINE_LINE.match(line)
+        if not match:
+            continue
+        level = OUTLINE_LEVELS[match.group("marker")]
+        after = match.group("after")
+        node: Dict[str, Any] = {"id": match.group("handle"), "name": match.group("name")}
+        if OUTLINE_CHILD_KEYS[level]:
+            node[OUTLINE_CHILD_KEYS[level]] = []
+        if level:
+            node["dependencies"] = after.split("; ") if after else []
+            parent = parents[level - 1]
+            if parent is None:
+                continue
+            parent[OUTLINE_CHILD_KEYS[level - 1]].append(node)
+        else:
+            task_tree["categories"].append(node)
+        if level < 3:
+            parents[level] = node
+            for deeper in range(level + 1, 3):
+                parents[deeper] = None
+
+    return task_tree
+
+
+def make_brain_dump(words: int) -> str:
+    """Build a bullet-list brain dump of roughly the requested word count."""
+    lines = []
+    count = 0
+    i = 0
+    while count < words:
+        line = f"- item {i}: finish the chores for project {i % 17} before the weekend"
+        lines.append(line)
+        count += len(line.split())
+        i += 1
+        if i % 12 == 0:
+            lines.append("")
+    return "\n".join(lines)
+
+
+def make_photo(
+    seed: int,
+    size: tuple = (4032, 3024),
+    brightness: float = 1.0,
+    shift: int = 0,
+    quality: int = 95
+) -> bytes:
+    """
+    JPEG of a noisy off-white page with rows of dark scribbles (one layout
+    per seed), saved like a phone camera would: large, high quality, with
+    an EXIF rotation. brightness/shift/quality vary a re-shot of the same page.
+    """
+    rng = random.Random(seed)
+    # Sensor noise is seeded too (differently for each re-shot) so runs are repeatable
+    noise = random.Random(f"{seed}/{brightness}/{shift}/{quality}").randbytes(size[0] * size[1])
+    image = Image.frombytes("L", size, noise).convert("RGB")
+    image = Image.blend(image, Image.new("RGB", size, (236, 230, 214)), 0.85)
+    draw = ImageDraw.Draw(image)
+    for row in range(140, size[1] - 140, 150):
+        x = 200
+        while x < size[0] - 400:
+            width = rng.randint(80, 360)
+            points = [(x + shift + i * 12, row + shift + rng.randint(-30, 30)) for i in range(width // 12)]
+            draw.line(points, fill=(30, 30, 60), width=7)
+            x += width + rng.randint(40, 120)
+    image = image.filter(ImageFilter.GaussianBlur(1.2))
+    if brightness != 1.0:
+        image = ImageEnhance.Brightness(image).enhance(brightness)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=quality, exif=exif)
+    return output.getvalue()
+
+def default_responder(schema: type, prompt: Any) -> Any:
+    """Build a plausible structured response for any planner output schema."""
+    fields = getattr(schema, "model_fields", {})
+    if "categories" in fields:
+        return schema.model_validate(make_tree())
+    if "detailed_tasks" in fields:
+        tasks = [{"name": f"Task {i}", "time": 30, "status": "Ready"} for i in range(10)]
+        return schema.model_validate({"detailed_tasks": tasks, "total_time": 300})
+    if "final_plan" in fields:
+        tasks = [{"name": f"Task {i}", "time": 30, "status": "Ready"} for i in range(10)]
+        return schema.model_validate({"final_plan": tasks})
+    raise ValueError(f"No fake response for schema {schema.__name__}")
+
+
+class FakeStructuredLLM:
+    def __init__(self, parent: "FakeChatModel", schema: type):
+        self.parent = parent
+        self.schema = schema
+
+    async def ainvoke(self, prompt: Any, config: Optional[Dict] = None) -> Any:
+        # Responders and latency functions see the prompt as one text, system message first
+        prompt = prompt_text(prompt)
+        self.parent.calls += 1
+        await asyncio.sleep(self.parent.latency_for(prompt))
+        return self.parent.responder(self.schema, prompt)
+
+    def invoke(self, prompt: Any, config: Optional[Dict] = None) -> Any:
+        prompt = prompt_text(prompt)
+        self.parent.calls += 1
+        time.sleep(self.parent.latency_for(prompt))
+        return self.parent.responder(self.schema, prompt)
+
+
+class FakeChunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """Drop-in stand-in for ChatOpenAI / ChatGoogleGenerativeAI."""
+
+    def __init__(
+        self,
+        latency: Any = 0.2,
+        responder: Callable[[type, Any], Any] = default_responder,
+        stream_tree: Optional[Dict[str, Any]] = None,
+        stream_chunks: int = 200
+    ):
+        self.latency = latency
+        self.responder = responder
+        self.stream_tree = stream_tree or make_tree()
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+
+    def latency_for(self, prompt: Any) -> float:
+        """Latency is either fixed or a function of the prompt."""
+        return self.latency(prompt) if callable(self.latency) else self.latency
+
+    def with_structured_output(self, schema: type, **kwargs: Any) -> FakeStructuredLLM:
+        return FakeStructuredLLM(self, schema)
+
+    def bind(self, **kwargs: Any) -> "FakeChatModel":
+        return self
+
+    async def astream(self, prompt: Any, config: Optional[Dict] = None):
+        """Emit the JSON of stream_tree in even chunks spread over latency."""
+        self.calls += 1
+        text = json.dumps(self.stream_tree)
+        size = max(1, len(text) // self.stream_chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        for piece in pieces:
+            await asyncio.sleep(self.latency / len(pieces))
+            yield FakeChunk(piece)
+
+
+class FakeVisionClient:
+    """
+    Stand-in for the OpenAI client's chat.completions.create on vision
+    requests: sleeps for latency and answers with responder(image bytes).
+    """
+
+    def __init__(self, latency: float = 1.0, responder: Optional[Callable[[bytes], str]] = None):
+        self.latency = latency
+        self.responder = responder or (lambda image: f"text of a {len(image)}-byte image")
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.calls += 1
+        url = kwargs["messages"][0]["content"][1]["image_url"]["url"]
+        image = base64.b64decode(url.split(",", 1)[1])
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content=self.responder(image))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def token_counter() -> tuple:
+    """
+    (count(text) -> tokens, description). Uses tiktoken's cl100k_base
+    encoding when it can be loaded, otherwise ~4 characters per token.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return (lambda text: len(encoding.encode(text))), "tiktoken cl100k_base"
+    except Exception:
+        return (lambda text: (len(text) + 3) // 4), "estimate (4 chars/token)"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
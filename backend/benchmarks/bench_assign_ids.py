@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+ID-assignment time on a large task tree: f-string path keys vs. name index.
+
+Builds a ~10k-node tree with IDs, then times giving a regenerated copy
+(same names, no IDs) the existing IDs with the previous f-string-key
+implementation and with assign_ids_to_tree, which is what every merge and
+refine runs. Also times a tree where nothing matches (every node gets a
+fresh UUID).
+
+Usage:
+    python benchmarks/bench_assign_ids.py [--categories 10] [--projects 10] [--tasks 20] [--subtasks 4]
+"""
+
+import argparse
+import copy
+import time
+import uuid
+
+from _fakes import make_tree
+
+import interactive_planner
+from task_tree_store import node_counts
+
+
+def legacy_assign_ids(task_tree: dict, existing_tree: dict = None) -> dict:
+    """The f-string path-key implementation assign_ids_to_tree used to have."""
+    existing_map = {}
+    if existing_tree:
+        for cat in existing_tree.get('categories', []):
+            existing_map[f"cat:{cat.get('name')}"] = cat.get('id')
+            for proj in cat.get('projects', []):
+                existing_map[f"proj:{cat.get('name')}:{proj.get('name')}"] = proj.get('id')
+                for task in proj.get('tasks', []):
+                    existing_map[f"task:{cat.get('name')}:{proj.get('name')}:{task.get('name')}"] = task.get('id')
+                    for subtask in task.get('subtasks', []):
+                        sub_key = f"sub:{cat.get('name')}:{proj.get('name')}:{task.get('name')}:{subtask.get('name')}"
+                        existing_map[sub_key] = subtask.get('id')
+
+    for cat in task_tree.get('categories', []):
+        cat['id'] = existing_map.get(f"cat:{cat.get('name')}") or str(uuid.uuid4())
+        for proj in cat.get('projects', []):
+            proj['id'] = existing_map.get(f"proj:{cat.get('name')}:{proj.get('name')}") or str(uuid.uuid4())
+            for task in proj.get('tasks', []):
+                task_key = f"task:{cat.get('name')}:{proj.get('name')}:{task.get('name')}"
+                task['id'] = existing_map.get(task_key) or str(uuid.uuid4())
+                for subtask in task.get('subtasks', []):
+                    sub_key = f"sub:{cat.get('name')}:{proj.get('name')}:{task.get('name')}:{subtask.get('name')}"
+                    subtask['id'] = existing_map.get(sub_key) or str(uuid.uuid4())
+    return task_tree
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--subtasks", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    shape = (args.categories, args.projects, args.tasks, args.subtasks)
+    existing = legacy_assign_ids(make_tree(*shape))
+    print(f"Tree: {sum(node_counts(existing))} nodes")
+    # Same names with IDs stripped, as when a regenerated tree comes back from the model
+    fresh = make_tree(*shape)
+    renamed = make_tree(*shape)
+    for category in renamed["categories"]:
+        category["name"] += " (renamed)"
+
+    print(f"{'case':<34} {'f-string keys':>14} {'name index':>11}")
+    for label, tree, keep_ids in (
+        ("all names match", fresh, False),
+        ("nothing matches", renamed, False),
+    ):
+        copies = [copy.deepcopy(tree) for _ in range(args.repeat * 2)]
+        legacy = best_of(lambda: legacy_assign_ids(copies.pop(), existing), args.repeat)
+        current = best_of(
+            lambda: interactive_planner.assign_ids_to_tree(copies.pop(), existing, keep_ids=keep_ids), args.repeat
+        )
+        print(f"{label:<34} {legacy * 1000:>11.1f} ms {current * 1000:>8.1f} ms  ({current / legacy:.0%})")
+
+    assert interactive_planner.assign_ids_to_tree(copy.deepcopy(fresh), existing) == existing, \
+        "IDs were not preserved by name path"
+
+
+if __name__ == "__main__":
+    main()
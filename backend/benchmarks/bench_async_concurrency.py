@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Throughput of /api/create-task-tree as client concurrency grows.
+
+Runs the FastAPI app in-process against a stub LLM with a fixed latency
+and fires batches of concurrent requests at it. With the async LLM path a
+single worker should scale roughly linearly with concurrency, and /health
+should keep answering while the planner calls are in flight.
+
+Usage:
+    python benchmarks/bench_async_concurrency.py [--latency 0.5] [--levels 1,2,4,8,16,32]
+"""
+
+import argparse
+import asyncio
+import time
+
+from _fakes import FakeChatModel, percentile
+
+import httpx
+from llm_registry import registry as llm_registry
+from main import app
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int) -> dict:
+    async def one_request(index: int) -> float:
+        # Distinct prompts, so requests are neither cached nor coalesced (see single_flight)
+        payload = {"prompt": f"Clean the bathroom\nStudy for exam\nPlan meals for the week\nRequest {concurrency}.{index}"}
+        started = time.perf_counter()
+        response = await client.post("/api/create-task-tree", json=payload)
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    async def probe_health() -> float:
+        # Give the planner requests a head start so the probe lands mid-flight
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        response = await client.get("/health")
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(probe_health(), *[one_request(index) for index in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    health_latency, latencies = results[0], results[1:]
+
+    return {
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput": concurrency / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "health": health_latency,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated LLM latency in seconds")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma-separated concurrency levels")
+    args = parser.parse_args()
+
+    fake = FakeChatModel(latency=args.latency)
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"Simulated LLM latency: {args.latency:.2f}s")
+        print(f"{'conc':>5} {'elapsed s':>10} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'/health ms':>11}")
+        for level in (int(x) for x in args.levels.split(",")):
+            r = await run_level(client, level)
+            print(
+                f"{r['concurrency']:>5} {r['elapsed']:>10.2f} {r['throughput']:>8.2f} "
+                f"{r['p50']:>7.2f} {r['p95']:>7.2f} {r['health'] * 1000:>11.1f}"
+            )
+        print(f"LLM calls: {fake.calls}, registry: {llm_registry.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Multi-page OCR: one request per page vs. the batch endpoint.
+
+The vision call is stubbed with a per-page latency (pages take between
+--min-latency and --max-latency seconds) and one page that fails. The
+sequential mode posts each page to /api/extract-text-from-image in turn,
+as the frontend used to; the batch mode posts them all to
+/api/extract-text-from-images and reads its event stream. Batch
+wall-clock time should be close to the slowest page, not the sum. Exits
+non-zero if any page other than the designed failing one errors.
+
+Usage:
+    python benchmarks/bench_batch_ocr.py [--pages 8] [--min-latency 1] [--max-latency 3]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import hashlib
+import json
+import random
+import sys
+import time
+
+import _fakes  # noqa: F401  (puts backend/ on sys.path)
+
+import httpx
+import uvicorn
+from PIL import Image
+
+import ai_client
+from image_preprocessing import preprocess_image
+from main import OCR_BATCH_CONCURRENCY, app
+
+
+def page_image(index: int) -> bytes:
+    # A shade per page, so pages stay distinct after downscaling and grayscale
+    shade = 240 - index * 3 % 180
+    output = io.BytesIO()
+    Image.new("RGB", (1200 + index, 1600), (shade, shade, shade)).save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def install_stub(pages: list, latencies: dict, failing: int) -> None:
+    """Replace the vision call with a sleep keyed by a hash of the image the endpoint sends."""
+    # The endpoint sends the pre-processed image (or the original, with pre-processing off)
+    indexes = {}
+    for index, (_, data) in enumerate(pages):
+        indexes[digest(data)] = index
+        indexes[digest(preprocess_image(data).data)] = index
+
+    async def avision_completion(self, prompt, image_data, mime_type="image/jpeg", use_cache=True):
+        index = indexes[digest(image_data)]
+        await asyncio.sleep(latencies[index])
+        if index == failing:
+            raise RuntimeError("vision model timed out")
+        return f"Page {index} text"
+
+    ai_client.AIClient.avision_completion = avision_completion
+
+
+async def sequential(client: httpx.AsyncClient, pages: list) -> tuple:
+    """Returns (seconds, indexes of the pages that failed)."""
+    started = time.perf_counter()
+    failed = []
+    for index, (name, data) in enumerate(pages):
+        response = await client.post("/api/extract-text-from-image", files={"file": (name, data, "image/jpeg")})
+        if response.status_code != 200:
+            failed.append(index)
+    return time.perf_counter() - started, failed
+
+
+async def batch(client: httpx.AsyncClient, pages: list) -> tuple:
+    """Returns (seconds, indexes of the pages that failed, seconds to the first page)."""
+    started = time.perf_counter()
+    files = [("files", (name, data, "image/jpeg")) for name, data in pages]
+    done = set()
+    first = None
+    async with client.stream("POST", "/api/extract-text-from-images", files=files) as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event in ("page", "page_error"):
+                first = first or time.perf_counter() - started
+                page = json.loads(line[len("data: "):])
+                if event == "page" and page["text"]:
+                    done.add(page["index"])
+    return time.perf_counter() - started, sorted(set(range(len(pages))) - done), first
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--min-latency", type=float, default=1.0)
+    parser.add_argument("--max-latency", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    latencies = {i: rng.uniform(args.min_latency, args.max_latency) for i in range(args.pages)}
+    failing = args.pages // 2
+    pages = [(f"page_{i}.jpg", page_image(i)) for i in range(args.pages)]
+    install_stub(pages, latencies, failing)
+
+    # httpx's in-process ASGI transport buffers whole responses, so serve
+    # the app on a real socket to observe pages as they are flushed
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                seq_seconds, seq_failed = await sequential(client, pages)
+                batch_seconds, batch_failed, first = await batch(client, pages)
+    finally:
+        server.should_exit = True
+        await serve_task
+
+    print(f"{args.pages} pages, latency {args.min_latency}-{args.max_latency}s, page {failing} fails; "
+          f"concurrency {OCR_BATCH_CONCURRENCY}")
+    print(f"{'sum of page latencies':<24} {sum(latencies.values()):>6.2f}s")
+    print(f"{'slowest page':<24} {max(latencies.values()):>6.2f}s")
+    print(f"{'sequential requests':<24} {seq_seconds:>6.2f}s  ({args.pages - len(seq_failed)}/{args.pages} pages)")
+    print(f"{'batch endpoint':<24} {batch_seconds:>6.2f}s  ({args.pages - len(batch_failed)}/{args.pages} pages, "
+          f"first after {first:.2f}s)")
+
+    ok = True
+    for label, failed in (("sequential requests", seq_failed), ("batch endpoint", batch_failed)):
+        if failed != [failing]:
+            print(f"FAIL: {label}: pages {failed} failed, expected only page {failing}")
+            ok = False
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Single-call vs. chunked (map-reduce) ingestion of long brain dumps.
+
+The stub LLM turns every brain-dump line into a task and takes time in
+proportion to the output it would generate (--tokens-per-second), so a
+single call over a 50k-word dump behaves like the real 120 s timeout /
+max_tokens problem. Single mode sends it as one call with the token
+budget disabled; budgeted mode asks for one call too, but the pre-flight
+budget switches to chunks when the output would not fit. Chunked mode
+splits the dump, extracts partial trees concurrently and merges them
+locally.
+
+Usage:
+    python benchmarks/bench_chunked_ingestion.py [--sizes 1000,10000,50000] [--chunk-words 1500]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import re
+import time
+
+from _fakes import FakeChatModel, make_brain_dump
+
+import chunking
+import interactive_planner
+from llm_registry import registry as llm_registry
+from token_budget import load_encodings, token_budget
+
+MAX_OUTPUT_TOKENS = 16000
+TOKENS_PER_TASK = 25
+
+
+def dump_from_prompt(prompt: str) -> str:
+    match = re.search(r"Brain dump:\n---\n(.*?)\n---", prompt, re.S)
+    return match.group(1) if match else ""
+
+
+def tree_from_dump(dump: str) -> dict:
+    """
+    Deterministic stand-in for the model: one task per brain-dump line,
+    cut off where the output would hit max_tokens.
+    """
+    trees = []
+    for line in dump.splitlines()[:MAX_OUTPUT_TOKENS // TOKENS_PER_TASK]:
+        match = re.search(r"item (\d+): (.*) project (\d+)", line)
+        if not match:
+            continue
+        project = int(match.group(3))
+        trees.append({"categories": [{
+            "name": f"Category {project % 5}",
+            "projects": [{"name": f"Project {project}", "tasks": [{"name": f"Item {match.group(1)}"}]}],
+        }]})
+    return chunking.merge_task_trees(trees)
+
+
+def output_tokens(prompt: str) -> int:
+    return sum(1 for line in dump_from_prompt(prompt).splitlines() if line.strip()) * TOKENS_PER_TASK
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--chunk-words", type=int, default=1500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0,
+                        help="simulated generation speed (real models are ~50-150)")
+    args = parser.parse_args()
+    # As the server does at startup, so budgets use tiktoken counts when it is available
+    load_encodings(interactive_planner.get_llm_config()["model"])
+
+    fake = FakeChatModel(
+        latency=lambda prompt: 0.05 + min(output_tokens(prompt), MAX_OUTPUT_TOKENS) / args.tokens_per_second,
+        responder=lambda schema, prompt: schema.model_validate(tree_from_dump(dump_from_prompt(prompt))),
+    )
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+    interactive_planner.BRAIN_DUMP_CHUNK_CONCURRENCY = args.concurrency
+
+    print(
+        f"Chunk size {args.chunk_words} words, concurrency {args.concurrency}, "
+        f"{args.tokens_per_second:.0f} tok/s, max_tokens {MAX_OUTPUT_TOKENS}"
+    )
+    print(f"{'words':>7} {'mode':>8} {'calls':>6} {'tasks':>13} {'split ms':>9} {'seconds':>8}")
+
+    for words in (int(x) for x in args.sizes.split(",")):
+        dump = make_brain_dump(words)
+        expected = sum(1 for line in dump.splitlines() if line.strip())
+
+        modes = (("single", 10 ** 9, False), ("budgeted", 10 ** 9, True), ("chunked", args.chunk_words, True))
+        for mode, chunk_words, budgeted in modes:
+            token_budget.enabled = budgeted
+            fake.calls = 0
+            split_started = time.perf_counter()
+            chunking.split_brain_dump(dump, chunk_words)
+            split_ms = (time.perf_counter() - split_started) * 1000
+
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                tree = await interactive_planner.create_task_tree(
+                    f"{mode} {words}\n{dump}", use_cache=False, chunk_words=chunk_words
+                )
+            elapsed = time.perf_counter() - started
+
+            tasks = sum(len(p["tasks"]) for c in tree["categories"] for p in c["projects"])
+            captured = f"{tasks}/{expected}"
+            print(f"{words:>7} {mode:>8} {fake.calls:>6} {captured:>13} {split_ms:>9.2f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
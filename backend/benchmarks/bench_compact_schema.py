@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Output tokens and latency: full vs. compact (short-key) output schema.
+
+For the fixture responses in benchmarks/fixtures/ plus a synthetic
+tree, it renders the JSON the model has to write under each schema (the
+full schema with every id/dependencies/subtasks field, as structured
+output emits it; the compact one with short keys and empty fields left
+out) and counts its tokens. It then runs create_task_tree against a stub
+model whose latency is time-to-first-token plus output tokens at
+--tokens-per-second, with COMPACT_OUTPUT_SCHEMA off and on, and reports
+the wall-clock time including the local expansion.
+
+Usage:
+    python benchmarks/bench_compact_schema.py [--tokens-per-second 80] [--ttft 0.4]
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+
+from _fakes import FakeChatModel, FakeStructuredLLM, make_tree, token_counter
+
+import interactive_planner
+from compact_schema import compact_schema_for
+from llm_registry import registry as llm_registry
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def render_output(schema: type, tree: dict) -> str:
+    """The JSON text a model writes for tree under schema."""
+    if schema.__name__.startswith("Compact"):
+        return schema.model_validate(tree).model_dump_json(by_alias=True, exclude_defaults=True)
+    return schema.model_validate(tree).model_dump_json()
+
+
+class DecodeTimedLLM(FakeStructuredLLM):
+    async def ainvoke(self, prompt, config=None):
+        self.parent.calls += 1
+        tokens = self.parent.count(render_output(self.schema, self.parent.tree))
+        await asyncio.sleep(self.parent.ttft + tokens / self.parent.tokens_per_second)
+        return self.schema.model_validate(self.parent.tree)
+
+
+class DecodeTimedModel(FakeChatModel):
+    """Stub whose latency grows with the length of the structured output."""
+
+    def __init__(self, count, ttft: float, tokens_per_second: float):
+        super().__init__(latency=0)
+        self.tree = None
+        self.count = count
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+
+    def with_structured_output(self, schema: type, **kwargs) -> DecodeTimedLLM:
+        return DecodeTimedLLM(self, schema)
+
+
+async def timed_create(compact: bool, repeat: int) -> float:
+    interactive_planner.COMPACT_OUTPUT_SCHEMA = compact
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await interactive_planner.create_task_tree("benchmark brain dump", use_cache=False)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--ttft", type=float, default=0.4, help="time to first token, seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    count, counter_name = token_counter()
+    full_schema = interactive_planner.TaskTreeOutput
+    compact_schema = compact_schema_for(full_schema)
+
+    samples = {
+        os.path.basename(path): json.load(open(path))
+        for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json")))
+    }
+    samples["synthetic 4x3x5x3"] = make_tree(4, 3, 5, 3)
+
+    # One stub for the whole run: the registry caches the runnables built from it
+    fake = DecodeTimedModel(count, args.ttft, args.tokens_per_second)
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+
+    print(f"Token counter: {counter_name}; decode {args.tokens_per_second:.0f} tok/s, ttft {args.ttft}s")
+    print(f"{'sample':<26} {'full tok':>9} {'compact tok':>12} {'saved':>6} {'full s':>8} {'compact s':>10}")
+    for label, tree in samples.items():
+        full_tokens = count(render_output(full_schema, tree))
+        compact_tokens = count(render_output(compact_schema, tree))
+
+        fake.tree = tree
+        full_seconds = asyncio.run(timed_create(False, args.repeat))
+        compact_seconds = asyncio.run(timed_create(True, args.repeat))
+
+        print(f"{label:<26} {full_tokens:>9} {compact_tokens:>12} {1 - compact_tokens / full_tokens:>6.0%} "
+              f"{full_seconds:>8.2f} {compact_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Memory and helper time for a 10k-node task tree: nested dicts vs. CompactTree.
+
+Measures the memory a tree holds while it is retained (as a finished job
+result is), as the nested wire JSON and as a CompactTree built from it,
+then times the helpers on each: conversion to and from the wire JSON,
+format_task_tree_for_display, and carrying IDs from the tree over to a
+regenerated copy, where the CompactTree's name index is built once and
+reused.
+
+Usage:
+    python benchmarks/bench_compact_tree.py [--categories 10] [--projects 10] [--tasks 20] [--subtasks 4]
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from _fakes import make_tree
+
+import interactive_planner
+from compact_tree import CompactTree
+from task_tree_store import node_counts
+
+
+def retained_bytes(build) -> int:
+    """Bytes still allocated after build() returns, for as long as its result is kept."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return current
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--subtasks", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    shape = (args.categories, args.projects, args.tasks, args.subtasks)
+    tree = interactive_planner.assign_ids_to_tree(make_tree(*shape))
+    wire = json.dumps(tree)
+    compact = CompactTree.from_dict(tree)
+    print(f"Tree: {sum(node_counts(tree))} nodes")
+
+    # Both start from freshly parsed JSON, so the names and IDs are counted on each side
+    nested_bytes = retained_bytes(lambda: json.loads(wire))
+    compact_bytes = retained_bytes(lambda: CompactTree.from_dict(json.loads(wire)))
+    print(f"{'retained memory':<34} {nested_bytes / 1e6:>9.2f} MB {compact_bytes / 1e6:>9.2f} MB"
+          f"  ({compact_bytes / nested_bytes:.0%})")
+
+    assert compact.to_dict() == tree, "CompactTree did not round-trip"
+    assert compact.node_counts() == node_counts(tree)
+    assert compact.format_for_display() == interactive_planner.format_task_tree_for_display(tree)
+
+    # What keeping a tree compact costs: one conversion in, one out per read
+    from_dict = best_of(lambda: CompactTree.from_dict(tree), args.repeat)
+    to_dict = best_of(compact.to_dict, args.repeat)
+    print(f"{'CompactTree.from_dict / to_dict':<34} {from_dict * 1000:>9.1f} ms {to_dict * 1000:>9.1f} ms")
+
+    print(f"{'helper':<34} {'nested':>12} {'compact':>12}")
+    rows = (
+        ("format_task_tree_for_display",
+         lambda: interactive_planner.format_task_tree_for_display(tree),
+         lambda: interactive_planner.format_task_tree_for_display(compact)),
+        ("node counts", lambda: node_counts(tree), compact.node_counts),
+    )
+    for label, nested_fn, compact_fn in rows:
+        nested = best_of(nested_fn, args.repeat)
+        current = best_of(compact_fn, args.repeat)
+        print(f"{label:<34} {nested * 1000:>9.1f} ms {current * 1000:>9.1f} ms")
+
+    # ID carry-over to regenerated copies (same names, no IDs), as merges and refines do
+    copies = [make_tree(*shape) for _ in range(args.repeat * 2)]
+    compact.name_index()
+    nested = best_of(lambda: interactive_planner.assign_ids_to_tree(copies.pop(), tree), args.repeat)
+    current = best_of(lambda: interactive_planner.assign_ids_to_tree(copies.pop(), compact), args.repeat)
+    print(f"{'assign_ids_to_tree (index cached)':<34} {nested * 1000:>9.1f} ms {current * 1000:>9.1f} ms")
+
+    assert interactive_planner.assign_ids_to_tree(make_tree(*shape), compact) == tree, \
+        "IDs were not preserved by name path"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Local dependency ordering: graph cost and the LLM calls it replaces.
+
+Times DependencyGraph.from_tree + order + critical_path on synthetic
+trees (every task depends on the previous one in its project) to show
+they scale linearly. Then compares, against stub providers with
+--latency seconds per call, /api/generate-todo with and without its LLM
+grouping pass and the planner workflow with and without the LLM
+consolidation pass.
+
+Usage:
+    python benchmarks/bench_dependency_graph.py [--latency 1.0]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from _fakes import FakeChatModel, make_tree
+
+import httpx
+
+import ai_client
+import main
+import planner_workflow
+from dependency_graph import DependencyGraph
+from llm_registry import registry as llm_registry
+
+
+def time_graph(tree: dict) -> tuple:
+    started = time.perf_counter()
+    graph = DependencyGraph.from_tree(tree)
+    graph.order(leaves_only=True)
+    graph.critical_path()
+    return len(graph.ids), (time.perf_counter() - started) * 1000
+
+
+async def time_todo(tree: dict, llm_pass: bool, latency: float, calls: list) -> float:
+    async def achat_completion(self, messages, **kwargs):
+        calls.append(1)
+        await asyncio.sleep(latency)
+        return json.dumps({"items": ["Group 1: everything"]})
+
+    ai_client.AIClient.achat_completion = achat_completion
+    main.TODO_LLM_PASS = llm_pass
+    main.response_cache.enabled = False
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = await client.post("/api/generate-todo", json={"task_tree": tree})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+
+async def time_planner(llm_pass: bool, fake: FakeChatModel) -> tuple:
+    planner_workflow.CONSOLIDATION_LLM_PASS = llm_pass
+    fake.calls = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await planner_workflow.run_planner("bench brain dump", use_cache=False)
+    return fake.calls, time.perf_counter() - started
+
+
+async def run(latency: float) -> None:
+    print(f"{'tree (cat x proj x task x sub)':<32} {'items':>7} {'ms':>8}")
+    for shape in ((3, 2, 3, 2), (10, 10, 10, 3), (20, 25, 20, 4), (40, 25, 25, 4)):
+        items, ms = time_graph(make_tree(*shape))
+        print(f"{' x '.join(map(str, shape)):<32} {items:>7} {ms:>8.1f}")
+
+    print(f"\nstub LLM latency {latency}s")
+    print(f"{'path':<40} {'LLM calls':>10} {'seconds':>8}")
+    tree = make_tree(4, 3, 4, 2)
+    for label, llm_pass in (("generate-todo, LLM grouping pass", True), ("generate-todo, local order only", False)):
+        calls = []
+        seconds = await time_todo(tree, llm_pass, latency, calls)
+        print(f"{label:<40} {len(calls):>10} {seconds:>8.2f}")
+
+    fake = FakeChatModel(latency=latency)
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+    for label, llm_pass in (("generate-plan, LLM consolidation", True), ("generate-plan, local consolidation", False)):
+        calls, seconds = await time_planner(llm_pass, fake)
+        print(f"{label:<40} {calls:>10} {seconds:>8.2f}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=1.0, help="stub LLM latency per call, seconds")
+    args = parser.parse_args()
+    asyncio.run(run(args.latency))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Planner workflow end to end: three-stage path vs. fused single pass.
+
+Runs run_planner with PLANNER_MODE=staged and =fused against a stub LLM
+that describes the same plan either way: --categories x 2 projects x 3
+tasks, each broken into --steps timed subtasks. Each call's latency is
+--ttft plus its output tokens at --tokens-per-second, plus its input
+tokens (prompt and output schema) at --prefill-per-second, so resending
+earlier stages costs what it would. Reports LLM calls, input and output
+tokens and wall-clock time per mode.
+
+Usage:
+    python benchmarks/bench_fused_planner.py [--categories 3] [--steps 3] [--tokens-per-second 400]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+from _fakes import FakeChatModel, make_tree, token_counter
+
+import planner_workflow
+from llm_registry import registry as llm_registry
+from prompts import prompt_text
+
+STATUSES = ("Ready",) * 6 + ("BLOCKED", "Deferred")
+
+
+def estimate(name: str) -> dict:
+    rng = random.Random(name)
+    return {"time": rng.choice((15, 30, 45, 60, 90)), "status": rng.choice(STATUSES)}
+
+
+def make_responder(categories: int, steps: int):
+    coarse = make_tree(categories, 2, 3, 1)
+    detailed = make_tree(categories, 2, 3, steps)
+    subtasks = [
+        subtask for category in detailed["categories"] for project in category["projects"]
+        for task in project["tasks"] for subtask in task["subtasks"]
+    ]
+
+    def responder(schema: type, prompt: str):
+        if schema is planner_workflow.TaskTreeOutput:
+            return schema.model_validate(coarse)
+        if schema is planner_workflow.TaskTreeRefinementOutput:
+            return schema.model_validate(detailed)
+        if schema is planner_workflow.BreakdownOutput:
+            tasks = [{**subtask, **estimate(subtask["name"])} for subtask in subtasks]
+            total = sum(t["time"] for t in tasks if t["status"] == "Ready")
+            return schema.model_validate({"detailed_tasks": tasks, "total_time": total})
+        if schema is planner_workflow.FusedPlanOutput:
+            plan = json.loads(json.dumps(detailed))
+            for category in plan["categories"]:
+                for project in category["projects"]:
+                    for task in project["tasks"]:
+                        task["subtasks"] = [{**s, **estimate(s["name"])} for s in task["subtasks"]]
+            return schema.model_validate(plan)
+        raise ValueError(f"No bench response for {schema.__name__}")
+
+    return responder
+
+
+class MeteredStructuredLLM:
+    """Answers first, then sleeps for the latency its input and output sizes imply."""
+
+    def __init__(self, parent: "MeteredChatModel", schema: type):
+        self.parent = parent
+        self.schema = schema
+
+    async def ainvoke(self, prompt, config=None):
+        parent = self.parent
+        text = prompt_text(prompt)
+        response = parent.responder(self.schema, text)
+        input_tokens = parent.count(text) + parent.count(json.dumps(self.schema.model_json_schema()))
+        output_tokens = parent.count(response.model_dump_json())
+        parent.calls += 1
+        parent.input_tokens += input_tokens
+        parent.output_tokens += output_tokens
+        await asyncio.sleep(
+            parent.ttft + input_tokens / parent.prefill_per_second + output_tokens / parent.tokens_per_second
+        )
+        return response
+
+
+class MeteredChatModel(FakeChatModel):
+    def __init__(self, responder, ttft: float, tokens_per_second: float, prefill_per_second: float):
+        super().__init__(latency=0, responder=responder)
+        self.count, _ = token_counter()
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.prefill_per_second = prefill_per_second
+        self.input_tokens = self.output_tokens = 0
+
+    def with_structured_output(self, schema: type, **kwargs) -> MeteredStructuredLLM:
+        return MeteredStructuredLLM(self, schema)
+
+
+async def run_mode(mode: str, model: MeteredChatModel) -> tuple:
+    planner_workflow.PLANNER_MODE = mode
+    planner_workflow._planner_graph = None
+    model.calls = model.input_tokens = model.output_tokens = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = await planner_workflow.run_planner("bench brain dump", use_cache=False)
+    seconds = time.perf_counter() - started
+    return model.calls, model.input_tokens, model.output_tokens, seconds, len(state["detailed_tasks"])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--categories", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=3, help="subtasks per task")
+    parser.add_argument("--ttft", type=float, default=0.4, help="seconds before the first output token")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="output tokens per second")
+    parser.add_argument("--prefill-per-second", type=float, default=20000.0, help="input tokens per second")
+    args = parser.parse_args()
+
+    model = MeteredChatModel(
+        make_responder(args.categories, args.steps), args.ttft, args.tokens_per_second, args.prefill_per_second
+    )
+    llm_registry.chat_model_factory = lambda provider, model_name=None, **options: model
+
+    print(f"{args.categories} categories x 2 projects x 3 tasks x {args.steps} steps; ttft {args.ttft}s, "
+          f"{args.tokens_per_second:.0f} output tok/s, {args.prefill_per_second:.0f} input tok/s")
+    print(f"{'mode':<10} {'LLM calls':>10} {'input tok':>10} {'output tok':>11} {'seconds':>8} {'tasks':>6}")
+    results = {}
+    for mode in ("staged", "fused"):
+        results[mode] = await run_mode(mode, model)
+        calls, input_tokens, output_tokens, seconds, tasks = results[mode]
+        print(f"{mode:<10} {calls:>10} {input_tokens:>10} {output_tokens:>11} {seconds:>8.2f} {tasks:>6}")
+    staged, fused = results["staged"], results["fused"]
+    print(f"fused saves {1 - fused[3] / staged[3]:.0%} of the time and "
+          f"{1 - (fused[1] + fused[2]) / (staged[1] + staged[2]):.0%} of the tokens")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of the LangGraph planner graph.
+
+Compares building and compiling the StateGraph on every request against
+reusing the process-wide compiled graph, both in isolation and through a
+full run_planner call against a zero-latency stub LLM (so the numbers are
+pure framework overhead).
+
+Usage:
+    python benchmarks/bench_graph_overhead.py [--iterations 200]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from _fakes import FakeChatModel
+
+import planner_workflow
+from llm_registry import registry as llm_registry
+
+
+def time_sync(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+async def time_async(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - started) / iterations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    llm_registry.chat_model_factory = lambda provider, model, **options: FakeChatModel(latency=0)
+    planner_workflow.warm_up_planner_graph()
+
+    build = time_sync(planner_workflow.create_planner_graph, args.iterations)
+    cached = time_sync(planner_workflow.get_planner_graph, args.iterations)
+
+    async def run_rebuilding():
+        await planner_workflow.create_planner_graph().ainvoke({"brain_dump": "bench"})
+
+    async def run_cached():
+        await planner_workflow.run_planner("bench", use_cache=False)
+
+    # The nodes print progress on every call; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        rebuild_run = await time_async(run_rebuilding, args.iterations)
+        cached_run = await time_async(run_cached, args.iterations)
+
+    print(f"Iterations: {args.iterations}")
+    print(f"{'':<28} {'ms/request':>11}")
+    print(f"{'create_planner_graph()':<28} {build * 1000:>11.3f}")
+    print(f"{'get_planner_graph()':<28} {cached * 1000:>11.3f}")
+    print(f"{'run with per-request build':<28} {rebuild_run * 1000:>11.3f}")
+    print(f"{'run with compiled graph':<28} {cached_run * 1000:>11.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
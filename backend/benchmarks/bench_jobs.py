@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Job API: connection time, backpressure, progress events and cancellation.
+
+Against a stub LLM with --latency seconds per call:
+
+1. --requests concurrent generate-plan requests, sent to the blocking
+   endpoint and as jobs (submit, then poll every --poll seconds).
+   Reports wall-clock time and the total seconds HTTP requests were open:
+   a blocking request holds its connection for the whole plan, a job only
+   for the submit and each poll.
+2. A burst of --burst submissions against a pool of 2 workers and a queue
+   of 4, counting 202s and 429s.
+3. The progress events of one generate-plan job (one per LangGraph node).
+4. Cancelling a running job: how long DELETE takes to settle it and how
+   many LLM calls were started after the cancel.
+
+Usage:
+    python benchmarks/bench_jobs.py [--requests 20] [--latency 0.5] [--poll 0.25] [--burst 12]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from _fakes import FakeChatModel
+
+import httpx
+
+import jobs
+import main
+from llm_registry import registry as llm_registry
+
+# Bypass the response cache so every plan waits on the stub LLM
+PLAN_BODY = {"prompt": "bench brain dump", "bypass_cache": True}
+
+
+class Timed:
+    """Sums the seconds every request made through it was open."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.open_seconds = 0.0
+        self.requests = 0
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.open_seconds += time.perf_counter() - started
+        self.requests += 1
+        return response
+
+
+async def wait_for(timed: Timed, job_id: str, poll: float) -> dict:
+    while True:
+        job = (await timed.request("GET", f"/api/jobs/{job_id}")).json()
+        if job["status"] in jobs.FINISHED_STATUSES:
+            return job
+        await asyncio.sleep(poll)
+
+
+async def compare_connections(client: httpx.AsyncClient, count: int, poll: float) -> list:
+    lines = [f"{'generate-plan x ' + str(count):<28} {'seconds':>8} {'HTTP requests':>14} {'connection s':>13}"]
+
+    timed = Timed(client)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(
+        timed.request("POST", "/api/generate-plan", json=PLAN_BODY) for _ in range(count)
+    ))
+    assert all(r.status_code == 200 for r in responses)
+    lines.append(f"{'blocking endpoint':<28} {time.perf_counter() - started:>8.2f} {timed.requests:>14} "
+                 f"{timed.open_seconds:>13.2f}")
+
+    jobs.job_manager = jobs.JobManager(workers=count, queue_max=count)
+    timed = Timed(client)
+    started = time.perf_counter()
+
+    async def submit_and_wait():
+        submitted = await timed.request("POST", "/api/jobs/generate-plan", json=PLAN_BODY)
+        assert submitted.status_code == 202, submitted.text
+        return await wait_for(timed, submitted.json()["job_id"], poll)
+
+    results = await asyncio.gather(*(submit_and_wait() for _ in range(count)))
+    assert all(job["status"] == "succeeded" for job in results)
+    lines.append(f"{f'jobs, polled every {poll}s':<28} {time.perf_counter() - started:>8.2f} {timed.requests:>14} "
+                 f"{timed.open_seconds:>13.2f}")
+    jobs.job_manager.close()
+    return lines
+
+
+async def backpressure(client: httpx.AsyncClient, burst: int) -> list:
+    jobs.job_manager = jobs.JobManager(workers=2, queue_max=4)
+    responses = await asyncio.gather(*(
+        client.post("/api/jobs/generate-plan", json=PLAN_BODY) for _ in range(burst)
+    ))
+    accepted = sum(r.status_code == 202 for r in responses)
+    rejected = [r for r in responses if r.status_code == 429]
+    retry_after = rejected[0].headers.get("retry-after") if rejected else "-"
+    jobs.job_manager.close()
+    return [f"burst of {burst} against 2 workers + queue of 4: "
+            f"{accepted} accepted, {len(rejected)} rejected with 429 (Retry-After {retry_after})"]
+
+
+async def progress(client: httpx.AsyncClient) -> list:
+    jobs.job_manager = jobs.JobManager(workers=2, queue_max=10)
+    job_id = (await client.post("/api/jobs/generate-plan", json=PLAN_BODY)).json()["job_id"]
+    # The test transport buffers the stream, so this returns once the job is done
+    stream = (await client.get(f"/api/jobs/{job_id}/events")).text
+    stages = []
+    for block in stream.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        if fields["event"] == "progress":
+            stages.append(json.loads(fields["data"])["stage"])
+        else:
+            stages.append(f"[{fields['event']}]")
+    jobs.job_manager.close()
+    return ["progress events of one generate-plan job:", "  " + " -> ".join(stages)]
+
+
+async def cancellation(client: httpx.AsyncClient, fake: FakeChatModel, latency: float) -> list:
+    jobs.job_manager = jobs.JobManager(workers=2, queue_max=10)
+    job_id = (await client.post("/api/jobs/generate-plan", json=PLAN_BODY)).json()["job_id"]
+    # Let it get into its first LLM call
+    await asyncio.sleep(latency / 2)
+    calls_at_cancel = fake.calls
+    started = time.perf_counter()
+    cancelled = (await client.delete(f"/api/jobs/{job_id}")).json()
+    job = await wait_for(Timed(client), job_id, 0.01)
+    settled_ms = (time.perf_counter() - started) * 1000
+    await asyncio.sleep(latency * 2)
+    stats = jobs.job_manager.stats()
+    jobs.job_manager.close()
+    return [
+        f"cancel a running job: DELETE answered '{cancelled['status']}', settled as '{job['status']}' "
+        f"in {settled_ms:.1f} ms; {fake.calls - calls_at_cancel} LLM call(s) started afterwards",
+        f"job stats: {stats}",
+    ]
+
+
+async def run(args: argparse.Namespace) -> None:
+    fake = FakeChatModel(latency=args.latency)
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+
+    print(f"stub LLM latency {args.latency}s")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for section in (
+            compare_connections(client, args.requests, args.poll),
+            backpressure(client, args.burst),
+            progress(client),
+            cancellation(client, fake, args.latency),
+        ):
+            with contextlib.redirect_stdout(io.StringIO()):
+                lines = await section
+            print("\n".join(lines) + "\n")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM latency per call, seconds")
+    parser.add_argument("--poll", type=float, default=0.25, help="job poll interval, seconds")
+    parser.add_argument("--burst", type=int, default=12)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+OCR cache hit rate and latency for repeated and re-shot uploads.
+
+Each of --pages synthetic phone photos is uploaded to
+/api/extract-text-from-image three times: the original, the exact same
+file again (a re-added panel or a retry), and a re-shot of the same page
+(slightly brighter, shifted and re-encoded, so its bytes differ). The
+vision call is a stub that takes --latency seconds. Runs with the exact
+content-hash cache only and with the perceptual hash on, and reports
+vision calls, hits, wrong-page hits and total time.
+
+Usage:
+    python benchmarks/bench_ocr_cache.py [--pages 6] [--latency 1.5] [--distance 4]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from _fakes import FakeVisionClient, make_photo
+
+import httpx
+
+import ai_client
+from llm_cache import LLMResponseCache
+from llm_registry import registry as llm_registry
+from main import app
+from ocr_cache import OCRCache
+
+PHOTO_SIZE = (2016, 1512)
+
+
+async def run(pages: dict, fake: FakeVisionClient, current: dict) -> tuple:
+    """Upload every variant of every page; returns (seconds, wrong-page answers)."""
+    transport = httpx.ASGITransport(app=app)
+    wrong = 0
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for variant in ("original", "again", "re-shot"):
+            for page, variants in pages.items():
+                current["page"] = page
+                response = await client.post(
+                    "/api/extract-text-from-image", files={"file": (f"{page}.jpg", variants[variant], "image/jpeg")}
+                )
+                response.raise_for_status()
+                wrong += response.json()["text"] != f"text of {page}"
+    return time.perf_counter() - started, wrong
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=1.5, help="stub vision call latency, seconds")
+    parser.add_argument("--distance", type=int, default=4, help="max perceptual hash distance in bits")
+    args = parser.parse_args()
+
+    pages = {
+        f"page {seed}": {
+            "original": make_photo(seed, PHOTO_SIZE),
+            "re-shot": make_photo(seed, PHOTO_SIZE, brightness=1.06, shift=4, quality=88),
+        }
+        for seed in range(args.pages)
+    }
+    for variants in pages.values():
+        variants["again"] = variants["original"]
+
+    current = {}
+    fake = FakeVisionClient(args.latency, responder=lambda image: f"text of {current['page']}")
+    llm_registry.get_openai_clients = lambda api_key=None: (fake, fake)
+
+    uploads = 3 * args.pages
+    print(f"{args.pages} pages x (original, same file again, re-shot); vision latency {args.latency}s")
+    print(f"{'cache':<22} {'uploads':>8} {'vision calls':>13} {'exact':>6} {'perceptual':>11} "
+          f"{'wrong page':>11} {'hit rate':>9} {'seconds':>8}")
+    for label, perceptual in (("none", None), ("exact", False), (f"exact + dHash<={args.distance}", True)):
+        store = LLMResponseCache(db_path=None, enabled=perceptual is not None)
+        cache = OCRCache(store, perceptual=bool(perceptual), max_distance=args.distance)
+        ai_client.ocr_cache = cache
+        fake.calls = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds, wrong = asyncio.run(run(pages, fake, current))
+        stats = cache.stats()
+        print(f"{label:<22} {uploads:>8} {fake.calls:>13} {stats['exact_hits']:>6} {stats['perceptual_hits']:>11} "
+              f"{wrong:>11} {stats['hit_rate']:>9.0%} {seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
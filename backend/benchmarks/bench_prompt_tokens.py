@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Prompt tokens for embedded task trees: dict repr / JSON vs. the outline.
+
+For a few sample tree shapes (with IDs assigned, as trees are when they
+come back from the API) it counts the tokens each encoding adds to a
+prompt: the Python dict repr refine and breakdown used to interpolate,
+json.dumps(indent=2) as used by create, validation and generate-todo,
+and the outline with and without ID handles.
+
+Token counts use tiktoken's cl100k_base encoding when it can be loaded,
+otherwise a 4-characters-per-token estimate.
+
+Usage:
+    python benchmarks/bench_prompt_tokens.py
+"""
+
+import argparse
+import json
+
+from _fakes import make_tree, token_counter
+
+import interactive_planner
+from tree_outline import tree_outline, tree_outline_with_handles
+
+SHAPES = {
+    "small (3x2x3x2)": (3, 2, 3, 2),
+    "medium (5x3x5x3)": (5, 3, 5, 3),
+    "large (10x5x8x4)": (10, 5, 8, 4),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.parse_args()
+
+    count, counter_name = token_counter()
+    print(f"Token counter: {counter_name}")
+    print(f"{'tree':<18} {'dict repr':>10} {'json indent':>12} {'outline+ids':>12} {'outline':>9} {'vs repr':>8}")
+
+    for label, shape in SHAPES.items():
+        tree = interactive_planner.assign_ids_to_tree(make_tree(*shape))
+        as_repr = count(str(tree))
+        as_json = count(json.dumps(tree, indent=2))
+        with_handles = count(tree_outline_with_handles(tree)[0])
+        outline = count(tree_outline(tree))
+        saved = 1 - with_handles / as_repr
+        print(f"{label:<18} {as_repr:>10} {as_json:>12} {with_handles:>12} {outline:>9} {-saved:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Repeat refinement with and without the Merkle-hashed refine memo.
+
+Refines a synthetic tree, edits a single task of the refined result (the
+tree the client sends back) and refines that again. The stub LLM echoes
+each shard back with one extra subtask per task and takes time in
+proportion to the number of tasks it was sent, so the second refine
+should only pay for the one dirty task when the memo is on.
+
+Usage:
+    python benchmarks/bench_refine_memo.py [--categories 4] [--projects 3] [--tasks 8]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import os
+import re
+import tempfile
+import time
+
+from _fakes import FakeChatModel, make_tree, parse_tree_outline
+
+# Keep the response cache in memory so earlier runs don't skew the numbers
+os.environ["LLM_CACHE_DB_PATH"] = ""
+
+import interactive_planner
+from llm_cache import LLMResponseCache
+from llm_registry import registry as llm_registry
+
+SECONDS_PER_TASK = 0.01
+
+
+def shard_from_prompt(prompt: str) -> dict:
+    match = re.search(r"---\n(.*?)\n---", prompt, re.S)
+    return parse_tree_outline(match.group(1))
+
+
+def count_tasks(tree: dict) -> int:
+    return sum(len(p.get("tasks", [])) for c in tree.get("categories", []) for p in c.get("projects", []))
+
+
+class RefineResponder:
+    def __init__(self):
+        self.tasks_sent = 0
+
+    def __call__(self, schema: type, prompt: str):
+        shard = shard_from_prompt(prompt)
+        self.tasks_sent += count_tasks(shard)
+        for category in shard["categories"]:
+            for project in category["projects"]:
+                for task in project["tasks"]:
+                    task["subtasks"] = list(task.get("subtasks", [])) + [
+                        {"name": f"First step of {task['name']}", "dependencies": []}
+                    ]
+        return schema.model_validate(shard)
+
+
+async def run(tree: dict, use_memo: bool, fake: FakeChatModel, responder: RefineResponder) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = await interactive_planner.refine_task_tree(tree, use_cache=use_memo)
+
+        # The client sends the refined tree back, so edit that
+        edited = copy.deepcopy(first)
+        edited["categories"][0]["projects"][0]["tasks"][0]["name"] += " (edited)"
+        calls_before, sent_before = fake.calls, responder.tasks_sent
+
+        started = time.perf_counter()
+        second, cached_ids = await interactive_planner.refine_task_tree_incremental(edited, use_cache=use_memo)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "first_tasks": count_tasks(first),
+        "second_tasks": count_tasks(second),
+        "calls": fake.calls - calls_before,
+        "tasks_sent": responder.tasks_sent - sent_before,
+        "cached_ids": len(cached_ids),
+        "cached_tasks": sum(
+            1 for c in second["categories"] for p in c["projects"] for t in p["tasks"] if t.get("id") in cached_ids
+        ),
+        "elapsed": elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=8)
+    args = parser.parse_args()
+
+    responder = RefineResponder()
+    fake = FakeChatModel(
+        latency=lambda prompt: SECONDS_PER_TASK * count_tasks(shard_from_prompt(prompt)),
+        responder=responder,
+    )
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+
+    tree = interactive_planner.assign_ids_to_tree(make_tree(args.categories, args.projects, args.tasks))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        interactive_planner.refine_memo = LLMResponseCache(db_path=f"{tmp}/refine_memo.db")
+
+        print(f"Tree: {count_tasks(tree)} tasks; one task edited between refines")
+        print(f"{'memo':>5} {'calls':>6} {'tasks sent':>11} {'cached ids':>11} {'refine 2 s':>11} {'tasks out':>10}")
+        for use_memo in (False, True):
+            r = await run(tree, use_memo, fake, responder)
+            assert r["first_tasks"] == r["second_tasks"] == count_tasks(tree), r
+            if use_memo:
+                # Every task but the edited one comes from the memo
+                assert r["cached_tasks"] == count_tasks(tree) - 1, r
+                assert r["tasks_sent"] == 1, r
+            print(
+                f"{'on' if use_memo else 'off':>5} {r['calls']:>6} {r['tasks_sent']:>11} "
+                f"{r['cached_ids']:>11} {r['elapsed']:>11.2f} {r['second_tasks']:>10}"
+            )
+        print(f"Memo stats: {interactive_planner.refine_memo.stats()}")
+        interactive_planner.refine_memo.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
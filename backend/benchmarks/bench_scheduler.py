@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Planner latency with the LLM refinement loop vs. the local scheduler.
+
+Runs run_planner end to end against a stub LLM whose latency grows with
+the number of tasks in the prompt (structured output is dominated by
+generation). The breakdown step returns --tasks timed tasks, well over
+the daily budget; the stub refinement pass defers only a fifth of the
+Ready tasks, so the "llm" mode needs several passes. Reports LLM calls,
+wall-clock time and the scheduled minutes for each mode, then times
+schedule_tasks alone on larger task lists.
+
+Usage:
+    python benchmarks/bench_scheduler.py [--tasks 40] [--latency 0.5] [--per-task 0.03]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import re
+import time
+
+from _fakes import FakeChatModel, default_responder
+
+import planner_workflow
+from llm_registry import registry as llm_registry
+from scheduler import DAILY_BUDGET_MINUTES, schedule_tasks
+
+TASK_LINE = re.compile(r"^(?:-|\d+\.) (.+) \((\d+) min, (Ready|BLOCKED|Deferred)\)$", re.MULTILINE)
+
+
+def make_tasks(count: int, seed: int = 0) -> list:
+    """Timed tasks; every third one depends on the one before it, a few are BLOCKED."""
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Task {i}",
+            "time": rng.choice((15, 30, 45, 60, 90, 120)),
+            "status": "BLOCKED" if i % 13 == 7 else "Ready",
+            "dependencies": [f"Task {i - 1}"] if i % 3 == 2 else [],
+        }
+        for i in range(count)
+    ]
+
+
+def parse_task_list(prompt: str) -> list:
+    return [
+        {"name": name, "time": int(minutes), "status": status}
+        for name, minutes, status in TASK_LINE.findall(prompt)
+    ]
+
+
+def make_responder(task_count: int):
+    def responder(schema: type, prompt: str):
+        fields = schema.model_fields
+        if "detailed_tasks" in fields and schema is planner_workflow.BreakdownOutput:
+            tasks = make_tasks(task_count)
+            # The model's own arithmetic is a little off, as it often is
+            claimed = int(sum(t["time"] for t in tasks if t["status"] == "Ready") * 0.9)
+            return schema.model_validate({"detailed_tasks": tasks, "total_time": claimed})
+        if "detailed_tasks" in fields:
+            # Refinement: defer the last fifth of the Ready tasks
+            tasks = parse_task_list(prompt)
+            ready = [t for t in tasks if t["status"] == "Ready"]
+            for task in ready[len(ready) - max(1, len(ready) // 5):]:
+                task["status"] = "Deferred"
+            return schema.model_validate({"detailed_tasks": tasks, "total_time": 0})
+        if "priorities" in fields:
+            tasks = parse_task_list(prompt)
+            scores = [{"number": n, "priority": 1 + hash(t["name"]) % 5} for n, t in enumerate(tasks, 1)]
+            return schema.model_validate({"priorities": scores})
+        if "final_plan" in fields:
+            tasks = [t for t in parse_task_list(prompt) if t["status"] == "Ready"]
+            return schema.model_validate({"final_plan": tasks})
+        return default_responder(schema, prompt)
+
+    return responder
+
+
+async def run_mode(scheduler: str, priorities: bool, fake: FakeChatModel) -> tuple:
+    planner_workflow.PLANNER_SCHEDULER = scheduler
+    planner_workflow.SCHEDULER_LLM_PRIORITIES = priorities
+    planner_workflow._planner_graph = None
+    fake.calls = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = await planner_workflow.run_planner("bench brain dump", use_cache=False)
+    seconds = time.perf_counter() - started
+    deferred = sum(t["status"] == "Deferred" for t in state["detailed_tasks"])
+    return fake.calls, seconds, state["total_time"], deferred
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM base latency per call, seconds")
+    parser.add_argument("--per-task", type=float, default=0.03, help="extra seconds per task in the prompt")
+    args = parser.parse_args()
+
+    latency = lambda prompt: args.latency + args.per_task * len(TASK_LINE.findall(prompt))  # noqa: E731
+    fake = FakeChatModel(latency=latency, responder=make_responder(args.tasks))
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+
+    ready = sum(t["time"] for t in make_tasks(args.tasks) if t["status"] == "Ready")
+    print(f"{args.tasks} tasks, {ready} Ready minutes, budget {DAILY_BUDGET_MINUTES}; "
+          f"stub latency {args.latency}s + {args.per_task}s/task")
+    print(f"{'mode':<28} {'LLM calls':>10} {'seconds':>8} {'scheduled min':>14} {'deferred':>9}")
+    for label, scheduler, priorities in (
+        ("llm refinement loop", "llm", False),
+        ("local scheduler", "local", False),
+        ("local + LLM priorities", "local", True),
+    ):
+        calls, seconds, total, deferred = await run_mode(scheduler, priorities, fake)
+        print(f"{label:<28} {calls:>10} {seconds:>8.2f} {total:>14} {deferred:>9}")
+
+    print(f"\n{'schedule_tasks alone':<28} {'ms':>10}")
+    for count in (50, 500, 5000):
+        tasks = make_tasks(count, seed=1)
+        started = time.perf_counter()
+        schedule_tasks(tasks, DAILY_BUDGET_MINUTES)
+        print(f"{f'{count} tasks':<28} {(time.perf_counter() - started) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
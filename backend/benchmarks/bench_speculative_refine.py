@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Refine latency after create-task-tree, with and without speculation.
+
+Each scenario creates a tree through /api/create-task-tree, waits
+--think seconds (the user reviewing it), then posts to
+/api/refine-task-tree. The stub LLM refines like the one in
+bench_refine_memo (time per task sent). Scenarios: speculation off; on
+with the tree refined unchanged; on with one task edited; on with the
+user clicking Refine right away; on with a tree the user rewrote (the
+speculation is wasted). Reports the refine request's latency and LLM
+calls, then the speculation stats.
+
+Usage:
+    python benchmarks/bench_speculative_refine.py [--tasks 8] [--think 2]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+
+from bench_refine_memo import RefineResponder, count_tasks, shard_from_prompt
+from _fakes import FakeChatModel, make_tree
+
+import httpx
+
+import time
+
+import interactive_planner
+from llm_cache import LLMResponseCache, response_cache
+from llm_registry import registry as llm_registry
+from main import app
+import speculation
+from speculation import SpeculativeRefiner
+
+SECONDS_PER_TASK = 0.15
+CREATE_SECONDS = 0.5
+
+
+def edit(tree: dict, how: str) -> dict:
+    tree = copy.deepcopy(tree)
+    if how == "one task":
+        tree["categories"][0]["projects"][0]["tasks"][0]["name"] += " (edited)"
+    elif how == "rewritten":
+        for category in tree["categories"]:
+            for project in category["projects"]:
+                for task in project["tasks"]:
+                    task["name"] = f"Something else instead of {task['name']}"
+    return tree
+
+
+async def scenario(client, fake, enabled: bool, how: str, think: float) -> tuple:
+    """(refine seconds, refine LLM calls, speculation stats) with a fresh memo and refiner."""
+    interactive_planner.refine_memo = LLMResponseCache(db_path=None)
+    refiner = speculation.speculative_refiner = SpeculativeRefiner(enabled=False, max_jobs=2)
+    response = await client.post("/api/create-task-tree", json={"prompt": "bench", "speculative_refine": enabled})
+    response.raise_for_status()
+    await asyncio.sleep(think)
+
+    calls = fake.calls
+    started = time.perf_counter()
+    response = await client.post("/api/refine-task-tree", json={"task_tree": edit(response.json()["task_tree"], how)})
+    response.raise_for_status()
+    seconds = time.perf_counter() - started
+
+    # Let a wasted job finish, then retire it so it is counted
+    await asyncio.gather(*(job.task for job in refiner._jobs.values()), return_exceptions=True)
+    refiner.ttl_seconds = 0
+    return seconds, fake.calls - calls, refiner.stats()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--categories", type=int, default=2)
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--think", type=float, default=2.0, help="seconds between create and refine")
+    args = parser.parse_args()
+
+    tree = make_tree(args.categories, 2, args.tasks, 1)
+    refine = RefineResponder()
+
+    def responder(schema, prompt):
+        if schema is interactive_planner.TaskTreeOutput:
+            return schema.model_validate(tree)
+        return refine(schema, prompt)
+
+    def latency(prompt):
+        return SECONDS_PER_TASK * count_tasks(shard_from_prompt(prompt)) if "[" in prompt else CREATE_SECONDS
+
+    fake = FakeChatModel(latency=latency, responder=responder)
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+    # Every scenario must pay for its own LLM calls
+    response_cache.enabled = False
+
+    print(f"{count_tasks(tree)} tasks, refine {SECONDS_PER_TASK}s/task per shard, think time {args.think}s")
+    print(f"{'scenario':<34} {'refine s':>9} {'LLM calls':>10} {'speculation':>12}")
+    totals = {"started": 0, "jobs_used": 0, "wasted": 0}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, enabled, how, think in (
+            ("off", False, "unchanged", args.think),
+            ("on, refined unchanged", True, "unchanged", args.think),
+            ("on, one task edited", True, "one task", args.think),
+            ("on, refine clicked immediately", True, "unchanged", 0.0),
+            ("on, tree rewritten (wasted)", True, "rewritten", args.think),
+        ):
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds, calls, stats = await scenario(client, fake, enabled, how, think)
+            for key in totals:
+                totals[key] += stats[key]
+            if stats["used_identical"] or stats["used_partial"]:
+                outcome = "identical" if stats["used_identical"] else "partial"
+                outcome += " (joined)" if stats["joined_in_flight"] else ""
+            else:
+                outcome = "wasted" if stats["wasted"] else "-"
+            print(f"{label:<34} {seconds:>9.2f} {calls:>10} {outcome:>12}")
+
+    used, settled = totals["jobs_used"], totals["jobs_used"] + totals["wasted"]
+    print(f"speculative jobs: started {totals['started']}, used {used}, wasted {totals['wasted']}, "
+          f"use rate {used / settled if settled else 0:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-category: streaming vs. blocking task tree creation.
+
+Both endpoints run against a stub LLM that takes the same total time to
+generate the tree; the streaming stub emits it in even chunks over that
+time, as a real model would. Reports when the client first sees a
+complete category and when it has the final ID-assigned tree.
+
+Usage:
+    python benchmarks/bench_stream_first_category.py [--latency 10] [--categories 8]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from _fakes import FakeChatModel, make_tree
+
+import httpx
+import uvicorn
+from llm_registry import registry as llm_registry
+from main import app
+
+
+async def time_blocking(client: httpx.AsyncClient, payload: dict) -> float:
+    started = time.perf_counter()
+    response = await client.post("/api/create-task-tree", json=payload)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def time_streaming(client: httpx.AsyncClient, payload: dict) -> tuple:
+    started = time.perf_counter()
+    first_category = None
+    categories = 0
+    async with client.stream("POST", "/api/create-task-tree/stream", json=payload) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "category":
+                categories += 1
+                if first_category is None:
+                    first_category = time.perf_counter() - started
+            elif line.startswith("data: ") and event == "error":
+                raise RuntimeError(json.loads(line[len("data: "):])["detail"])
+    return first_category, time.perf_counter() - started, categories
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=10.0, help="simulated total generation time in seconds")
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    tree = make_tree(categories=args.categories, projects=3, tasks=4, subtasks=3)
+    fake = FakeChatModel(
+        latency=args.latency,
+        responder=lambda schema, prompt: schema.model_validate(tree),
+        stream_tree=tree
+    )
+    llm_registry.chat_model_factory = lambda provider, model, **options: fake
+
+    # httpx's in-process ASGI transport buffers whole responses, so serve
+    # the app on a real socket to observe events as they are flushed
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # Each run uses a fresh brain dump so the response cache never hits
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+            with contextlib.redirect_stdout(io.StringIO()):
+                blocking = await time_blocking(client, {"prompt": f"blocking {time.time()}"})
+                first, total, count = await time_streaming(client, {"prompt": f"streaming {time.time()}"})
+    finally:
+        server.should_exit = True
+        await serve_task
+
+    print(f"Simulated generation time: {args.latency:.1f}s, {count} categories")
+    print(f"{'':<34} {'seconds':>8}")
+    print(f"{'blocking: full response':<34} {blocking:>8.2f}")
+    print(f"{'streaming: first category':<34} {first:>8.2f}")
+    print(f"{'streaming: final task_tree event':<34} {total:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
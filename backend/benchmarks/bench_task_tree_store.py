@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Saved task tree store at scale: SQLite (WAL) vs. the old in-memory list.
+
+Seeds --trees saved trees, then times single saves, get by ID, delete by
+ID, the first listing page and a deep cursor page. For comparison it
+times the list-based version: a linear scan for get/delete and a
+full-body listing.
+
+Usage:
+    python benchmarks/bench_task_tree_store.py [--trees 100000] [--page-size 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from _fakes import make_tree, percentile
+
+from task_tree_store import TaskTreeStore
+from tree_hash import tree_hash
+
+
+def timed(fn, samples: int) -> list:
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    print(f"{label:<34} p50 {percentile(timings, 50) * 1000:>9.3f} ms   p95 {percentile(timings, 95) * 1000:>9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trees", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    tree = make_tree(3, 2, 4, 2)
+    body = json.dumps(tree, separators=(",", ":"))
+    content_hash = tree_hash(tree)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskTreeStore(db_path=os.path.join(tmp, "task_trees.db"))
+
+        # Bulk-seed in one transaction; single saves are timed separately below
+        started = time.perf_counter()
+        db = store._get_db()
+        now = time.time()
+        db.executemany(
+            "INSERT INTO task_trees (name, category_count, project_count, task_count,"
+            " subtask_count, content_hash, body, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((f"Tree {i}", 3, 6, 24, 48, content_hash, body, now - args.trees + i) for i in range(args.trees))
+        )
+        db.commit()
+        print(f"Seeded {store.count()} trees in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(store.db_path) / 1e6:.0f} MB)")
+
+        legacy = [{"id": i + 1, "task_tree": tree, "timestamp": "", "created_at": ""} for i in range(args.trees)]
+
+
+        def legacy_get(tree_id: int) -> dict:
+            return next(t for t in legacy if t["id"] == tree_id)
+
+        def legacy_delete(tree_id: int) -> list:
+            return [t for t in legacy if t["id"] != tree_id]
+
+        report("SQLite save", timed(lambda: store.save(tree, name="bench"), args.samples))
+        report("SQLite get by id", timed(lambda: store.get(random.randint(1, args.trees)), args.samples))
+        report("list get by id (scan)", timed(
+            lambda: legacy_get(random.randint(1, args.trees)), min(args.samples, 20)
+        ))
+
+        delete_ids = random.sample(range(1, args.trees + 1), args.samples)
+        report("SQLite delete", timed(lambda: store.delete(delete_ids.pop()), args.samples))
+        report("list delete (rebuild)", timed(
+            lambda: legacy_delete(random.randint(1, args.trees)), min(args.samples, 20)
+        ))
+
+        report("SQLite first page", timed(lambda: store.list_page(limit=args.page_size), args.samples))
+
+        page = store.list_page(limit=args.page_size)
+        for _ in range(1000):
+            page = store.list_page(limit=args.page_size, cursor=page["next_cursor"])
+        deep_cursor = page["next_cursor"]
+        report("SQLite page 1000 (cursor)", timed(
+            lambda: store.list_page(limit=args.page_size, cursor=deep_cursor), args.samples
+        ))
+
+        summary_bytes = len(json.dumps(store.list_page(limit=args.page_size)))
+        started = time.perf_counter()
+        full_bytes = len(json.dumps({"task_trees": legacy}))
+        print(f"{'list full listing':<34} {(time.perf_counter() - started) * 1000:>13.1f} ms   "
+              f"{full_bytes / 1e6:.1f} MB vs {summary_bytes / 1e3:.1f} KB per summary page")
+
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
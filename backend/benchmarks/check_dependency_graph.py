@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Check that dependency ordering copes with duplicate item IDs.
+
+Carrying IDs over by name path gives same-named siblings (two "Buy milk"
+tasks in one project) the same ID. Builds such a tree the way a merge
+does and checks that:
+
+- DependencyGraph.from_tree keeps both items, each with its own subtasks
+  and its own dependencies
+- dependency order still puts each item after what it depends on
+- /api/generate-todo answers 200 with both items in the list
+
+Usage:
+    python benchmarks/check_dependency_graph.py
+"""
+
+import asyncio
+import contextlib
+import io
+import sys
+
+import _fakes  # noqa: F401  (puts backend/ on sys.path and the caches in a scratch directory)
+
+import httpx
+
+import main
+from dependency_graph import DependencyGraph
+from interactive_planner import assign_ids_to_tree
+
+
+def merged_tree() -> dict:
+    existing = assign_ids_to_tree({"categories": [{"name": "Home", "projects": [{"name": "Groceries", "tasks": [
+        {"name": "Go to the store"},
+        {"name": "Buy milk"},
+    ]}]}]})
+    # A new brain dump adds a second "Buy milk" to the same project
+    new_tree = {"categories": [{"name": "Home", "projects": [{"name": "Groceries", "tasks": [
+        {"name": "Go to the store"},
+        {"name": "Buy milk", "dependencies": ["Go to the store"], "subtasks": [{"name": "Whole milk"}]},
+        {"name": "Buy milk", "dependencies": ["Pay"], "subtasks": [{"name": "Oat milk"}]},
+        {"name": "Pay", "dependencies": ["Go to the store"]},
+    ]}]}]}
+    return assign_ids_to_tree(new_tree, existing)
+
+
+def check_graph(tree: dict) -> list:
+    tasks = tree["categories"][0]["projects"][0]["tasks"]
+    store, first_milk, second_milk, pay = tasks
+    failures = []
+    if first_milk["id"] != second_milk["id"]:
+        failures.append("setup: the two 'Buy milk' tasks did not share an ID")
+
+    graph = DependencyGraph.from_tree(tree)
+    milk_ids = [item_id for item_id in graph.ids if graph.names[item_id] == "Buy milk"]
+    if len(milk_ids) != 2 or milk_ids[0] == milk_ids[1]:
+        failures.append(f"expected two distinct 'Buy milk' items, got {milk_ids}")
+        return failures
+    first_id, second_id = milk_ids
+    children = {item_id: [graph.names[child] for child in graph.children[item_id]] for item_id in milk_ids}
+    if children != {first_id: ["Whole milk"], second_id: ["Oat milk"]}:
+        failures.append(f"subtasks attached to the wrong 'Buy milk': {children}")
+    if graph.dependencies[first_id] != [store["id"]] or graph.dependencies[second_id] != [pay["id"]]:
+        failures.append(f"dependencies not kept per item: {graph.dependencies[first_id]}, "
+                        f"{graph.dependencies[second_id]}")
+
+    order = [graph.label(item_id) for item_id in graph.order(leaves_only=True)]
+    expected = ["Groceries > Go to the store", "Buy milk > Whole milk", "Groceries > Pay", "Buy milk > Oat milk"]
+    if order != expected:
+        failures.append(f"dependency order {order}, expected {expected}")
+    return failures
+
+
+async def check_endpoint(tree: dict) -> list:
+    main.TODO_LLM_PASS = False
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = await client.post("/api/generate-todo", json={"task_tree": tree})
+    if response.status_code != 200:
+        return [f"/api/generate-todo answered {response.status_code}: {response.text[:200]}"]
+    items = response.json()["todo_items"]
+    if items.count("Buy milk > Whole milk") != 1 or items.count("Buy milk > Oat milk") != 1:
+        return [f"/api/generate-todo lost a duplicate item: {items}"]
+    return []
+
+
+def main_cli() -> None:
+    tree = merged_tree()
+    failures = check_graph(tree) + asyncio.run(check_endpoint(tree))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK: duplicate item IDs are kept apart" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
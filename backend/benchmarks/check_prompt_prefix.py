@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Check that every prompt starts with a byte-identical static prefix.
+
+Each prompt builder is rendered for two different inputs (two brain
+dumps, two trees, ...). The system messages must be byte-for-byte equal
+and all request data must sit in the user message, so providers that
+cache prompt prefixes can reuse the whole system message across calls.
+For each template it prints its id and the size of that static prefix;
+OpenAI only caches prompts of 1024 tokens or more, in 128-token steps.
+
+With --live (and OPENAI_API_KEY set) it also sends each prompt twice to
+the configured OpenAI model and reports the input tokens the provider
+says it served from its cache on the second call.
+
+Usage:
+    python benchmarks/check_prompt_prefix.py [--live]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from _fakes import make_brain_dump, make_tree
+
+from langchain_core.messages import SystemMessage
+
+import interactive_planner
+import planner_workflow
+from prompts import GENERATE_TODO, PROMPTS, STREAMING_JSON_OUTPUT, append_to_system
+from token_budget import count_tokens, load_encodings
+from tree_outline import task_list_outline, tree_outline, tree_outline_with_handles
+
+OPENAI_MIN_CACHED_PREFIX = 1024
+
+
+def sample_inputs(seed: int) -> dict:
+    tree = interactive_planner.assign_ids_to_tree(make_tree(2 + seed, 2, 3, 1))
+    tasks = [{"name": f"Task {seed}.{i}", "time": 30, "status": "Ready"} for i in range(5 + seed)]
+    return {
+        "brain_dump": make_brain_dump(200 + 100 * seed),
+        "tree": tree,
+        "outline": tree_outline(tree),
+        "handles_outline": tree_outline_with_handles(tree)[0],
+        "task_list": task_list_outline(tasks),
+        "numbered_task_list": task_list_outline(tasks, numbered=True),
+    }
+
+
+def streaming_prompt(brain_dump: str) -> list:
+    prompt = interactive_planner.build_create_task_tree_prompt(brain_dump)
+    schema = json.dumps(interactive_planner.TaskTreeOutput.model_json_schema())
+    return append_to_system(prompt, STREAMING_JSON_OUTPUT.format(schema=schema))
+
+
+# (label, template name, builder(inputs) -> messages)
+CASES = [
+    ("create", "create_task_tree", lambda x: interactive_planner.build_create_task_tree_prompt(x["brain_dump"])),
+    ("create (streaming)", "create_task_tree", lambda x: streaming_prompt(x["brain_dump"])),
+    ("merge", "merge_task_tree",
+     lambda x: interactive_planner.build_create_task_tree_prompt(x["brain_dump"], x["tree"])),
+    ("delta", "delta_task_tree", lambda x: interactive_planner.build_delta_prompt(x["brain_dump"], x["tree"])),
+    ("validate", "validate_names", lambda x: interactive_planner.build_validation_prompt(x["outline"], x["outline"])),
+    ("refine", "refine_task_tree", lambda x: interactive_planner.build_refine_prompt(x["handles_outline"])),
+    ("workflow task tree", "workflow_task_tree", lambda x: planner_workflow.build_task_tree_prompt(x["brain_dump"])),
+    ("workflow fused plan", "workflow_fused_plan", lambda x: planner_workflow.build_fused_plan_prompt(x["brain_dump"])),
+    ("workflow task breakdown", "workflow_task_breakdown",
+     lambda x: planner_workflow.build_task_breakdown_prompt(x["outline"])),
+    ("workflow breakdown", "workflow_breakdown", lambda x: planner_workflow.build_breakdown_prompt(x["outline"])),
+    ("workflow refinement", "workflow_refinement", lambda x: planner_workflow.build_refinement_prompt(x["task_list"])),
+    ("workflow priorities", "workflow_priorities",
+     lambda x: planner_workflow.build_priorities_prompt(x["numbered_task_list"])),
+    ("workflow consolidation", "workflow_consolidation",
+     lambda x: planner_workflow.build_consolidation_prompt(x["task_list"])),
+    ("generate todo", "generate_todo",
+     lambda x: GENERATE_TODO.render(
+         task_tree_outline=x["outline"], dependency_order=x["numbered_task_list"], additional_instructions=""
+     )),
+]
+
+
+def system_text(messages: list) -> str:
+    return "".join(m.content for m in messages if isinstance(m, SystemMessage))
+
+
+def check_prefixes() -> tuple:
+    """Print the prefix table; return (ok, rendered prompt pairs by label)."""
+    first, second = sample_inputs(0), sample_inputs(1)
+    ok = True
+    rendered = {}
+    covered = set()
+    print(f"{'prompt':<24} {'template id':<36} {'prefix tok':>10} {'identical':>9} {'data in user':>12}")
+    for label, name, build in CASES:
+        a, b = build(first), build(second)
+        rendered[label] = (a, b)
+        covered.add(name)
+        identical = system_text(a).encode("utf-8") == system_text(b).encode("utf-8")
+        data_in_user = a[-1].content != b[-1].content
+        prefix_tokens = count_tokens(system_text(a), interactive_planner.get_llm_config()["model"])
+        ok = ok and identical and data_in_user
+        print(f"{label:<24} {PROMPTS[name].id:<36} {prefix_tokens:>10} {str(identical):>9} {str(data_in_user):>12}")
+
+    missing = set(PROMPTS) - covered
+    if missing:
+        print(f"Templates without a case: {', '.join(sorted(missing))}")
+        ok = False
+    return ok, rendered
+
+
+async def live_check(rendered: dict) -> None:
+    """Send each prompt twice and report what the provider served from its prompt cache."""
+    config = {**interactive_planner.get_llm_config(), "max_tokens": 16}
+    llm = interactive_planner.llm_registry.get_chat_model(**config)
+    print(f"\nLive: {config['model']} (cache hits need a prefix of {OPENAI_MIN_CACHED_PREFIX}+ tokens)")
+    print(f"{'prompt':<24} {'input tok':>10} {'1st cached':>11} {'2nd cached':>11}")
+    for label, (a, b) in rendered.items():
+        cached = []
+        for messages in (a, b):
+            usage = (await llm.ainvoke(messages)).usage_metadata or {}
+            cached.append((usage.get("input_token_details") or {}).get("cache_read", 0))
+        print(f"{label:<24} {usage.get('input_tokens', 0):>10} {cached[0]:>11} {cached[1]:>11}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--live", action="store_true", help="also call OpenAI and report cached input tokens")
+    args = parser.parse_args()
+    load_encodings(interactive_planner.get_llm_config()["model"])
+
+    ok, rendered = check_prefixes()
+    print("OK: static prefixes are byte-identical" if ok else "FAIL: request data leaks into a static prefix")
+
+    if args.live:
+        if os.getenv("OPENAI_API_KEY", "benchmark-placeholder") == "benchmark-placeholder":
+            print("--live needs OPENAI_API_KEY")
+        else:
+            asyncio.run(live_check(rendered))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
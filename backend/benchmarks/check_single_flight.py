@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Check that identical concurrent requests share one upstream LLM call.
+
+Fires --requests identical requests at once at each endpoint, against
+stub providers with --latency seconds per call, and counts the calls
+that reach the provider:
+
+- /api/create-task-tree (interactive_planner): exactly 1
+- /api/generate-plan (planner_workflow): as many as one request alone
+- /api/generate-todo and /api/extract-text-from-image (main): exactly 1
+- a failing provider call: exactly 1, and every request gets the error
+
+Caches are bypassed so every request would otherwise call the provider.
+Runs each endpoint with SINGLE_FLIGHT_ENABLED off too, for comparison.
+Then checks SingleFlight directly:
+
+- the leader (the caller whose call runs) cancelled while others wait:
+  the call keeps running, the others get their own copy of the result
+  and nothing is counted as abandoned
+- every waiter cancelled: the call is cancelled and counted as abandoned
+- a failing call runs once and every waiter gets the same exception
+
+Exits non-zero if any check fails.
+
+Usage:
+    python benchmarks/check_single_flight.py [--requests 20] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+
+from _fakes import FakeChatModel, FakeVisionClient, make_photo, make_tree
+
+import httpx
+
+import ai_client
+import main
+from llm_registry import registry as llm_registry
+from single_flight import SingleFlight, single_flight
+
+
+class Upstream:
+    """Counts provider calls across the stub chat model, chat completions and vision client."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.fail = False
+        self.chat = FakeChatModel(latency=latency)
+        self.vision = FakeVisionClient(latency)
+        self.completions = 0
+        llm_registry.chat_model_factory = lambda provider, model, **options: self.chat
+        llm_registry.get_openai_clients = lambda api_key=None: (self.vision, self.vision)
+        upstream = self
+
+        async def achat_completion(client, messages, **kwargs):
+            return await upstream.achat_completion(messages, **kwargs)
+
+        ai_client.AIClient.achat_completion = achat_completion
+
+    async def achat_completion(self, messages, **kwargs):
+        self.completions += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("provider unavailable")
+        return json.dumps({"items": ["Group 1: everything"]})
+
+    @property
+    def calls(self) -> int:
+        return self.chat.calls + self.completions + self.vision.calls
+
+
+async def fire(client: httpx.AsyncClient, upstream: Upstream, count: int, method: str, url: str, **kwargs) -> tuple:
+    """Send count identical requests at once; returns (upstream calls, responses)."""
+    before = upstream.calls
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        responses = await asyncio.gather(*(client.request(method, url, **kwargs) for _ in range(count)))
+    return upstream.calls - before, responses
+
+
+async def check_endpoints(client: httpx.AsyncClient, upstream: Upstream, count: int) -> list:
+    photo = make_photo(0, (1200, 900))
+    prompt = {"prompt": "onboarding example", "bypass_cache": True}
+    cases = [
+        ("create-task-tree", "POST", "/api/create-task-tree", {"json": prompt}),
+        ("generate-plan", "POST", "/api/generate-plan", {"json": prompt}),
+        ("generate-todo", "POST", "/api/generate-todo",
+         {"json": {"task_tree": make_tree(2, 2, 2, 1), "bypass_cache": True}}),
+        ("extract-text-from-image", "POST", "/api/extract-text-from-image",
+         {"files": {"file": ("page.jpg", photo, "image/jpeg")}, "data": {"bypass_cache": "true"}}),
+    ]
+    main.TODO_LLM_PASS = True
+    failures = []
+    print(f"{'endpoint':<26} {'requests':>9} {'1 alone':>8} {'coalesced':>10} {'off':>6}")
+    for label, method, url, kwargs in cases:
+        alone, _ = await fire(client, upstream, 1, method, url, **kwargs)
+        calls, responses = await fire(client, upstream, count, method, url, **kwargs)
+        single_flight.enabled = False
+        uncoalesced, _ = await fire(client, upstream, count, method, url, **kwargs)
+        single_flight.enabled = True
+        statuses = sorted({r.status_code for r in responses})
+        if statuses != [200]:
+            failures.append(f"{label}: answered {statuses}, expected [200]")
+        if calls != alone:
+            failures.append(f"{label}: {count} requests made {calls} upstream call(s), one alone makes {alone}")
+        print(f"{label:<26} {count:>9} {alone:>8} {calls:>10} {uncoalesced:>6}")
+
+    upstream.fail = True
+    body = {"json": {"task_tree": make_tree(2, 2, 2, 1), "bypass_cache": True}}
+    calls, responses = await fire(client, upstream, count, "POST", "/api/generate-todo", **body)
+    upstream.fail = False
+    errors = [(r.status_code, r.json().get("detail")) for r in responses]
+    if calls != 1:
+        failures.append(f"generate-todo, failing: {count} requests made {calls} upstream calls, expected 1")
+    if set(errors) != {(500, "provider unavailable")}:
+        failures.append(f"generate-todo, failing: not every request got the error: {sorted(set(errors))}")
+    print(f"{'generate-todo, failing':<26} {count:>9} {'':>8} {calls:>10} {'':>6}")
+    return failures
+
+
+async def check_leader_cancelled(latency: float) -> list:
+    """The first caller (whose call() runs) goes away while others still wait on it."""
+    flights = SingleFlight()
+    started = []
+
+    async def call():
+        started.append(1)
+        await asyncio.sleep(latency)
+        return {"value": 1}
+
+    waiters = [asyncio.ensure_future(flights.do("key", call)) for _ in range(3)]
+    await asyncio.sleep(latency / 4)
+    flight = flights._flights["key"]
+    waiters[0].cancel()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    failures = []
+    if not isinstance(results[0], asyncio.CancelledError):
+        failures.append(f"leader cancelled: the leader got {results[0]!r}, expected CancelledError")
+    if results[1:] != [{"value": 1}, {"value": 1}] or results[1] is results[2]:
+        failures.append(f"leader cancelled: followers got {results[1:]!r}, expected their own copy of the result")
+    if flight.task.cancelled():
+        failures.append("leader cancelled: the shared call was cancelled while followers still waited on it")
+    if len(started) != 1:
+        failures.append(f"leader cancelled: the call ran {len(started)} times, expected once")
+    if flights.stats()["abandoned"] != 0:
+        failures.append(f"leader cancelled: counted {flights.stats()['abandoned']} abandoned call(s), expected 0")
+    return failures
+
+
+async def check_everyone_cancelled(latency: float) -> list:
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(latency)
+        return {"value": 1}
+
+    waiters = [asyncio.ensure_future(flights.do("key", call)) for _ in range(2)]
+    await asyncio.sleep(latency / 4)
+    flight = flights._flights["key"]
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    failures = []
+    if not flight.task.cancelled():
+        failures.append("every waiter cancelled: the shared call kept running")
+    if flights._flights:
+        failures.append(f"every waiter cancelled: flights left behind: {list(flights._flights)}")
+    if flights.stats()["abandoned"] != 1:
+        failures.append(f"every waiter cancelled: counted {flights.stats()['abandoned']} abandoned call(s), "
+                        f"expected 1")
+    return failures
+
+
+async def check_error_shared(latency: float, count: int) -> list:
+    flights = SingleFlight()
+    started = []
+
+    async def call():
+        started.append(1)
+        await asyncio.sleep(latency)
+        raise ValueError("provider unavailable")
+
+    results = await asyncio.gather(*(flights.do("key", call) for _ in range(count)), return_exceptions=True)
+
+    failures = []
+    errors = {(type(result).__name__, str(result)) for result in results}
+    if errors != {("ValueError", "provider unavailable")}:
+        failures.append(f"failing call: waiters got {sorted(errors)}, expected ValueError('provider unavailable')")
+    if len(started) != 1:
+        failures.append(f"failing call: ran {len(started)} times for {count} waiters, expected once")
+    if flights.stats()["failed"] != 1:
+        failures.append(f"failing call: counted {flights.stats()['failed']} failure(s), expected 1")
+    return failures
+
+
+async def run(count: int, latency: float) -> list:
+    upstream = Upstream(latency)
+    print(f"{count} identical concurrent requests; stub provider latency {latency}s")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+        failures = await check_endpoints(client, upstream, count)
+    failures += await check_leader_cancelled(latency)
+    failures += await check_everyone_cancelled(latency)
+    failures += await check_error_shared(latency, count)
+    print(f"single-flight stats: {single_flight.stats()}")
+    return failures
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub provider latency per call, seconds")
+    args = parser.parse_args()
+    failures = asyncio.run(run(args.requests, args.latency))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK: identical concurrent calls are coalesced" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,208 @@
+"""
+Chunked ingestion helpers for long brain dumps.
+
+Long brain dumps are split at natural boundaries (paragraphs, bullets,
+lines) into chunks that each fit comfortably in one LLM call. The partial
+task trees extracted from each chunk are then combined locally with a
+deterministic merge by category and project name.
+"""
+
+import re
+from typing import Any, Dict, List
+
+BULLET_PATTERN = re.compile(r"^\s*(?:[-*•+]|\d+[.)]|[a-zA-Z][.)]|\[[ xX]?\])\s+")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def normalize_name(name: str) -> str:
+    """Normalize an item name for matching: case, whitespace and edge punctuation."""
+    name = re.sub(r"\s+", " ", name or "").strip().casefold()
+    return name.strip(" .,:;!-_*")
+
+
+def _split_oversized(unit: str, max_words: int) -> List[str]:
+    """Split a single unit that is too long by sentences, then by words."""
+    pieces = []
+    current: List[str] = []
+    current_words = 0
+
+    for sentence in SENTENCE_PATTERN.split(unit):
+        words = sentence.split()
+        while len(words) > max_words:
+            if current:
+                pieces.append(" ".join(current))
+                current, current_words = [], 0
+            pieces.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        if current_words + len(words) > max_words and current:
+            pieces.append(" ".join(current))
+            current, current_words = [], 0
+        if words:
+            current.append(" ".join(words))
+            current_words += len(words)
+
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _natural_units(text: str) -> List[str]:
+    """
+    Break text into units that should not be separated: paragraphs of
+    prose, or individual bullet items together with their indented
+    continuation lines.
+    """
+    units: List[str] = []
+    current: List[str] = []
+
+    def flush():
+        if current:
+            units.append("\n".join(current))
+            current.clear()
+
+    for line in text.splitlines():
+        if not line.strip():
+            flush()
+        elif BULLET_PATTERN.match(line) and not line.startswith((" ", "\t")):
+            flush()
+            current.append(line)
+        else:
+            current.append(line)
+    flush()
+    return units
+
+
+def split_brain_dump(text: str, max_words: int) -> List[str]:
+    """
+    Split a brain dump into chunks of at most max_words words, breaking
+    only between paragraphs, bullets or lines where possible.
+    """
+    if count_words(text) <= max_words:
+        return [text]
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_words = 0
+
+    for unit in _natural_units(text):
+        unit_words = count_words(unit)
+        if unit_words > max_words:
+            # Try line boundaries first, then sentences
+            lines = unit.splitlines()
+            sub_units = lines if len(lines) > 1 else _split_oversized(unit, max_words)
+        else:
+            sub_units = [unit]
+
+        for sub_unit in sub_units:
+            sub_words = count_words(sub_unit)
+            if sub_words > max_words:
+                sub_parts = _split_oversized(sub_unit, max_words)
+            else:
+                sub_parts = [sub_unit]
+            for part in sub_parts:
+                part_words = count_words(part)
+                if current and current_words + part_words > max_words:
+                    chunks.append("\n\n".join(current))
+                    current, current_words = [], 0
+                current.append(part)
+                current_words += part_words
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _merge_dependencies(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    existing = target.setdefault("dependencies", [])
+    seen = {normalize_name(d) for d in existing}
+    for dependency in source.get("dependencies", []) or []:
+        if normalize_name(dependency) not in seen:
+            existing.append(dependency)
+            seen.add(normalize_name(dependency))
+
+
+def _merge_children(
+    target: Dict[str, Any],
+    source: Dict[str, Any],
+    child_key: str,
+    merge_child
+) -> None:
+    children = target.setdefault(child_key, [])
+    index = {normalize_name(child.get("name")): child for child in children}
+    for child in source.get(child_key, []) or []:
+        key = normalize_name(child.get("name"))
+        if key in index:
+            merge_child(index[key], child)
+        else:
+            copied = _copy_node(child)
+            children.append(copied)
+            index[key] = copied
+
+
+def _copy_node(node: Dict[str, Any]) -> Dict[str, Any]:
+    copied = dict(node)
+    for child_key in ("projects", "tasks", "subtasks"):
+        if child_key in copied:
+            copied[child_key] = [_copy_node(child) for child in copied[child_key] or []]
+    if "dependencies" in copied:
+        copied["dependencies"] = list(copied["dependencies"] or [])
+    return copied
+
+
+def _merge_subtask(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    _merge_dependencies(target, source)
+
+
+def _merge_task(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    _merge_dependencies(target, source)
+    _merge_children(target, source, "subtasks", _merge_subtask)
+
+
+def _merge_project(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    _merge_dependencies(target, source)
+    _merge_children(target, source, "tasks", _merge_task)
+
+
+def _merge_category(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    _merge_children(target, source, "projects", _merge_project)
+
+
+def merge_task_trees(trees: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Deterministically merge task trees by (normalized) category, project,
+    task and subtask name. The first occurrence of a name fixes its
+    position and spelling; later duplicates only contribute new children
+    and dependencies. Inputs are not modified.
+    """
+    merged: Dict[str, Any] = {"categories": []}
+    for tree in trees:
+        _merge_children(merged, tree, "categories", _merge_category)
+    return merged
+
+
+def split_categories(task_tree: Dict[str, Any], pieces: int) -> List[Dict[str, Any]]:
+    """
+    Split a task tree into up to `pieces` trees of consecutive whole
+    categories with roughly equal task counts. Concatenating their
+    categories gives back the original order.
+    """
+    categories = task_tree.get("categories") or []
+    weights = [
+        max(1, sum(len(p.get("tasks") or []) for p in c.get("projects") or []))
+        for c in categories
+    ]
+    target = sum(weights) / max(1, pieces)
+
+    groups: List[List[Dict[str, Any]]] = [[]]
+    group_weight = 0
+    for category, weight in zip(categories, weights):
+        if groups[-1] and group_weight + weight > target and len(groups) < pieces:
+            groups.append([])
+            group_weight = 0
+        groups[-1].append(category)
+        group_weight += weight
+    return [{"categories": group} for group in groups if group]
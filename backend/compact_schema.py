@@ -0,0 +1,91 @@
+"""
+Compact structured-output schemas for task trees.
+
+The same tree as the planner's Category/Project/TaskItem/Subtask models,
+but the JSON keys the model has to write are one letter long and every
+field except the name may be left out, so the model does not spell out
+"subtasks"/"dependencies" and empty lists for every node. The Python
+field names stay the long ones (the short keys are aliases), so a compact
+output's model_dump() already has the full shape; expand() validates it
+into the full schema.
+
+Opt in with COMPACT_OUTPUT_SCHEMA=true.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+COMPACT_OUTPUT_SCHEMA = os.getenv("COMPACT_OUTPUT_SCHEMA", "false").lower() in ("1", "true", "yes")
+
+# Short keys of the two container levels the streaming parser watches
+CATEGORIES_KEY = "c"
+PROJECTS_KEY = "p"
+
+
+class _CompactModel(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class CompactSubtask(_CompactModel):
+    id: Optional[str] = Field(None, alias="i", description="id (omit for new items)")
+    name: str = Field(alias="n", description="name")
+    dependencies: List[str] = Field(default_factory=list, alias="d", description="dependencies (omit if none)")
+
+
+class CompactTaskItem(_CompactModel):
+    id: Optional[str] = Field(None, alias="i", description="id (omit for new items)")
+    name: str = Field(alias="n", description="name")
+    subtasks: List[CompactSubtask] = Field(default_factory=list, alias="s", description="subtasks (omit if none)")
+    dependencies: List[str] = Field(default_factory=list, alias="d", description="dependencies (omit if none)")
+
+
+class CompactProject(_CompactModel):
+    id: Optional[str] = Field(None, alias="i", description="id (omit for new items)")
+    name: str = Field(alias="n", description="name")
+    tasks: List[CompactTaskItem] = Field(alias="t", description="tasks")
+    dependencies: List[str] = Field(default_factory=list, alias="d", description="dependencies (omit if none)")
+
+
+class CompactCategory(_CompactModel):
+    id: Optional[str] = Field(None, alias="i", description="id (omit for new items)")
+    name: str = Field(alias="n", description="name")
+    projects: List[CompactProject] = Field(alias=PROJECTS_KEY, description="projects")
+
+
+class CompactTaskTree(_CompactModel):
+    categories: List[CompactCategory] = Field(alias=CATEGORIES_KEY, description="categories")
+
+
+_compact_schemas: Dict[type, type] = {}
+
+
+def compact_schema_for(schema: type) -> type:
+    """
+    Compact counterpart of a full task tree output schema (any model whose
+    only field is categories). One class per schema, so structured-output
+    runnables and cache keys stay stable.
+    """
+    compact = _compact_schemas.get(schema)
+    if compact is None:
+        compact = create_model(
+            f"Compact{schema.__name__}",
+            __base__=CompactTaskTree,
+            __doc__=schema.__doc__,
+        )
+        _compact_schemas[schema] = compact
+    return compact
+
+
+def expand(schema: type, output: BaseModel) -> BaseModel:
+    """Turn a compact output back into an instance of the full schema."""
+    if isinstance(output, schema):
+        return output
+    return schema.model_validate(output.model_dump())
+
+
+def expand_node(level: str, node: Dict[str, Any]) -> Dict[str, Any]:
+    """Expand one streamed "category" or "project" node from short keys."""
+    model = CompactCategory if level == "category" else CompactProject
+    return model.model_validate(node).model_dump()
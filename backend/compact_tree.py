@@ -0,0 +1,152 @@
+"""
+Compact, flat representation of a task tree.
+
+Nodes are stored in pre-order as parallel arrays (level, parent index,
+name, ID, dependencies, extra fields) instead of nested dicts, so a
+10k-node tree is a handful of lists rather than 10k dicts. Finished job
+results are kept in this form (see main.TaskTreeResult) and only turned
+back into wire JSON when they are fetched.
+
+The name index used to carry IDs over from the tree (see tree_ids) is
+built once, on first use, and cached on it.
+"""
+
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+CATEGORY, PROJECT, TASK, SUBTASK = range(4)
+
+# Key holding each level's children in the wire JSON
+CHILD_KEYS = ("projects", "tasks", "subtasks", None)
+
+_STRUCTURAL_KEYS = {"id", "name", "dependencies", "projects", "tasks", "subtasks"}
+
+_DISPLAY_PREFIXES = ("📁 ", "  📋 ", "    ✓ ", "      • ")
+_DEPENDENCY_PREFIXES = (None, "     Dependencies: ", "       Dependencies: ", "         Dependencies: ")
+
+
+class CompactTree:
+    """
+    A task tree as flat pre-order arrays with parent indices.
+
+    dependencies[i] is None when node i had no "dependencies" key, and
+    extras[i] holds any non-structural fields, or None when there are none.
+    """
+
+    __slots__ = (
+        "levels", "parents", "names", "ids", "dependencies", "extras",
+        "_name_index",
+    )
+
+    def __init__(self):
+        self.levels = array("b")
+        self.parents = array("i")
+        self.names: List[Optional[str]] = []
+        self.ids: List[Optional[str]] = []
+        self.dependencies: List[Optional[Tuple[str, ...]]] = []
+        self.extras: List[Optional[Dict[str, Any]]] = []
+        self._name_index: Optional[Dict[Optional[str], List[Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_dict(cls, task_tree: Dict[str, Any]) -> "CompactTree":
+        """Build a compact tree from the nested {"categories": [...]} JSON."""
+        tree = cls()
+        add_level, add_parent = tree.levels.append, tree.parents.append
+        add_name, add_id = tree.names.append, tree.ids.append
+        add_deps, add_extra = tree.dependencies.append, tree.extras.append
+
+        def add(node: Dict[str, Any], level: int, parent: int, child_key: Optional[str]) -> None:
+            add_level(level)
+            add_parent(parent)
+            add_name(node.get("name"))
+            add_id(node.get("id"))
+            deps = node.get("dependencies")
+            add_deps(tuple(deps) if deps is not None else None)
+            # Only build an extras dict when the node has more than the structural keys
+            structural = 1 + ("id" in node) + ("dependencies" in node) + (child_key in node)
+            if len(node) > structural:
+                add_extra({k: v for k, v in node.items() if k not in _STRUCTURAL_KEYS})
+            else:
+                add_extra(None)
+
+        # Explicit loops per level keep this a single pre-order pass
+        names = tree.names
+        for category in task_tree.get("categories") or []:
+            cat_index = len(names)
+            add(category, CATEGORY, -1, "projects")
+            for project in category.get("projects") or []:
+                proj_index = len(names)
+                add(project, PROJECT, cat_index, "tasks")
+                for task in project.get("tasks") or []:
+                    task_index = len(names)
+                    add(task, TASK, proj_index, "subtasks")
+                    for subtask in task.get("subtasks") or []:
+                        add(subtask, SUBTASK, task_index, None)
+
+        return tree
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rebuild the nested wire JSON."""
+        root: Dict[str, Any] = {"categories": []}
+        nodes: List[Dict[str, Any]] = []
+
+        for index, level in enumerate(self.levels):
+            node: Dict[str, Any] = {}
+            if self.ids[index] is not None:
+                node["id"] = self.ids[index]
+            node["name"] = self.names[index]
+            if self.extras[index]:
+                node.update(self.extras[index])
+            child_key = CHILD_KEYS[level]
+            if child_key:
+                node[child_key] = []
+            if self.dependencies[index] is not None:
+                node["dependencies"] = list(self.dependencies[index])
+
+            parent = self.parents[index]
+            if parent < 0:
+                root["categories"].append(node)
+            else:
+                nodes[parent][CHILD_KEYS[self.levels[parent]]].append(node)
+            nodes.append(node)
+
+        return root
+
+    def name_index(self) -> Dict[Optional[str], List[Any]]:
+        """
+        The tree_ids name index of this tree (name -> [ID, children index]),
+        built on first use; the last ID seen on a name path wins.
+        """
+        if self._name_index is None:
+            index: Dict[Optional[str], List[Any]] = {}
+            children = [None] * len(self.names)
+            for position, parent in enumerate(self.parents):
+                siblings = children[parent] if parent >= 0 else index
+                name = self.names[position]
+                entry = siblings.get(name)
+                if entry is None:
+                    entry = siblings[name] = [None, {} if self.levels[position] != SUBTASK else None]
+                entry[0] = self.ids[position]
+                children[position] = entry[1]
+            self._name_index = index
+        return self._name_index
+
+    def node_counts(self) -> Tuple[int, int, int, int]:
+        """Number of categories, projects, tasks and subtasks."""
+        return tuple(self.levels.count(level) for level in (CATEGORY, PROJECT, TASK, SUBTASK))
+
+    def format_for_display(self) -> str:
+        """Readable hierarchical text, as format_task_tree_for_display renders nested JSON."""
+        lines = []
+        for index, level in enumerate(self.levels):
+            if level == CATEGORY and index:
+                lines.append("")  # Blank line between categories
+            lines.append(f"{_DISPLAY_PREFIXES[level]}{self.names[index]}")
+            if level != CATEGORY and self.dependencies[index]:
+                lines.append(f"{_DEPENDENCY_PREFIXES[level]}{', '.join(self.dependencies[index])}")
+        if lines:
+            lines.append("")
+        return "\n".join(lines)
@@ -0,0 +1,335 @@
+"""
+Dependency graph over task tree items.
+
+Dependencies are free-text names on projects, tasks and subtasks (and on
+the workflow's flat task list). DependencyGraph resolves each one to an
+item ID - exact name first, then normalized name, then the closest
+normalized name - and indexes the result as a DAG, so items can be put
+in dependency order and the critical path found locally in O(V + E) once
+it is built.
+
+Items that contain others get a start and an end vertex: an item starts
+once its parent has started and everything it depends on has ended, and
+ends once all of its children have ended. Depending on a project
+therefore means waiting for all of that project's tasks.
+
+Each cycle is broken by dropping the most recently followed dependency
+edge on it (containment edges alone never form one); the dropped edges
+are listed in `cycles`.
+
+Building is O(V + E) when every dependency matches a name exactly or
+after normalizing and there are no cycles. On top of that:
+
+- each distinct dependency name that matches neither is compared by
+  difflib against every item name (V similarity ratios), once per build
+- each cycle broken costs another O(V + E) re-index and cycle search
+"""
+
+import difflib
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from chunking import normalize_name
+
+# Minimum difflib similarity for a fuzzy name match
+FUZZY_MATCH_CUTOFF = 0.85
+
+
+class DependencyGraph:
+    """Items with their dependencies resolved to IDs, indexed for ordering."""
+
+    def __init__(self):
+        self.ids: List[Hashable] = []
+        self.names: Dict[Hashable, str] = {}
+        self.parents: Dict[Hashable, Optional[Hashable]] = {}
+        self.children: Dict[Hashable, List[Hashable]] = {}
+        self.durations: Dict[Hashable, Optional[int]] = {}
+        # Resolved dependencies per item, after cycle breaking
+        self.dependencies: Dict[Hashable, List[Hashable]] = {}
+        self.unresolved: List[Tuple[Hashable, str]] = []
+        self.cycles: List[Tuple[Hashable, Hashable]] = []
+        self._declared: Dict[Hashable, List[str]] = {}
+        self._by_name: Dict[str, Hashable] = {}
+        self._by_normalized: Dict[str, Hashable] = {}
+        # Fuzzy-match candidates and results, per normalized dependency name
+        self._fuzzy_candidates: List[str] = []
+        self._fuzzy_matches: Dict[str, Optional[Hashable]] = {}
+        self._vertex_order: List[int] = []
+        self._predecessors: List[List[int]] = []
+        # (item, target) for a dependency edge, None for a containment edge
+        self._edge_labels: List[List[Optional[Tuple[Hashable, Hashable]]]] = []
+        self._vertex_item: List[Hashable] = []
+        self._start: Dict[Hashable, int] = {}
+        self._end: Dict[Hashable, int] = {}
+
+    def add(
+        self,
+        item_id: Hashable,
+        name: str,
+        dependencies: Optional[Iterable[str]] = None,
+        parent: Optional[Hashable] = None,
+        duration: Optional[int] = None
+    ) -> None:
+        """Add an item; parents must be added before their children."""
+        if item_id in self.names:
+            raise ValueError(f"Duplicate item ID: {item_id!r}")
+        if parent is not None and parent not in self.names:
+            raise ValueError(f"Unknown parent ID: {parent!r}")
+        self.ids.append(item_id)
+        self.names[item_id] = name or ""
+        self.parents[item_id] = parent
+        self.children[item_id] = []
+        self.durations[item_id] = duration
+        self._declared[item_id] = [d for d in dependencies or [] if d]
+        if parent is not None:
+            self.children[parent].append(item_id)
+
+    @classmethod
+    def from_tree(cls, task_tree: Dict[str, Any]) -> "DependencyGraph":
+        """
+        Projects, tasks and subtasks of a task tree (categories only group
+        them). Items without an ID, or whose ID an earlier item already has
+        (ID carry-over gives same-named siblings the same one), get a
+        positional ID; their children and dependencies follow it.
+        """
+        graph = cls()
+
+        def item_id(node: Dict[str, Any], positional: str) -> str:
+            node_id = node.get("id")
+            return node_id if node_id and node_id not in graph.names else positional
+
+        for c, category in enumerate(task_tree.get("categories") or []):
+            for p, project in enumerate(category.get("projects") or []):
+                project_id = item_id(project, f"c{c}.p{p}")
+                graph.add(project_id, project.get("name"), project.get("dependencies"))
+                for t, task in enumerate(project.get("tasks") or []):
+                    task_id = item_id(task, f"c{c}.p{p}.t{t}")
+                    graph.add(task_id, task.get("name"), task.get("dependencies"), parent=project_id)
+                    for s, subtask in enumerate(task.get("subtasks") or []):
+                        subtask_id = item_id(subtask, f"c{c}.p{p}.t{t}.s{s}")
+                        graph.add(subtask_id, subtask.get("name"), subtask.get("dependencies"), parent=task_id)
+        return graph.build()
+
+    @classmethod
+    def from_tasks(cls, tasks: List[Dict[str, Any]]) -> "DependencyGraph":
+        """A flat task list such as the workflow's detailed_tasks; IDs are list indexes."""
+        graph = cls()
+        for index, task in enumerate(tasks):
+            graph.add(index, task.get("name"), task.get("dependencies"), duration=int(task.get("time") or 0))
+        return graph.build()
+
+    # ------------------------------------------------------------------
+    # Resolution
+    # ------------------------------------------------------------------
+    def resolve(self, dependency: str) -> Optional[Hashable]:
+        """ID of the item a dependency string names: exact, normalized, then fuzzy match."""
+        if dependency in self._by_name:
+            return self._by_name[dependency]
+        key = normalize_name(dependency)
+        if not key:
+            return None
+        if key in self._by_normalized:
+            return self._by_normalized[key]
+        if key not in self._fuzzy_matches:
+            match = difflib.get_close_matches(key, self._fuzzy_candidates, n=1, cutoff=FUZZY_MATCH_CUTOFF)
+            self._fuzzy_matches[key] = self._by_normalized[match[0]] if match else None
+        return self._fuzzy_matches[key]
+
+    def _is_ancestor(self, ancestor: Hashable, item_id: Hashable) -> bool:
+        parent = self.parents[item_id]
+        while parent is not None:
+            if parent == ancestor:
+                return True
+            parent = self.parents[parent]
+        return False
+
+    def build(self) -> "DependencyGraph":
+        """Resolve every declared dependency, break cycles and index the DAG."""
+        self._by_name, self._by_normalized = {}, {}
+        for item_id in self.ids:
+            self._by_name.setdefault(self.names[item_id], item_id)
+            self._by_normalized.setdefault(normalize_name(self.names[item_id]), item_id)
+        self._fuzzy_candidates = list(self._by_normalized)
+        self._fuzzy_matches = {}
+
+        self.unresolved, self.cycles = [], []
+        for item_id in self.ids:
+            targets = []
+            for dependency in self._declared[item_id]:
+                target = self.resolve(dependency)
+                if target is None:
+                    self.unresolved.append((item_id, dependency))
+                    continue
+                # An item can't wait for itself, its own children or its parents
+                if (target == item_id or target in targets
+                        or self._is_ancestor(target, item_id) or self._is_ancestor(item_id, target)):
+                    continue
+                targets.append(target)
+            self.dependencies[item_id] = targets
+
+        self._index()
+        edge = self._find_cycle_edge()
+        while edge is not None:
+            item_id, target = edge
+            print(f"Dependency cycle: ignoring '{self.names[item_id]}' -> '{self.names[target]}'")
+            self.cycles.append(edge)
+            self.dependencies[item_id].remove(target)
+            self._index()
+            edge = self._find_cycle_edge()
+        self._vertex_order = self._topological_vertices()
+        return self
+
+    # ------------------------------------------------------------------
+    # DAG index
+    # ------------------------------------------------------------------
+    def _index(self) -> None:
+        """Vertices (one per leaf, start + end per container) and their predecessor lists."""
+        self._start, self._end, self._vertex_item = {}, {}, []
+        for item_id in self.ids:
+            self._start[item_id] = len(self._vertex_item)
+            self._vertex_item.append(item_id)
+        for item_id in self.ids:
+            if self.children[item_id]:
+                self._end[item_id] = len(self._vertex_item)
+                self._vertex_item.append(item_id)
+            else:
+                self._end[item_id] = self._start[item_id]
+
+        predecessors: List[List[int]] = [[] for _ in self._vertex_item]
+        labels: List[List[Optional[Tuple[Hashable, Hashable]]]] = [[] for _ in self._vertex_item]
+        for item_id in self.ids:
+            start = self._start[item_id]
+            if self.parents[item_id] is not None:
+                predecessors[start].append(self._start[self.parents[item_id]])
+                labels[start].append(None)
+            for target in self.dependencies[item_id]:
+                predecessors[start].append(self._end[target])
+                labels[start].append((item_id, target))
+            if self.children[item_id]:
+                end = self._end[item_id]
+                predecessors[end].append(start)
+                predecessors[end].extend(self._end[child] for child in self.children[item_id])
+                labels[end].extend([None] * (1 + len(self.children[item_id])))
+        self._predecessors = predecessors
+        self._edge_labels = labels
+
+    def _find_cycle_edge(self) -> Optional[Tuple[Hashable, Hashable]]:
+        """The last dependency edge followed on the first cycle a depth-first pass finds, if any."""
+        state = [0] * len(self._vertex_item)  # 0 unvisited, 1 on the stack, 2 done
+        for root in range(len(self._vertex_item)):
+            if state[root]:
+                continue
+            state[root] = 1
+            # (vertex, next predecessor position, label of the edge that reached it)
+            work = [(root, 0, None)]
+            while work:
+                vertex, position, reached_by = work[-1]
+                if position == len(self._predecessors[vertex]):
+                    state[vertex] = 2
+                    work.pop()
+                    continue
+                work[-1] = (vertex, position + 1, reached_by)
+                other = self._predecessors[vertex][position]
+                label = self._edge_labels[vertex][position]
+                if state[other] == 0:
+                    state[other] = 1
+                    work.append((other, 0, label))
+                elif state[other] == 1:
+                    # The cycle is the stack from other up to vertex, closed by this edge
+                    if label is not None:
+                        return label
+                    for frame_vertex, _, frame_label in reversed(work):
+                        if frame_vertex == other:
+                            break
+                        if frame_label is not None:
+                            return frame_label
+        return None
+
+    def _topological_vertices(self) -> List[int]:
+        """
+        Vertices with every predecessor first, otherwise in the order items
+        were added: a depth-first pass that emits each vertex after its
+        (already acyclic) predecessors.
+        """
+        emitted = [False] * len(self._vertex_item)
+        order = []
+        for item_id in self.ids:
+            root = self._end[item_id]
+            if emitted[root]:
+                continue
+            work = [(root, 0)]
+            while work:
+                vertex, position = work[-1]
+                predecessors = self._predecessors[vertex]
+                if position < len(predecessors):
+                    work[-1] = (vertex, position + 1)
+                    if not emitted[predecessors[position]]:
+                        work.append((predecessors[position], 0))
+                    continue
+                work.pop()
+                if not emitted[vertex]:
+                    emitted[vertex] = True
+                    order.append(vertex)
+        return order
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def is_leaf(self, item_id: Hashable) -> bool:
+        return not self.children[item_id]
+
+    def label(self, item_id: Hashable, levels: int = 2) -> str:
+        """Item name prefixed with up to levels - 1 ancestor names: "Task > Subtask"."""
+        names = [self.names[item_id]]
+        parent = self.parents[item_id]
+        while parent is not None and len(names) < levels:
+            names.append(self.names[parent])
+            parent = self.parents[parent]
+        return " > ".join(reversed(names))
+
+    def order(self, leaves_only: bool = False) -> List[Hashable]:
+        """Item IDs in dependency order, staying close to the order they were added."""
+        return [
+            self._vertex_item[vertex] for vertex in self._vertex_order
+            if vertex == self._start[self._vertex_item[vertex]]
+            and (not leaves_only or self.is_leaf(self._vertex_item[vertex]))
+        ]
+
+    def critical_path(self, default_duration: int = 1) -> Tuple[List[Hashable], int]:
+        """
+        Longest dependency chain by duration: (leaf IDs along it, total).
+        Leaves without a duration count default_duration; containers add nothing.
+        """
+        length = [0] * len(self._vertex_item)
+        previous = [-1] * len(self._vertex_item)
+        for vertex in self._vertex_order:
+            item_id = self._vertex_item[vertex]
+            best = -1
+            for other in self._predecessors[vertex]:
+                if best == -1 or length[other] > length[best]:
+                    best = other
+            weight = 0
+            if self.is_leaf(item_id):
+                duration = self.durations[item_id]
+                weight = default_duration if duration is None else duration
+            length[vertex] = weight + (length[best] if best != -1 else 0)
+            previous[vertex] = best
+        if not length:
+            return [], 0
+
+        vertex = max(self._vertex_order, key=lambda v: length[v])
+        total = length[vertex]
+        path = []
+        while vertex != -1:
+            item_id = self._vertex_item[vertex]
+            if self.is_leaf(item_id):
+                path.append(item_id)
+            vertex = previous[vertex]
+        return path[::-1], total
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "items": len(self.ids),
+            "dependencies": sum(len(targets) for targets in self.dependencies.values()),
+            "unresolved": len(self.unresolved),
+            "cycles": len(self.cycles),
+        }
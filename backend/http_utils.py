@@ -0,0 +1,231 @@
+"""
+HTTP response shaping: fast JSON rendering, response compression, field
+projection and conditional-request (ETag) helpers, plus request body size
+limits.
+"""
+
+import gzip
+import json
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (falls back to the stdlib encoder)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ----------------------------------------------------------------------
+# Field projection
+# ----------------------------------------------------------------------
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Set[str]:
+    """
+    Parse a comma-separated fields= parameter. No parameter means every
+    allowed field; unknown names are a 400.
+    """
+    allowed = tuple(allowed)
+    if not fields:
+        return set(allowed)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))} (allowed: {', '.join(allowed)})"
+        )
+    return requested
+
+
+# ----------------------------------------------------------------------
+# Conditional requests
+# ----------------------------------------------------------------------
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# ----------------------------------------------------------------------
+# Compression
+# ----------------------------------------------------------------------
+def _accepted_encodings(accept_encoding: str) -> Set[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compress complete (non-streaming) responses of at least minimum_size
+    bytes with brotli, when the brotli package is installed and the client
+    accepts it, or gzip. A strong ETag on a compressed response is made
+    weak, since it named the uncompressed bytes. Streaming responses such
+    as Server-Sent Events pass through untouched so events are not held
+    back in a buffer.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._choose_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            streaming = message.get("more_body", False)
+            if (
+                streaming
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or headers.get("content-type", "").startswith("text/event-stream")
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            # A strong validator must differ between content codings (RFC 9110 8.8.3)
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class BodyTooLargeError(Exception):
+    """A request body went over its BodyLimitMiddleware limit."""
+
+
+class BodyLimitMiddleware:
+    """
+    Reject request bodies over a per-path byte limit with 413 before the
+    app reads them: up front from Content-Length, or as soon as a body
+    without one goes over while it arrives. Starlette otherwise spools a
+    whole multipart upload to disk before the handler runs.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    def _reject(self, limit: int) -> JSONResponse:
+        return JSONResponse({"detail": f"Request body is larger than the {limit}-byte limit"}, status_code=413)
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            await self._reject(limit)(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def receive_limited():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise BodyTooLargeError()
+            return message
+
+        async def send_unless_exceeded(message):
+            nonlocal started
+            # The app answers a body it failed to read with its own error; replace that with the 413
+            if exceeded and not started:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_unless_exceeded)
+        except BodyTooLargeError:
+            pass
+        if exceeded and not started:
+            await self._reject(limit)(scope, receive, send)
@@ -0,0 +1,198 @@
+"""
+Image pre-processing for the OCR endpoint.
+
+Phone photos of notes arrive as 4-12 MB JPEGs at 12+ megapixels, far more
+than a vision model needs to read handwriting. Before an image is sent it
+is rotated upright from its EXIF orientation, downscaled so its longest
+edge is at most IMAGE_MAX_EDGE, converted to grayscale and re-encoded as
+JPEG or WebP. Requests over IMAGE_MAX_UPLOAD_BYTES are rejected before
+their body is read (http_utils.BodyLimitMiddleware), and each uploaded
+file is read into memory in chunks up to the same limit. A small file can
+still decode to a huge bitmap, so an image that would decode to more than
+IMAGE_MAX_PIXELS pixels (after JPEG draft scaling) is rejected too. Images
+Pillow cannot decode are passed through unchanged.
+
+OpenAI bills a high-detail image by 512px tiles after scaling its short
+side to 768, so a 4:3 page costs 4 tiles from ~683px up and only a smaller
+edge saves tokens; tall pages (receipts, long lists) drop tiles at 1024.
+IMAGE_DETAIL=low sends every image as one 85-token low-detail tile.
+"""
+
+import io
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+IMAGE_PREPROCESSING_ENABLED = os.getenv("IMAGE_PREPROCESSING_ENABLED", "true").lower() in ("1", "true", "yes")
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+# OpenAI vision detail level: "high", "low" or "auto"
+IMAGE_DETAIL = os.getenv("IMAGE_DETAIL", "high").lower()
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Most pixels an upload may decode to (a 50 MP bitmap is 50-150 MB in memory)
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+MIME_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+_PIL_FORMATS = {"jpeg": "JPEG", "webp": "WEBP"}
+EXIF_ORIENTATION = 0x0112
+
+
+class ImageTooLargeError(ValueError):
+    """The upload is over IMAGE_MAX_UPLOAD_BYTES, or would decode to more than IMAGE_MAX_PIXELS."""
+
+
+def mime_type_for(filename: Optional[str]) -> str:
+    """MIME type from a file name's extension (JPEG if unknown)."""
+    extension = filename.lower().rsplit(".", 1)[-1] if filename and "." in filename else "jpeg"
+    return MIME_TYPES.get(extension, "image/jpeg")
+
+
+async def read_upload(file: Any, max_bytes: int = IMAGE_MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read an UploadFile in chunks, raising ImageTooLargeError once more than
+    max_bytes have been read, so an oversized file is never held in memory
+    whole. This only caps memory: Starlette has already spooled the request
+    body to a temporary file by the time the handler runs.
+    """
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return bytes(buffer)
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise ImageTooLargeError(f"Image is larger than the {max_bytes}-byte upload limit")
+
+
+def vision_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Input tokens an image costs on OpenAI vision models. Low detail is a
+    flat 85; high detail fits the image within 2048x2048, scales its short
+    side to at most 768, then bills 85 tokens plus 170 per 512px tile
+    ("auto" is estimated as high).
+    """
+    if not width or not height:
+        return 0
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class ProcessedImage:
+    """An image ready to send, with what pre-processing saved."""
+
+    __slots__ = ("data", "mime_type", "original_bytes", "original_size", "size", "seconds", "changed", "detail")
+
+    def __init__(self, data, mime_type, original_bytes, original_size, size, seconds, changed, detail="high"):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.original_size = original_size
+        self.size = size
+        self.seconds = seconds
+        self.changed = changed
+        self.detail = detail
+
+    def stats(self) -> Dict[str, Any]:
+        # Uploads used to be sent as they came, at the API's default (auto, i.e. high) detail
+        original_tokens = vision_tokens(*self.original_size)
+        tokens = vision_tokens(*self.size, detail=self.detail)
+        return {
+            "original_bytes": self.original_bytes,
+            "bytes": len(self.data),
+            "bytes_saved": self.original_bytes - len(self.data),
+            "original_size": list(self.original_size),
+            "size": list(self.size),
+            "original_vision_tokens": original_tokens,
+            "vision_tokens": tokens,
+            "vision_tokens_saved": original_tokens - tokens,
+            "detail": self.detail,
+            "mime_type": self.mime_type,
+            "milliseconds": round(self.seconds * 1000, 1),
+        }
+
+
+def preprocess_image(
+    data: bytes,
+    mime_type: str = "image/jpeg",
+    max_edge: int = IMAGE_MAX_EDGE,
+    grayscale: bool = IMAGE_GRAYSCALE,
+    image_format: str = IMAGE_FORMAT,
+    quality: int = IMAGE_QUALITY,
+    detail: str = IMAGE_DETAIL,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+) -> ProcessedImage:
+    """
+    Upright, downscaled, (optionally) grayscale re-encode of an image. The
+    original bytes are kept when nothing had to change and re-encoding
+    would not make them smaller, or when Pillow cannot decode them.
+    Raises ImageTooLargeError, before decoding, for an image that would
+    decode to more than max_pixels pixels (or that Pillow flags as a
+    decompression bomb). CPU-bound; run it off the event loop.
+    """
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(data))
+        original_size = image.size
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale directly, much faster than a full decode
+        image.draft("L" if grayscale else "RGB", (max_edge, max_edge))
+        # Only the header has been read so far; other formats decode at full size
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageTooLargeError(
+                f"Image is {original_size[0]}x{original_size[1]}, over the {max_pixels}-pixel limit"
+            )
+        image.load()
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    except (UnidentifiedImageError, OSError) as e:
+        print(f"Image pre-processing skipped ({type(e).__name__}), sending original")
+        return ProcessedImage(
+            data, mime_type, len(data), (0, 0), (0, 0), time.perf_counter() - started, False, detail
+        )
+
+    rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+    if rotated:
+        image = ImageOps.exif_transpose(image)
+
+    resized = max(image.size) > max_edge
+    if resized:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    output = io.BytesIO()
+    pil_format = _PIL_FORMATS.get(image_format, "JPEG")
+    image.save(output, format=pil_format, quality=quality, optimize=True)
+    processed = output.getvalue()
+
+    if not (resized or rotated) and len(processed) >= len(data):
+        return ProcessedImage(
+            data, mime_type, len(data), original_size, original_size, time.perf_counter() - started, False, detail
+        )
+    return ProcessedImage(
+        processed, f"image/{pil_format.lower()}", len(data), original_size, image.size,
+        time.perf_counter() - started, True, detail
+    )
+
@@ -4,34 +4,131 @@ Interactive Planning Workflow - Multi-stage with user verification
 
 import os
 import json
-import uuid
-from typing import List, Literal, Dict, Any, Optional
+import copy
+import asyncio
+from typing import List, Literal, Dict, Any, Optional, AsyncIterator, Tuple, Callable, Union
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langsmith import traceable
+from llm_registry import registry as llm_registry
+from llm_cache import LLMResponseCache, cached_structured_invoke, response_cache, structured_cache_key
+from streaming import IncrementalTreeParser
+from chunking import count_words, normalize_name, split_brain_dump, split_categories, merge_task_trees
+from tree_hash import task_hash
+from compact_tree import CompactTree
+from tree_ids import assign_ids
+from tree_outline import restore_ids, tree_outline, tree_outline_with_handles
+from prompts import (
+    CREATE_TASK_TREE,
+    DELTA_TASK_TREE,
+    MERGE_TASK_TREE,
+    REFINE_TASK_TREE,
+    STREAMING_JSON_OUTPUT,
+    VALIDATE_NAMES,
+    Prompt,
+    append_to_system,
+    prompt_text,
+)
+from compact_schema import (
+    CATEGORIES_KEY,
+    COMPACT_OUTPUT_SCHEMA,
+    PROJECTS_KEY,
+    compact_schema_for,
+    expand,
+    expand_node,
+)
+from token_budget import TokenBudget, token_budget
+
+# Progress callback: progress(stage, **data), e.g. bound to a job by the API
+ProgressCallback = Callable[..., None]
+
+def no_progress(stage: str, **data: Any) -> None:
+    """Default progress callback: ignores every event."""
 
 # Initialize LLM
-def get_llm():
-    """Get configured LLM instance based on AI_PROVIDER environment variable."""
+def get_llm_config() -> Dict[str, Any]:
+    """Get LLM provider/model/options based on AI_PROVIDER environment variable."""
     provider = os.getenv('AI_PROVIDER', 'openai')
     
     if provider == 'gemini':
-        return ChatGoogleGenerativeAI(
-            model=os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp'),
-            temperature=0.2,
-            max_output_tokens=30000,  # Increased for large brain dumps
-            google_api_key=os.getenv('GEMINI_API_KEY'),
-            timeout=120,  # 2 minute timeout
-            max_retries=2
-        )
+        return {
+            "provider": "gemini",
+            "model": os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp'),
+            "temperature": 0.2,
+            "max_output_tokens": 30000,  # Increased for large brain dumps
+            "timeout": 120,  # 2 minute timeout
+            "max_retries": 2
+        }
     else:  # default to openai
-        return ChatOpenAI(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            temperature=0.2,
-            max_tokens=16000,  # Increased from 10000 (gpt-4o-mini max is 16384)
-            timeout=120
-        )
+        return {
+            "provider": "openai",
+            "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            "temperature": 0.2,
+            "max_tokens": 16000,  # Increased from 10000 (gpt-4o-mini max is 16384)
+            "timeout": 120
+        }
+
+def get_structured_llm(schema: type, budget: Optional[TokenBudget] = None):
+    """Get the shared structured-output runnable for the given schema (and budget's max_tokens)."""
+    return llm_registry.get_structured_llm(schema, **token_budget.apply(get_llm_config(), budget))
+
+def plan_budget(kind: str, prompt: Prompt, basis: str) -> TokenBudget:
+    """Pre-flight token budget for a call whose output is derived from basis."""
+    return token_budget.plan(kind, prompt_text(prompt), basis, get_llm_config())
+
+def get_output_schema(schema: type) -> type:
+    """
+    Schema the model actually fills for a task tree schema: its short-key
+    counterpart when COMPACT_OUTPUT_SCHEMA is on, otherwise schema itself.
+    """
+    return compact_schema_for(schema) if COMPACT_OUTPUT_SCHEMA else schema
+
+async def invoke_structured(
+    schema: type,
+    prompt: Prompt,
+    use_cache: bool = True,
+    budget: Optional[TokenBudget] = None
+):
+    """
+    Invoke the structured-output LLM for a task tree schema through the
+    response cache, with max_tokens from budget and its actual usage
+    recorded; output cut off at max_tokens is retried once at the model's
+    output ceiling. Identical concurrent calls share one request (see
+    single_flight). Always returns an instance of schema.
+    """
+    output_schema = get_output_schema(schema)
+    llm_config = get_llm_config()
+    output = await token_budget.invoke(budget, lambda budget: cached_structured_invoke(
+        get_structured_llm(output_schema, budget), output_schema, prompt, llm_config, use_cache=use_cache
+    ))
+    return expand(schema, output)
+
+def fit_chunk_words(budget: TokenBudget, brain_dump: str, chunk_words: int) -> int:
+    """
+    Chunk size for a brain dump whose single-call budget is `budget`: small
+    enough that each chunk's call is predicted to fit.
+    """
+    if budget.fits:
+        return chunk_words
+    return max(1, min(chunk_words, count_words(brain_dump) // budget.pieces))
+
+async def gather_bounded(items: List[Any], worker, concurrency: int) -> List[Any]:
+    """
+    Run worker(item) for every item, at most `concurrency` at a time, and
+    return results in input order. If one fails, the rest are cancelled.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run(item):
+        async with semaphore:
+            return await worker(item)
+    
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        return await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
 
 # Pydantic Models for Task Tree
 class Subtask(BaseModel):
@@ -65,233 +162,746 @@ class TaskTreeRefinementOutput(BaseModel):
 class TaskTreeValidationOutput(BaseModel):
     categories: List[Category]
 
+class TaskTreeDeltaOutput(BaseModel):
+    """Only the NEW items, placed under existing category/project names where they fit."""
+    categories: List[Category]
+
+# Chunked ingestion configuration for long brain dumps
+BRAIN_DUMP_CHUNK_WORDS = int(os.getenv('BRAIN_DUMP_CHUNK_WORDS', '1500'))
+BRAIN_DUMP_CHUNK_CONCURRENCY = int(os.getenv('BRAIN_DUMP_CHUNK_CONCURRENCY', '4'))
+
+# How new brain dumps are merged into an existing tree:
+#   "delta" - the LLM sees only a name outline and returns new items, merged locally
+#   "full"  - the LLM regenerates the whole tree, then names are validated by a second call
+TASK_TREE_MERGE_MODE = os.getenv('TASK_TREE_MERGE_MODE', 'delta')
+
+def build_tree_name_outline(task_tree: Dict[str, Any]) -> str:
+    """
+    Compact outline of category and project names (no tasks, IDs or dependencies).
+    """
+    lines = []
+    for category in task_tree.get('categories', []):
+        lines.append(f"- {category.get('name')}")
+        for project in category.get('projects', []):
+            lines.append(f"  - {project.get('name')}")
+    return "\n".join(lines)
+
+def build_delta_prompt(brain_dump: str, existing_task_tree: Dict[str, Any]) -> Prompt:
+    """
+    Build the stage 1 prompt for delta merges: only new items come back.
+    """
+    return DELTA_TASK_TREE.render(existing_outline=build_tree_name_outline(existing_task_tree), brain_dump=brain_dump)
+
+# Prompt for stage 1, shared by the blocking and streaming variants
+def build_create_task_tree_prompt(brain_dump: str, existing_task_tree: Dict[str, Any] = None) -> Prompt:
+    """
+    Build the stage 1 prompt, merging into existing_task_tree if provided.
+    """
+    if existing_task_tree:
+        print(f"Merging with existing tree that has {len(existing_task_tree.get('categories', []))} categories")
+        return MERGE_TASK_TREE.render(existing_outline=tree_outline(existing_task_tree), brain_dump=brain_dump)
+    else:
+        print("Creating new task tree from scratch")
+        return CREATE_TASK_TREE.render(brain_dump=brain_dump)
+
 # Stage 1: Create initial task tree from brain dump
 @traceable(run_type="chain", name="Create Task Tree")
-def create_task_tree(brain_dump: str, existing_task_tree: Dict[str, Any] = None) -> Dict[str, Any]:
+async def create_task_tree(
+    brain_dump: str,
+    existing_task_tree: Dict[str, Any] = None,
+    use_cache: bool = True,
+    chunk_words: Optional[int] = None,
+    progress: ProgressCallback = no_progress
+) -> Dict[str, Any]:
     """
     Convert brain dump into structured task tree.
     If existing_task_tree is provided, merges new items into it.
+    Brain dumps longer than chunk_words (default BRAIN_DUMP_CHUNK_WORDS) are
+    split into chunks that are processed in parallel and merged locally.
+    Set use_cache=False to skip the LLM response cache; progress is called
+    with each stage and chunk.
     Returns the task tree for user verification.
     """
     print("STAGE 1: Creating task tree from brain dump...")
     print(f"Has existing task tree: {existing_task_tree is not None}")
+    progress("create_task_tree", merge=existing_task_tree is not None)
+    
+    chunk_words = chunk_words or BRAIN_DUMP_CHUNK_WORDS
+    if existing_task_tree and TASK_TREE_MERGE_MODE == "delta":
+        return await _create_task_tree_delta(brain_dump, existing_task_tree, chunk_words, use_cache, progress)
     
-    llm = get_llm()
-    structured_llm = llm.with_structured_output(TaskTreeOutput)
+    if not existing_task_tree and count_words(brain_dump) > chunk_words:
+        task_tree = await _create_task_tree_chunked(brain_dump, chunk_words, use_cache, progress)
+        return await finalize_created_tree(task_tree, None, use_cache=use_cache)
     
+    prompt = build_create_task_tree_prompt(brain_dump, existing_task_tree)
+    
+    # Switch to chunked/delta generation before sending a call that would not fit
     if existing_task_tree:
-        print(f"Merging with existing tree that has {len(existing_task_tree.get('categories', []))} categories")
-        prompt = f"""
-You are a helpful personal assistant agent who is proficient in organizing to-do list brain dumps into organized and usable task trees that can be used in planning your client's schedule and getting everything on the list done.
-
-The user has an EXISTING task tree and is adding NEW items to it. Your job is to:
-1. KEEP ALL existing items unchanged
-2. Add the new items from the brain dump
-3. Merge logically - if new items fit into existing categories/projects, add them there
-4. Create new categories/projects only if the new items don't fit existing ones
-
-EXISTING TASK TREE (KEEP ALL OF THIS):
----
-{json.dumps(existing_task_tree, indent=2)}
----
-
-NEW ITEMS TO ADD:
----
-{brain_dump}
----
-
-Instructions:
-- PRESERVE all existing categories, projects, tasks, and subtasks exactly as they are
-- Add new items from the brain dump into appropriate existing categories/projects where they fit
-- Only create new categories/projects if the new items don't logically fit anywhere existing
-- Maintain the clear hierarchy (Category > Project > Task > Subtask)
-- Indicate dependencies or prerequisites where applicable
-
-⚠️ CRITICAL: Include EVERY item from both the existing tree and the new brain dump.
-"""
+        budget = plan_budget("merge", prompt, f"{tree_outline(existing_task_tree)}\n{brain_dump}")
+        if not budget.fits:
+            print(f"Full merge would not fit one call ({budget}), merging as a delta instead")
+            return await _create_task_tree_delta(brain_dump, existing_task_tree, chunk_words, use_cache, progress)
     else:
-        print("Creating new task tree from scratch")
-        prompt = f"""
-You are a helpful personal assistant agent who is proficient in organizing to-do list brain dumps into organized and usable task trees that can be used in planning your client's schedule and getting everything on the list done.
-
-Take the following 'brain dump' of things that a user needs to get done and organize it into a structured list.
-
-Brain dump:
----
-{brain_dump}
----
-
-Instructions:
-- Group related items into projects and categories (e.g. Academic, Household, Meal Prep).
-- Break each project into smaller actionable tasks and subtasks as referenced in the brain dump.
-- Present the output as a clear hierarchy (Category > Project > Task > Subtask).
-- Indicate dependencies or prerequisites where applicable, if referenced in the brain dump.
-
-⚠️ CRITICAL: Be thorough and capture EVERY SINGLE ITEM from the brain dump above. Do not skip or omit anything.
-⚠️ If the brain dump is long, make sure to process the ENTIRE text, not just the beginning.
-⚠️ Count the items in the brain dump and make sure you've included all of them in your output.
-"""
+        budget = plan_budget("create", prompt, brain_dump)
+        if not budget.fits:
+            print(f"Brain dump would not fit one call ({budget}), extracting in chunks")
+            task_tree = await _create_task_tree_chunked(
+                brain_dump, fit_chunk_words(budget, brain_dump, chunk_words), use_cache, progress
+            )
+            return await finalize_created_tree(task_tree, None, use_cache=use_cache)
+    
+    output: TaskTreeOutput = await invoke_structured(TaskTreeOutput, prompt, use_cache=use_cache, budget=budget)
+    
+    return await finalize_created_tree(output.model_dump(), existing_task_tree, use_cache=use_cache)
+
+async def _create_task_tree_chunked(
+    brain_dump: str,
+    chunk_words: int,
+    use_cache: bool,
+    progress: ProgressCallback = no_progress
+) -> Dict[str, Any]:
+    """
+    Map-reduce stage 1 for long brain dumps: extract a partial tree from each
+    chunk concurrently, then merge them locally by category and project name.
+    """
+    chunks = split_brain_dump(brain_dump, chunk_words)
+    print(f"Long brain dump: processing {len(chunks)} chunks of up to {chunk_words} words")
+    progress("chunks", total=len(chunks))
+    extracted = 0
+    
+    async def extract(chunk: str) -> Dict[str, Any]:
+        nonlocal extracted
+        prompt = build_create_task_tree_prompt(chunk)
+        output: TaskTreeOutput = await invoke_structured(
+            TaskTreeOutput,
+            prompt,
+            use_cache=use_cache,
+            budget=plan_budget("create", prompt, chunk)
+        )
+        extracted += 1
+        progress("chunk_extracted", done=extracted, total=len(chunks))
+        return output.model_dump()
+    
+    partial_trees = await gather_bounded(chunks, extract, BRAIN_DUMP_CHUNK_CONCURRENCY)
     
-    output: TaskTreeOutput = structured_llm.invoke(prompt)
-    task_tree = output.model_dump()
+    return merge_task_trees(partial_trees)
+
+async def _create_task_tree_delta(
+    brain_dump: str,
+    existing_task_tree: Dict[str, Any],
+    chunk_words: int,
+    use_cache: bool,
+    progress: ProgressCallback = no_progress
+) -> Dict[str, Any]:
+    """
+    Delta merge: the LLM only sees the new brain dump plus a name outline of
+    the existing tree and returns the new items. They are merged into the
+    existing tree locally, so existing nodes are never regenerated.
+    """
+    budget = plan_budget("delta", build_delta_prompt(brain_dump, existing_task_tree), brain_dump)
+    chunks = split_brain_dump(brain_dump, fit_chunk_words(budget, brain_dump, chunk_words))
+    print(f"Delta merge into existing tree ({len(chunks)} chunk(s))")
+    progress("chunks", total=len(chunks))
+    extracted = 0
+    
+    async def extract(chunk: str) -> Dict[str, Any]:
+        nonlocal extracted
+        prompt = build_delta_prompt(chunk, existing_task_tree)
+        output: TaskTreeDeltaOutput = await invoke_structured(
+            TaskTreeDeltaOutput,
+            prompt,
+            use_cache=use_cache,
+            budget=plan_budget("delta", prompt, chunk)
+        )
+        extracted += 1
+        progress("chunk_extracted", done=extracted, total=len(chunks))
+        return output.model_dump()
+    
+    deltas = await gather_bounded(chunks, extract, BRAIN_DUMP_CHUNK_CONCURRENCY)
     
+    return merge_delta_into_tree(existing_task_tree, deltas)
+
+def merge_delta_into_tree(existing_task_tree: Dict[str, Any], deltas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Add delta trees into a copy of the existing tree and assign IDs to new nodes.
+    """
+    merged = merge_task_trees([existing_task_tree, *deltas])
+    return assign_ids_to_tree(merged, existing_task_tree)
+
+async def finalize_created_tree(
+    task_tree: Dict[str, Any],
+    existing_task_tree: Dict[str, Any] = None,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """
+    Validate merged names and assign IDs to a freshly generated stage 1 tree.
+    """
     # If merging with existing tree, validate that original names are preserved
     if existing_task_tree:
-        task_tree = validate_name_preservation(task_tree, existing_task_tree)
+        task_tree = await validate_name_preservation(task_tree, existing_task_tree, use_cache=use_cache)
     
     # Assign unique IDs (preserving IDs from existing tree if merging)
     task_tree = assign_ids_to_tree(task_tree, existing_task_tree)
     
     return task_tree
 
+def _chunk_text(chunk: Any) -> str:
+    """Extract the text from a streamed message chunk."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+# Stage 1 (streaming): emit categories/projects as soon as they are generated
+@traceable(run_type="chain", name="Stream Task Tree")
+async def stream_task_tree(
+    brain_dump: str,
+    existing_task_tree: Dict[str, Any] = None,
+    use_cache: bool = True
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of create_task_tree.
+    Yields a "category" or "project" event as soon as that node's JSON is
+    complete in the model's streamed output, then a final "task_tree" event
+    carrying the ID-assigned tree. Shares cache entries with create_task_tree.
+    In delta merge mode the streamed nodes are only the new items; the final
+    tree has them merged into existing_task_tree.
+    """
+    print("STAGE 1 (streaming): Creating task tree from brain dump...")
+    
+    # In delta mode only the new items are generated (and streamed)
+    delta = bool(existing_task_tree) and TASK_TREE_MERGE_MODE == "delta"
+    if delta:
+        schema = TaskTreeDeltaOutput
+        prompt = build_delta_prompt(brain_dump, existing_task_tree)
+    else:
+        schema = TaskTreeOutput
+        prompt = build_create_task_tree_prompt(brain_dump, existing_task_tree)
+    output_schema = get_output_schema(schema)
+    
+    if existing_task_tree and not delta:
+        budget = plan_budget("merge", prompt, f"{tree_outline(existing_task_tree)}\n{brain_dump}")
+    else:
+        budget = plan_budget("delta" if delta else "create", prompt, brain_dump)
+    if not budget.fits:
+        # One streamed call would come back truncated; generate in chunks and send the result
+        print(f"Brain dump would not fit one streamed call ({budget}), generating in chunks")
+        task_tree = await create_task_tree(brain_dump, existing_task_tree, use_cache=use_cache)
+        yield {"type": "task_tree", "task_tree": task_tree}
+        return
+    
+    config = get_llm_config()
+    cache_key = structured_cache_key(output_schema, prompt, config)
+    use_cache = use_cache and response_cache.enabled
+    cached = await response_cache.aget(cache_key) if use_cache else None
+    
+    if cached is not None:
+        output = schema.model_validate(cached)
+        for index, category in enumerate(output.model_dump()["categories"]):
+            yield {"type": "category", "category_index": index, "node": category}
+    else:
+        if not use_cache and response_cache.enabled:
+            response_cache.record_bypass()
+        
+        llm = llm_registry.get_chat_model(**token_budget.apply(config, budget))
+        if config["provider"] == "openai":
+            llm = llm.bind(response_format={"type": "json_object"})
+        
+        compact = output_schema is not schema
+        if compact:
+            parser = IncrementalTreeParser(categories_key=CATEGORIES_KEY, projects_key=PROJECTS_KEY)
+        else:
+            parser = IncrementalTreeParser()
+        # The schema goes after the static instructions, so the system message stays one cacheable prefix
+        streaming_prompt = append_to_system(
+            prompt, STREAMING_JSON_OUTPUT.format(schema=json.dumps(output_schema.model_json_schema()))
+        )
+        usage = {"input_tokens": 0, "output_tokens": 0, "input_token_details": {}}
+        async for chunk in llm.astream(streaming_prompt):
+            for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                if key == "input_token_details":
+                    usage[key] = value
+                elif key in usage:
+                    usage[key] += value
+            for event in parser.feed(_chunk_text(chunk)):
+                if compact:
+                    event["node"] = expand_node(event["type"], event["node"])
+                yield event
+        if usage["output_tokens"]:
+            token_budget.record(
+                budget, usage["input_tokens"], usage["output_tokens"],
+                usage["input_token_details"].get("cache_read", 0)
+            )
+        
+        raw = parser.buffer
+        try:
+            output = output_schema.model_validate_json(raw[raw.find("{"):raw.rfind("}") + 1])
+        except ValueError as e:
+            if not token_budget.truncated(budget, e, usage["output_tokens"]):
+                raise
+            # Cut off at max_tokens: redo it in one call at the output ceiling;
+            # the task_tree event below replaces the categories streamed so far
+            print(f"Streamed output cut off at max_tokens {budget.max_tokens}, retrying at {budget.output_ceiling}")
+            output = await invoke_structured(schema, prompt, use_cache=use_cache, budget=budget.at_ceiling())
+        else:
+            output = expand(schema, output)
+            if use_cache:
+                await response_cache.aset(cache_key, output.model_dump())
+    
+    if delta:
+        task_tree = merge_delta_into_tree(existing_task_tree, [output.model_dump()])
+    else:
+        task_tree = await finalize_created_tree(output.model_dump(), existing_task_tree, use_cache=use_cache)
+    yield {"type": "task_tree", "task_tree": task_tree}
+
+def build_validation_prompt(original_outline: str, new_outline: str) -> Prompt:
+    """
+    Build the name-preservation prompt from outlines of the original tree
+    and of the new tree (or part of it).
+    """
+    return VALIDATE_NAMES.render(original_outline=original_outline, new_outline=new_outline)
+
 # Validation Stage: Ensure original item names are preserved
 @traceable(run_type="chain", name="Validate Name Preservation")
-def validate_name_preservation(new_tree: Dict[str, Any], original_tree: Dict[str, Any]) -> Dict[str, Any]:
+async def validate_name_preservation(
+    new_tree: Dict[str, Any],
+    original_tree: Dict[str, Any],
+    use_cache: bool = True
+) -> Dict[str, Any]:
     """
     Validate that items from the original tree maintain their exact names in the new tree.
     Uses AI to correct any renamed items back to their original names.
     """
     print("VALIDATION: Ensuring original item names are preserved...")
     
-    llm = get_llm()
-    structured_llm = llm.with_structured_output(TaskTreeValidationOutput)
-    
-    output: TaskTreeValidationOutput = structured_llm.invoke(
-        f"""
-You are a validation agent ensuring data consistency when merging task trees.
-
-ORIGINAL TREE (these item names MUST be preserved exactly):
----
-{json.dumps(original_tree, indent=2)}
----
-
-NEW TREE (may have renamed some original items):
----
-{json.dumps(new_tree, indent=2)}
----
-
-Your task:
-1. Compare the two trees carefully
-2. Identify any items in the NEW tree that appear to be the same as items in the ORIGINAL tree but have different names
-3. CORRECT those names back to match the ORIGINAL tree EXACTLY
-4. Keep any truly new items with their new names
-5. Preserve all other aspects (structure, dependencies, subtasks)
-
-⚠️ CRITICAL RULES:
-- Original item names must match EXACTLY (character for character)
-- Do NOT rename truly new items that weren't in the original tree
-- If you're unsure whether an item is the same, compare context (parent category/project, similar purpose)
-- Preserve the complete structure - don't drop any items
-
-Return the corrected tree with original names preserved.
-"""
-    )
+    original_outline = tree_outline(original_tree)
+    new_outline = tree_outline(new_tree)
+    prompt = build_validation_prompt(original_outline, new_outline)
+    budget = plan_budget("validate", prompt, new_outline)
+    
+    if budget.fits:
+        output: TaskTreeValidationOutput = await invoke_structured(
+            TaskTreeValidationOutput, prompt, use_cache=use_cache, budget=budget
+        )
+        validated_tree = output.model_dump()
+    else:
+        # Too big to return in one call: validate groups of categories against the full original
+        groups = split_categories(new_tree, budget.pieces)
+        print(f"Validating in {len(groups)} parts ({budget})")
+        
+        async def validate_group(group: Dict[str, Any]) -> List[Dict[str, Any]]:
+            group_outline = tree_outline(group)
+            group_prompt = build_validation_prompt(original_outline, group_outline)
+            output: TaskTreeValidationOutput = await invoke_structured(
+                TaskTreeValidationOutput,
+                group_prompt,
+                use_cache=use_cache,
+                budget=plan_budget("validate", group_prompt, group_outline)
+            )
+            return output.model_dump()["categories"]
+        
+        results = await gather_bounded(groups, validate_group, BRAIN_DUMP_CHUNK_CONCURRENCY)
+        validated_tree = {"categories": [category for result in results for category in result]}
     
-    validated_tree = output.model_dump()
     print("Validation complete - original names preserved")
     
     return validated_tree
 
+# Refinement fan-out configuration
+REFINE_CONCURRENCY = int(os.getenv('REFINE_CONCURRENCY', '4'))
+REFINE_SHARD_MAX_TASKS = int(os.getenv('REFINE_SHARD_MAX_TASKS', '40'))
+REFINE_SHARD_RETRIES = int(os.getenv('REFINE_SHARD_RETRIES', '2'))
+
+def build_refine_prompt(task_tree_outline: str) -> Prompt:
+    """
+    Build the stage 2 prompt for a task tree (or one shard of it), given
+    its outline with handles (see tree_outline_with_handles).
+    """
+    return REFINE_TASK_TREE.render(task_tree_outline=task_tree_outline)
+
+def split_tree_into_shards(
+    task_tree: Dict[str, Any],
+    max_tasks_per_shard: int,
+    split_projects: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Split a task tree into independently refinable shards, one per category.
+    Categories with more than max_tasks_per_shard tasks are split further by
+    project; with split_projects, so are single projects over the limit
+    (by task). Each shard records the index of the category it came from,
+    and whether its first project continues the previous shard's last one.
+    """
+    shards = []
+    
+    for cat_index, category in enumerate(task_tree.get('categories', [])):
+        groups = [[]]
+        continues = [False]
+        group_tasks = 0
+        
+        for project in category.get('projects', []):
+            tasks = project.get('tasks', [])
+            pieces = [tasks]
+            if split_projects and len(tasks) > max_tasks_per_shard:
+                pieces = [tasks[i:i + max_tasks_per_shard] for i in range(0, len(tasks), max_tasks_per_shard)]
+            for piece_index, piece in enumerate(pieces):
+                if groups[-1] and group_tasks + len(piece) > max_tasks_per_shard:
+                    groups.append([])
+                    continues.append(piece_index > 0)
+                    group_tasks = 0
+                groups[-1].append({**project, "tasks": piece} if len(pieces) > 1 else project)
+                group_tasks += len(piece)
+        
+        for group, continues_project in zip(groups, continues):
+            shards.append({
+                "category_index": cat_index,
+                "continues_project": continues_project,
+                "tree": {"categories": [{**category, "projects": group}]}
+            })
+    
+    return shards
+
+def merge_refined_shards(shards: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge refined shards back into one tree in their original order.
+    Shards split from the same category are joined back into one category.
+    """
+    categories = []
+    merged_by_index = {}
+    
+    for shard, result in zip(shards, results):
+        result_categories = result.get('categories', [])
+        if not result_categories:
+            continue
+        
+        cat_index = shard["category_index"]
+        if cat_index in merged_by_index:
+            projects = list(result_categories[0].get('projects', []))
+            merged_projects = merged_by_index[cat_index]['projects']
+            if shard.get("continues_project") and projects and merged_projects:
+                merged_projects[-1]['tasks'].extend(projects.pop(0).get('tasks', []))
+            merged_projects.extend(projects)
+        else:
+            merged_by_index[cat_index] = result_categories[0]
+            categories.append(result_categories[0])
+        
+        # Keep anything extra the model split out of the shard
+        categories.extend(result_categories[1:])
+    
+    return {"categories": categories}
+
+def plan_refine_shards(task_tree: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Split a tree into refine shards and budget each one. While some shard
+    is predicted not to fit one call, the tree is re-split with a smaller
+    task limit (splitting single large projects too). Each shard gets its
+    "prompt", "handles" and "budget".
+    """
+    max_tasks = REFINE_SHARD_MAX_TASKS
+    split_projects = False
+    while True:
+        shards = split_tree_into_shards(task_tree, max_tasks, split_projects=split_projects)
+        worst = None
+        for shard in shards:
+            outline, handles = tree_outline_with_handles(shard["tree"])
+            shard["prompt"] = build_refine_prompt(outline)
+            shard["handles"] = handles
+            shard["budget"] = plan_budget("refine", shard["prompt"], outline)
+            if worst is None or shard["budget"].pieces > worst["budget"].pieces:
+                worst = shard
+        
+        if worst is None or worst["budget"].fits or max_tasks == 1:
+            return shards
+        worst_tasks = sum(len(p.get('tasks', [])) for p in worst["tree"]["categories"][0].get('projects', []))
+        max_tasks = max(1, min(max_tasks, worst_tasks // worst["budget"].pieces))
+        split_projects = True
+        print(f"Refine shard would not fit one call ({worst['budget']}), re-sharding at {max_tasks} tasks")
+
+async def _refine_shard(shard: Dict[str, Any], use_cache: bool) -> Dict[str, Any]:
+    """
+    Refine one planned shard, retrying it on its own if the LLM call fails.
+    """
+    for attempt in range(REFINE_SHARD_RETRIES + 1):
+        try:
+            output: TaskTreeRefinementOutput = await invoke_structured(
+                TaskTreeRefinementOutput,
+                shard["prompt"],
+                use_cache=use_cache,
+                budget=shard["budget"]
+            )
+            # Map the handles the model echoed back to the shard's real IDs
+            return restore_ids(output.model_dump(), shard["handles"])
+        except Exception as e:
+            if attempt == REFINE_SHARD_RETRIES:
+                raise
+            print(f"Refine shard failed (attempt {attempt + 1}), retrying: {e}")
+
+# Memo of refined tasks, keyed by each task's content hash in its
+# category/project context, so a repeat refine only sends dirty tasks
+refine_memo = LLMResponseCache.from_env(prefix="REFINE_MEMO", default_db_path="refine_memo.db")
+
+def refine_memo_key(category: Dict[str, Any], project: Dict[str, Any], task: Dict[str, Any]) -> str:
+    """Memo key for the refined version of one task."""
+    config = get_llm_config()
+    return refine_memo.make_key(
+        config.get('provider'),
+        config.get('model'),
+        config.get('temperature'),
+        TaskTreeRefinementOutput,
+        f"{category.get('name')}\n{project.get('name')}\n{task_hash(task)}"
+    )
+
+def _strip_ids(node: Dict[str, Any]) -> Dict[str, Any]:
+    stripped = {key: value for key, value in node.items() if key != 'id'}
+    if 'subtasks' in stripped:
+        stripped['subtasks'] = [_strip_ids(s) for s in stripped['subtasks'] or []]
+    return stripped
+
+def _align_nodes(sources: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+    """
+    Pair each source node with its refined counterpart, by ID (restored
+    from the handle the model echoed), normalized name or, when the model
+    kept the same number of nodes, by position (typo fixes rename nodes).
+    Returns (matches, unmatched_results).
+    """
+    by_id = {}
+    by_name = {}
+    for result in results:
+        if result.get('id'):
+            by_id.setdefault(result['id'], result)
+        by_name.setdefault(normalize_name(result.get('name')), result)
+    
+    matches = []
+    used = set()
+    for index, source in enumerate(sources):
+        match = by_id.get(source.get('id')) if source.get('id') else None
+        if match is None or id(match) in used:
+            match = by_name.get(normalize_name(source.get('name')))
+        if match is None and len(results) == len(sources):
+            match = results[index]
+        if match is not None and id(match) in used:
+            match = None
+        if match is not None:
+            used.add(id(match))
+        matches.append(match)
+    
+    return matches, [r for r in results if id(r) not in used]
+
+async def _refine_sharded(
+    task_tree: Dict[str, Any],
+    use_cache: bool,
+    progress: ProgressCallback = no_progress
+) -> Dict[str, Any]:
+    """Refine a tree in concurrent shards and merge the results."""
+    shards = plan_refine_shards(task_tree)
+    print(f"Refining {len(shards)} shard(s) with concurrency {REFINE_CONCURRENCY}")
+    progress("refine_shards", total=len(shards))
+    refined = 0
+    
+    async def refine(shard: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal refined
+        result = await _refine_shard(shard, use_cache)
+        refined += 1
+        progress("shard_refined", done=refined, total=len(shards))
+        return result
+    
+    results = await gather_bounded(shards, refine, REFINE_CONCURRENCY)
+    
+    return merge_refined_shards(shards, results)
+
 # Stage 2: Refine task tree by breaking down big/vague tasks
 @traceable(run_type="chain", name="Refine Task Tree")
-def refine_task_tree(task_tree: Dict[str, Any]) -> Dict[str, Any]:
+async def refine_task_tree_incremental(
+    task_tree: Dict[str, Any],
+    use_cache: bool = True,
+    progress: ProgressCallback = no_progress
+) -> Tuple[Dict[str, Any], List[str]]:
     """
-    Take the user-verified task tree and break down big/vague tasks further.
-    Also fixes any typos or issues from user editing.
-    Returns refined task tree for final verification.
+    Refine a task tree, taking every task whose content hash is already in
+    the refine memo from there and sending only the dirty tasks (with their
+    category/project context) to the LLM. Refined tasks are memoized under
+    both their source and their own hash, so refining the returned tree
+    again only sends the tasks edited since.
+    Returns (refined_tree, cached_node_ids), where cached_node_ids are the
+    IDs of tasks - and of projects/categories made up entirely of such
+    tasks - that were served from the memo. progress is called with the
+    memo hit count and as each shard is refined.
     """
     print("STAGE 2: Breaking down tasks and polishing...")
     
-    llm = get_llm()
-    structured_llm = llm.with_structured_output(TaskTreeRefinementOutput)
-    
-    output: TaskTreeRefinementOutput = structured_llm.invoke(
-        f"""
-You are a helpful executive functioning coach and personal planning assistant agent that excels in breaking down projects and tasks into more manageable sub-lists and sub-tasks.
-
-Your primary task is to take an existing task tree and further break it down into logical, more specific to-do items.
-
-Current task tree (may contain user edits and only selected tasks):
----
-{task_tree}
----
-
-Instructions:
-- Add, where relevant and/or helpful, breakdowns of big and/or vague tasks.
-- For example, if a task is to 'clean the bathroom', the breakdown might include:
-  * 'clean the toilet'
-  * 'clean the shower'
-  * 'clean the mirror and sink'
-  * 'sweep and mop the floor'
-  * 'take out the trash'
-- Keep the same hierarchical structure (Category > Project > Task > Subtask).
-- Break down ALL tasks provided into specific, actionable subtasks.
-- If a task already has subtasks but they're too vague, add more detail.
-- Maintain any dependencies that were already noted.
-- Fix any typos or formatting issues from user edits.
-
-⚠️ IMPORTANT: You may receive only a subset of tasks that need breakdown. Process all tasks you receive.
-⚠️ Break down each task into clear, specific, actionable steps.
-⚠️ Do not skip any tasks - every task should be broken down further.
-"""
-    )
+    use_memo = use_cache and refine_memo.enabled
+    if not use_cache and refine_memo.enabled:
+        refine_memo.record_bypass()
+    
+    categories = task_tree.get('categories', [])
+    # One batched memo lookup; disk reads run off the event loop
+    memo_keys = {
+        (ci, pi, ti): refine_memo_key(category, project, task)
+        for ci, category in enumerate(categories)
+        for pi, project in enumerate(category.get('projects', []))
+        for ti, task in enumerate(project.get('tasks', []))
+    } if use_memo else {}
+    memo_hits = await refine_memo.aget_many(list(memo_keys.values())) if memo_keys else {}
+    memo_stores = []
+    cached_tasks = {}
+    dirty_tree = {"categories": []}
+    dirty_sources = []
+    dirty_project_sources = {}
+    
+    for ci, category in enumerate(categories):
+        dirty_projects = []
+        project_sources = []
+        for pi, project in enumerate(category.get('projects', [])):
+            tasks = project.get('tasks', [])
+            dirty_tasks = []
+            for ti, task in enumerate(tasks):
+                cached = memo_hits.get(memo_keys[(ci, pi, ti)]) if use_memo else None
+                if cached is not None:
+                    cached_tasks[(ci, pi, ti)] = cached
+                else:
+                    dirty_tasks.append(task)
+            if dirty_tasks or not tasks:
+                dirty_projects.append({**project, "tasks": dirty_tasks})
+                project_sources.append(pi)
+        if dirty_projects or not category.get('projects'):
+            dirty_tree["categories"].append({**category, "projects": dirty_projects})
+            dirty_sources.append(ci)
+            dirty_project_sources[ci] = project_sources
+    
+    total_tasks = sum(len(p.get('tasks', [])) for c in categories for p in c.get('projects', []))
+    print(f"Refine memo: {len(cached_tasks)}/{total_tasks} task(s) cached")
+    progress("refine", cached=len(cached_tasks), total=total_tasks)
+    
+    if dirty_tree["categories"]:
+        refined_dirty = await _refine_sharded(dirty_tree, use_cache, progress)
+    else:
+        refined_dirty = {"categories": []}
+    
+    category_matches, extra_categories = _align_nodes(dirty_tree["categories"], refined_dirty["categories"])
+    refined_by_index = dict(zip(dirty_sources, zip(dirty_tree["categories"], category_matches)))
+    
+    refined_tree = {"categories": []}
+    cached_node_ids = []
+    
+    for ci, category in enumerate(categories):
+        dirty_category, refined_category = refined_by_index.get(ci, (None, None))
+        dirty_projects = dirty_category.get('projects', []) if dirty_category else []
+        project_matches, extra_projects = _align_nodes(
+            dirty_projects,
+            refined_category.get('projects', []) if refined_category else []
+        )
+        refined_projects = dict(zip(
+            dirty_project_sources.get(ci, []),
+            zip(dirty_projects, project_matches)
+        ))
+        
+        out_category = {
+            "id": category.get('id'),
+            "name": refined_category.get('name') if refined_category else category.get('name'),
+            "projects": []
+        }
+        category_cached = bool(category.get('projects'))
+        
+        for pi, project in enumerate(category.get('projects', [])):
+            dirty_project, refined_project = refined_projects.get(pi, (None, None))
+            task_matches, extra_tasks = _align_nodes(
+                dirty_project.get('tasks', []) if dirty_project else [],
+                refined_project.get('tasks', []) if refined_project else []
+            )
+            refined_tasks = dict(zip(
+                (id(t) for t in (dirty_project.get('tasks', []) if dirty_project else [])),
+                task_matches
+            ))
+            
+            out_project = {
+                "id": project.get('id'),
+                "name": refined_project.get('name') if refined_project else project.get('name'),
+                "tasks": [],
+                "dependencies": (refined_project or project).get('dependencies') or []
+            }
+            project_cached = bool(project.get('tasks'))
+            
+            for ti, task in enumerate(project.get('tasks', [])):
+                cached = cached_tasks.get((ci, pi, ti))
+                if cached is not None:
+                    out_project["tasks"].append({**copy.deepcopy(cached), "id": task.get('id')})
+                    # Renamed parents move the refined task to a new key
+                    own_key = refine_memo_key(out_category, out_project, cached)
+                    if own_key not in memo_hits:
+                        memo_stores.append((own_key, cached))
+                    if task.get('id'):
+                        cached_node_ids.append(task['id'])
+                    continue
+                
+                project_cached = False
+                refined_task = refined_tasks.get(id(task))
+                if refined_task is None:
+                    # The model dropped this task; keep it as it was
+                    out_project["tasks"].append(copy.deepcopy(task))
+                    continue
+                if use_memo:
+                    # The refined task is its own answer: the client sends
+                    # the refined tree back, so store it under its own key too
+                    stripped = _strip_ids(refined_task)
+                    memo_stores.append((memo_keys[(ci, pi, ti)], stripped))
+                    memo_stores.append((refine_memo_key(out_category, out_project, stripped), stripped))
+                out_project["tasks"].append(refined_task)
+            
+            out_project["tasks"].extend(extra_tasks)
+            out_category["projects"].append(out_project)
+            if project_cached and project.get('id'):
+                cached_node_ids.append(project['id'])
+            category_cached = category_cached and project_cached
+        
+        out_category["projects"].extend(extra_projects)
+        refined_tree["categories"].append(out_category)
+        if category_cached and category.get('id'):
+            cached_node_ids.append(category['id'])
     
-    refined_tree = output.model_dump()
+    refined_tree["categories"].extend(extra_categories)
+    await refine_memo.aset_many(memo_stores)
     
-    # Assign IDs, preserving from original task_tree
-    refined_tree = assign_ids_to_tree(refined_tree, task_tree)
+    # Keep the IDs carried over above; match the rest by name against task_tree
+    refined_tree = assign_ids_to_tree(refined_tree, task_tree, keep_ids=True)
     
+    return refined_tree, cached_node_ids
+
+async def refine_task_tree(task_tree: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Take the user-verified task tree and break down big/vague tasks further.
+    Also fixes any typos or issues from user editing.
+    The tree is refined in per-category (or per-project group) shards that
+    run concurrently, up to REFINE_CONCURRENCY at a time; tasks unchanged
+    since an earlier refine are taken from the refine memo.
+    Set use_cache=False to skip the LLM response cache and the memo.
+    Returns refined task tree for final verification.
+    """
+    refined_tree, _ = await refine_task_tree_incremental(task_tree, use_cache=use_cache)
     return refined_tree
 
 # Helper function to assign unique IDs to all items
-def assign_ids_to_tree(task_tree: Dict[str, Any], existing_tree: Dict[str, Any] = None) -> Dict[str, Any]:
+def assign_ids_to_tree(
+    task_tree: Dict[str, Any],
+    existing_tree: Union[Dict[str, Any], CompactTree, None] = None,
+    keep_ids: bool = False
+) -> Dict[str, Any]:
     """
     Assign unique IDs to all items in the task tree.
-    If existing_tree is provided, try to preserve IDs for items with matching names.
-    """
-    # Build a lookup map of existing items by name
-    existing_map = {}
-    if existing_tree:
-        for cat in existing_tree.get('categories', []):
-            cat_key = f"cat:{cat.get('name')}"
-            existing_map[cat_key] = cat.get('id')
-            
-            for proj in cat.get('projects', []):
-                proj_key = f"proj:{cat.get('name')}:{proj.get('name')}"
-                existing_map[proj_key] = proj.get('id')
-                
-                for task in proj.get('tasks', []):
-                    task_key = f"task:{cat.get('name')}:{proj.get('name')}:{task.get('name')}"
-                    existing_map[task_key] = task.get('id')
-                    
-                    for subtask in task.get('subtasks', []):
-                        sub_key = f"sub:{cat.get('name')}:{proj.get('name')}:{task.get('name')}:{subtask.get('name')}"
-                        existing_map[sub_key] = subtask.get('id')
-    
-    # Assign IDs to new tree
-    for cat in task_tree.get('categories', []):
-        cat_key = f"cat:{cat.get('name')}"
-        cat['id'] = existing_map.get(cat_key) or str(uuid.uuid4())
-        
-        for proj in cat.get('projects', []):
-            proj_key = f"proj:{cat.get('name')}:{proj.get('name')}"
-            proj['id'] = existing_map.get(proj_key) or str(uuid.uuid4())
-            
-            for task in proj.get('tasks', []):
-                task_key = f"task:{cat.get('name')}:{proj.get('name')}:{task.get('name')}"
-                task['id'] = existing_map.get(task_key) or str(uuid.uuid4())
-                
-                for subtask in task.get('subtasks', []):
-                    sub_key = f"sub:{cat.get('name')}:{proj.get('name')}:{task.get('name')}:{subtask.get('name')}"
-                    subtask['id'] = existing_map.get(sub_key) or str(uuid.uuid4())
-    
-    return task_tree
+    If existing_tree is provided, try to preserve IDs for items with matching names
+    (matched through a name-path index of existing_tree built once; a
+    CompactTree keeps its index for the next call).
+    With keep_ids, items that already have an ID keep it.
+    """
+    return assign_ids(task_tree, existing_tree or None, keep_ids=keep_ids)
 
 # Helper function to format task tree for display
-def format_task_tree_for_display(task_tree: Dict[str, Any]) -> str:
+def format_task_tree_for_display(task_tree: Union[Dict[str, Any], CompactTree]) -> str:
     """
-    Convert task tree JSON to readable hierarchical text.
+    Convert task tree JSON (or a CompactTree) to readable hierarchical text.
     """
+    if isinstance(task_tree, CompactTree):
+        return task_tree.format_for_display()
+    
     lines = []
     
     for category in task_tree.get("categories", []):
@@ -0,0 +1,266 @@
+"""
+Background jobs for long planning requests.
+
+A planning request can hold its HTTP connection for several LLM calls in
+a row. The /api/jobs/* endpoints instead submit the work here and return
+a job ID at once; the client polls the job or follows its progress
+events over SSE, and can cancel it while it is queued or running.
+
+JOB_WORKERS workers take jobs from a queue of at most JOB_QUEUE_MAX
+waiting jobs; submit() raises JobQueueFullError when it is full, so the
+API can answer 429 instead of piling up work. Jobs cancelled while queued
+stop counting against the limit at once, though a worker only drops them
+when it comes to them. A job's run function is
+called with a progress callback bound to the job, progress(stage, **data),
+to pass down to the planner. Finished jobs are kept for
+JOB_RESULT_TTL_SECONDS; a result with a to_dict() method (e.g. a task
+tree kept as a CompactTree) is stored as it is and rendered on each read.
+
+Jobs live in this process's memory: run one server process, or route a
+job's requests to the process that accepted it.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+JOB_MAX_RETAINED = 1000
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobQueueFullError(Exception):
+    """The job queue already holds JOB_QUEUE_MAX waiting jobs."""
+
+
+class Job:
+    __slots__ = (
+        "id", "kind", "status", "created_at", "started_at", "finished_at",
+        "events", "result", "error", "cancel_requested", "run", "task", "_changed"
+    )
+
+    def __init__(self, kind: str, run: Callable[..., Awaitable[Any]]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.cancel_requested = False
+        self.run = run
+        self.task: Optional["asyncio.Task"] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def emit(self, stage: str, **data: Any) -> None:
+        """Record a progress event and wake anyone following the job."""
+        self.events.append({"stage": stage, "at": time.time(), **data})
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+        self.emit(status)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        info = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.events[-1] if self.events else None,
+        }
+        if include_result and self.status == "succeeded":
+            info["result"] = self.result.to_dict() if hasattr(self.result, "to_dict") else self.result
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+class JobManager:
+    """Bounded queue of planning jobs run by a fixed pool of workers."""
+
+    def __init__(
+        self,
+        workers: int = 4,
+        queue_max: int = 100,
+        ttl_seconds: float = 3600,
+        max_retained: int = JOB_MAX_RETAINED
+    ):
+        self.workers = max(1, workers)
+        self.queue_max = max(1, queue_max)
+        self.ttl_seconds = ttl_seconds
+        self.max_retained = max_retained
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        # Jobs waiting to run; the queue also holds jobs cancelled while waiting
+        self._queued = 0
+        self._workers: List["asyncio.Task"] = []
+        self._metrics = {
+            "submitted": 0,
+            "rejected_queue_full": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+        self._started = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "JobManager":
+        return cls(workers=JOB_WORKERS, queue_max=JOB_QUEUE_MAX, ttl_seconds=JOB_RESULT_TTL_SECONDS)
+
+    def _start_workers(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _prune(self) -> None:
+        """Forget finished jobs past their TTL, and the oldest finished ones over max_retained."""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.ttl_seconds:
+                del self._jobs[job_id]
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if job.finished:
+                del self._jobs[job_id]
+
+    def submit(self, kind: str, run: Callable[..., Awaitable[Any]]) -> Job:
+        """
+        Queue run(progress) (a coroutine function) as a job of the given
+        kind; progress(stage, **data) records a progress event on the job.
+        Raises JobQueueFullError when queue_max jobs are already waiting.
+        """
+        self._start_workers()
+        self._prune()
+        if self._queued >= self.queue_max:
+            self._metrics["rejected_queue_full"] += 1
+            raise JobQueueFullError(f"{self.queue_max} jobs are already waiting")
+        job = Job(kind, run)
+        self._queue.put_nowait(job)
+        self._queued += 1
+        self._jobs[job.id] = job
+        self._metrics["submitted"] += 1
+        job.emit("queued", position=self._queued)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == "queued":
+                    self._queued -= 1
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        self._started += 1
+        self._wait_seconds += job.started_at - job.created_at
+        job.emit("running")
+        # Its own task, so cancelling the job leaves the worker running
+        job.task = asyncio.create_task(job.run(job.emit))
+        try:
+            job.result = await job.task
+        except asyncio.CancelledError:
+            self._record(job, "cancelled")
+            if not job.cancel_requested:
+                # The worker itself is being cancelled (shutdown)
+                raise
+            return
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            self._record(job, "failed")
+            return
+        self._record(job, "succeeded")
+
+    def _record(self, job: Job, status: str) -> None:
+        job.finish(status)
+        self._metrics[status] += 1
+        if job.started_at is not None:
+            self._run_seconds += job.finished_at - job.started_at
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a queued or running job. Returns the job (unchanged if it had
+        already finished), or None if there is no such job.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_requested = True
+        if job.status == "queued":
+            # The worker skips it when it comes up
+            self._queued -= 1
+            self._record(job, "cancelled")
+        elif job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def events(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Every progress event of a job so far, then new ones as they happen, until it finishes."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        sent = 0
+        while True:
+            changed = job._changed
+            while sent < len(job.events):
+                yield job.events[sent]
+                sent += 1
+            if job.finished:
+                return
+            await changed.wait()
+
+    def close(self) -> None:
+        """Cancel every worker, and with them the jobs they are running."""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        for job in self._jobs.values():
+            if job.status == "queued":
+                self._record(job, "cancelled")
+        self._queued = 0
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        finished = self._metrics["succeeded"] + self._metrics["failed"] + self._metrics["cancelled"]
+        return {
+            **self._metrics,
+            "workers": self.workers,
+            "queue_max": self.queue_max,
+            "queued": self._queued,
+            "running": sum(1 for job in self._jobs.values() if job.status == "running"),
+            "retained": len(self._jobs),
+            "avg_wait_ms": round(self._wait_seconds / max(1, self._started) * 1000, 1),
+            "avg_run_ms": round(self._run_seconds / max(1, finished) * 1000, 1),
+        }
+
+
+job_manager = JobManager.from_env()
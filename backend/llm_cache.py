@@ -0,0 +1,355 @@
+"""
+Content-addressed cache for LLM responses.
+
+Responses are keyed by a hash of (provider, model, temperature, output
+schema, normalized prompt), held in an in-memory LRU with a TTL, and
+written through to a SQLite tier so they survive restarts.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from prompts import Prompt, prompt_text
+from single_flight import single_flight
+
+# Relative default database paths are resolved here, not in the working directory
+CACHE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalize_prompt(prompt: Prompt) -> str:
+    """Normalize a prompt (text or messages) so trivially different whitespace hashes the same."""
+    prompt = unicodedata.normalize("NFC", prompt_text(prompt))
+    lines = [line.rstrip() for line in prompt.strip().splitlines()]
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=None)
+def _schema_fingerprint(schema: type) -> str:
+    return json.dumps(schema.model_json_schema(), sort_keys=True)
+
+
+class LLMResponseCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of JSON-serializable LLM responses.
+
+    get/set touch SQLite on the calling thread. Async code uses aget/aset
+    (or the *_many variants), which serve memory hits inline and do the
+    disk work with asyncio.to_thread so it never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 86400,
+        db_path: Optional[str] = None,
+        disk_max_entries: int = 10000,
+        enabled: bool = True
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.disk_max_entries = disk_max_entries
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        # _lock guards the memory tier and metrics, _db_lock the SQLite
+        # connection, so memory hits never wait on disk I/O
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        # Rows in the SQLite tier, counted once on open and kept up to date
+        self._disk_entries = 0
+        self._metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+            "bypassed": 0,
+        }
+
+    @classmethod
+    def from_env(cls, prefix: str = "LLM_CACHE", default_db_path: str = "llm_cache.db") -> "LLMResponseCache":
+        """
+        Build a cache configured from <prefix>_* environment variables. A
+        relative default_db_path is resolved against this module's
+        directory, not the working directory.
+        """
+        return cls(
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", "86400")),
+            db_path=os.getenv(f"{prefix}_DB_PATH", os.path.join(CACHE_DIR, default_db_path)) or None,
+            disk_max_entries=int(os.getenv(f"{prefix}_DISK_MAX_ENTRIES", "10000")),
+            enabled=os.getenv(f"{prefix}_ENABLED", "true").lower() in ("1", "true", "yes"),
+        )
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        temperature: Optional[float],
+        schema: Union[type, str],
+        prompt: Prompt
+    ) -> str:
+        """Hash the call parameters into a stable cache key."""
+        schema_part = schema if isinstance(schema, str) else _schema_fingerprint(schema)
+        payload = json.dumps(
+            [provider, model, temperature, schema_part, normalize_prompt(prompt)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # SQLite tier (call with _db_lock held)
+    # ------------------------------------------------------------------
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)")
+            self._db.commit()
+            (self._disk_entries,) = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        return self._db
+
+    def _disk_get_many(self, keys: List[str], now: float) -> Dict[str, Any]:
+        """Unexpired values for keys found on disk; also copied into the memory tier."""
+        found, expired = {}, []
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return found
+            for key in keys:
+                row = db.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                value, expires_at = row
+                if expires_at <= now:
+                    expired.append(key)
+                    continue
+                found[key] = (expires_at, json.loads(value))
+            if expired:
+                deleted = db.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in expired]).rowcount
+                self._disk_entries -= max(deleted, 0)
+                db.commit()
+
+        with self._lock:
+            self._metrics["expired"] += len(expired)
+            for key, (expires_at, value) in found.items():
+                self._memory_put(key, value, expires_at)
+        return {key: value for key, (_, value) in found.items()}
+
+    def _disk_put_many(self, items: List[Tuple[str, Any]], expires_at: float, now: float) -> None:
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return
+            for key, value in items:
+                encoded = json.dumps(value, ensure_ascii=False)
+                inserted = db.execute(
+                    "INSERT OR IGNORE INTO llm_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                    (key, encoded, expires_at, now)
+                ).rowcount
+                if inserted:
+                    self._disk_entries += 1
+                else:
+                    db.execute(
+                        "UPDATE llm_cache SET value = ?, expires_at = ?, created_at = ? WHERE key = ?",
+                        (encoded, expires_at, now, key)
+                    )
+            overflow = self._disk_entries - self.disk_max_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY created_at LIMIT ?)",
+                    (overflow,)
+                )
+                self._disk_entries -= overflow
+            db.commit()
+        if overflow > 0:
+            with self._lock:
+                self._metrics["disk_evictions"] += overflow
+
+    # ------------------------------------------------------------------
+    # Memory tier (call with _lock held)
+    # ------------------------------------------------------------------
+    def _memory_put(self, key: str, value: Any, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._metrics["evictions"] += 1
+
+    def _memory_get_many(self, keys: List[str], now: float) -> Dict[str, Any]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._metrics["memory_hits"] += 1
+                    found[key] = value
+                else:
+                    del self._memory[key]
+                    self._metrics["expired"] += 1
+        return found
+
+    def _record_disk_lookups(self, looked_up: int, found: int) -> None:
+        with self._lock:
+            self._metrics["disk_hits"] += found
+            self._metrics["misses"] += looked_up - found
+
+    def _memory_set_many(self, items: List[Tuple[str, Any]]) -> Tuple[float, float]:
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            for key, value in items:
+                self._memory_put(key, value, expires_at)
+            self._metrics["stores"] += len(items)
+        return expires_at, now
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss (blocking)."""
+        now = time.time()
+        found = self._memory_get_many([key], now)
+        if key not in found:
+            found = self._disk_get_many([key], now)
+            self._record_disk_lookups(1, len(found))
+        return found.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value in both tiers (blocking)."""
+        expires_at, now = self._memory_set_many([(key, value)])
+        self._disk_put_many([(key, value)], expires_at, now)
+
+    async def aget_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Cached values for every key that hits; disk lookups run in a worker thread."""
+        now = time.time()
+        found = self._memory_get_many(keys, now)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            on_disk = await asyncio.to_thread(self._disk_get_many, missing, now) if self.db_path else {}
+            self._record_disk_lookups(len(missing), len(on_disk))
+            found.update(on_disk)
+        return found
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return (await self.aget_many([key])).get(key)
+
+    async def aset_many(self, items: List[Tuple[str, Any]]) -> None:
+        """Store values in both tiers; the disk write runs in a worker thread."""
+        if not items:
+            return
+        expires_at, now = self._memory_set_many(items)
+        if self.db_path:
+            await asyncio.to_thread(self._disk_put_many, items, expires_at, now)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await self.aset_many([(key, value)])
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._metrics["bypassed"] += 1
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            db = self._get_db()
+            if db is not None:
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+                self._disk_entries = 0
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters plus current tier sizes."""
+        with self._lock:
+            hits = self._metrics["memory_hits"] + self._metrics["disk_hits"]
+            lookups = hits + self._metrics["misses"]
+            return {
+                **self._metrics,
+                "enabled": self.enabled,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+response_cache = LLMResponseCache.from_env()
+
+
+def structured_cache_key(schema: type, prompt: Prompt, llm_config: Dict[str, Any]) -> str:
+    """Cache key for a structured-output call made with llm_config."""
+    return response_cache.make_key(
+        llm_config.get("provider"),
+        llm_config.get("model"),
+        llm_config.get("temperature"),
+        schema,
+        prompt
+    )
+
+
+async def cached_structured_invoke(
+    structured_llm: Any,
+    schema: type,
+    prompt: Prompt,
+    llm_config: Dict[str, Any],
+    use_cache: bool = True
+) -> Any:
+    """
+    Invoke a structured-output runnable through the response cache. On a
+    miss, identical concurrent calls share one request (see single_flight).
+
+    llm_config is the provider/model/options dict the runnable was built
+    from; provider, model and temperature feed into the cache key.
+    """
+    key = structured_cache_key(schema, prompt, llm_config)
+    if not use_cache or not response_cache.enabled:
+        if response_cache.enabled:
+            response_cache.record_bypass()
+        # Cache-bypassing calls only share with each other
+        return await single_flight.do(f"{key}:bypass", lambda: structured_llm.ainvoke(prompt))
+
+    cached = await response_cache.aget(key)
+    if cached is not None:
+        return schema.model_validate(cached)
+
+    async def call() -> Any:
+        output = await structured_llm.ainvoke(prompt)
+        await response_cache.aset(key, output.model_dump())
+        return output
+
+    return await single_flight.do(key, call)
@@ -0,0 +1,201 @@
+"""
+Process-wide registry of long-lived LLM clients.
+
+Every planner stage, OCR request and to-do generation used to construct a
+fresh ChatOpenAI / ChatGoogleGenerativeAI / OpenAI / GenerativeModel, which
+meant a new HTTP connection pool (and TLS handshake) per call. The registry
+hands out one shared client per provider/model/config instead, backed by
+keep-alive connection pools, and caches the with_structured_output
+runnables built on top of them.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+import google.generativeai as genai
+from openai import OpenAI, AsyncOpenAI
+from langchain_openai import ChatOpenAI
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+def _freeze(value: Any) -> Any:
+    """Turn nested dicts/lists into hashable tuples for use in cache keys."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class LLMRegistry:
+    """
+    Shared, lazily-built LLM clients keyed by provider, model and options.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._openai_clients: Dict[str, Tuple[OpenAI, AsyncOpenAI]] = {}
+        self._chat_models: Dict[Tuple, Any] = {}
+        self._structured: Dict[Tuple, Any] = {}
+        self._gemini_models: Dict[Tuple, Any] = {}
+        self._gemini_configured = False
+        self._counters = {"created": 0, "reused": 0}
+        # Swappable so benchmarks can plug in a stub provider
+        self.chat_model_factory: Callable[..., Any] = self._default_chat_model_factory
+
+    # ------------------------------------------------------------------
+    # Connection pools
+    # ------------------------------------------------------------------
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+        )
+
+    def _get_http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        if self._http_async_client is None or self._http_async_client.is_closed:
+            timeout = httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT", "120")), connect=10.0)
+            self._http_client = httpx.Client(limits=self._limits(), timeout=timeout)
+            self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=timeout)
+        return self._http_client, self._http_async_client
+
+    def _count(self, created: bool) -> None:
+        self._counters["created" if created else "reused"] += 1
+
+    # ------------------------------------------------------------------
+    # Raw provider SDK clients (used by AIClient)
+    # ------------------------------------------------------------------
+    def get_openai_clients(self, api_key: Optional[str] = None) -> Tuple[OpenAI, AsyncOpenAI]:
+        """Return the shared sync and async OpenAI SDK clients."""
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        with self._lock:
+            clients = self._openai_clients.get(api_key)
+            self._count(clients is None)
+            if clients is None:
+                http_client, http_async_client = self._get_http_clients()
+                clients = (
+                    OpenAI(api_key=api_key, http_client=http_client),
+                    AsyncOpenAI(api_key=api_key, http_client=http_async_client),
+                )
+                self._openai_clients[api_key] = clients
+            return clients
+
+    def get_gemini_model(
+        self,
+        model_name: str,
+        system_instruction: Optional[str] = None,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Return a cached genai.GenerativeModel for the given configuration."""
+        key = (model_name, system_instruction, _freeze(generation_config or {}))
+        with self._lock:
+            if not self._gemini_configured:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                self._gemini_configured = True
+            model = self._gemini_models.get(key)
+            self._count(model is None)
+            if model is None:
+                kwargs = {}
+                if system_instruction:
+                    kwargs["system_instruction"] = system_instruction
+                if generation_config:
+                    kwargs["generation_config"] = generation_config
+                model = genai.GenerativeModel(model_name, **kwargs)
+                self._gemini_models[key] = model
+            return model
+
+    # ------------------------------------------------------------------
+    # LangChain chat models
+    # ------------------------------------------------------------------
+    def _default_chat_model_factory(self, provider: str, model: str, **options: Any) -> Any:
+        if provider == "gemini":
+            return ChatGoogleGenerativeAI(
+                model=model,
+                google_api_key=os.getenv("GEMINI_API_KEY"),
+                **options
+            )
+        http_client, http_async_client = self._get_http_clients()
+        return ChatOpenAI(
+            model=model,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **options
+        )
+
+    def get_chat_model(self, provider: str, model: str, **options: Any) -> Any:
+        """Return the shared chat model for this provider/model/options."""
+        key = (provider, model, _freeze(options))
+        with self._lock:
+            llm = self._chat_models.get(key)
+            self._count(llm is None)
+            if llm is None:
+                llm = self.chat_model_factory(provider, model, **options)
+                self._chat_models[key] = llm
+            return llm
+
+    def get_structured_llm(self, schema: type, provider: str, model: str, **options: Any) -> Any:
+        """Return a cached with_structured_output runnable for the schema."""
+        key = (provider, model, _freeze(options), schema)
+        structured = self._structured.get(key)
+        if structured is None:
+            llm = self.get_chat_model(provider, model, **options)
+            with self._lock:
+                structured = self._structured.setdefault(key, llm.with_structured_output(schema))
+        else:
+            with self._lock:
+                self._count(False)
+        return structured
+
+    # ------------------------------------------------------------------
+    # Lifecycle and stats
+    # ------------------------------------------------------------------
+    async def startup(self) -> None:
+        """Open the shared connection pools ahead of the first request."""
+        with self._lock:
+            self._get_http_clients()
+
+    async def shutdown(self) -> None:
+        """Close connection pools and drop every cached client."""
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._http_client = None
+            self._http_async_client = None
+            self._openai_clients.clear()
+            self._chat_models.clear()
+            self._structured.clear()
+            self._gemini_models.clear()
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+    def _pool_connections(self) -> Optional[int]:
+        # httpx does not expose pool stats publicly; read them if available
+        pool = getattr(getattr(self._http_async_client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        return len(connections) if connections is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of cached clients, reuse counters and pool usage."""
+        with self._lock:
+            limits = self._limits()
+            return {
+                "chat_models": len(self._chat_models),
+                "structured_runnables": len(self._structured),
+                "openai_clients": len(self._openai_clients),
+                "gemini_models": len(self._gemini_models),
+                "clients_created": self._counters["created"],
+                "clients_reused": self._counters["reused"],
+                "pool_open": self._http_async_client is not None and not self._http_async_client.is_closed,
+                "pool_connections": self._pool_connections(),
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+            }
+
+
+registry = LLMRegistry()
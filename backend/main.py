@@ -1,19 +1,80 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, Form, UploadFile, Query, Header
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Callable
 import os
 from dotenv import load_dotenv
-import base64
+import hashlib
 import json
+import asyncio
+import time
 from datetime import datetime
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-# Simple in-memory storage for task trees (replace with database in production)
-saved_task_trees = []
+from llm_registry import registry as llm_registry
+from llm_cache import response_cache
+from task_tree_store import task_tree_store
+from token_budget import load_encodings, token_budget
+from ocr_cache import ocr_cache
+from single_flight import single_flight
+from image_preprocessing import IMAGE_MAX_UPLOAD_BYTES
+from http_utils import (
+    COMPRESSION_ENABLED,
+    COMPRESSION_MINIMUM_SIZE,
+    BodyLimitMiddleware,
+    CompressionMiddleware,
+    FastJSONResponse,
+    dumps,
+    etag_matches,
+    parse_fields,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up shared resources on startup and release them on shutdown."""
+    from planner_workflow import warm_up_planner_graph
+    from interactive_planner import get_llm_config, refine_memo
+    from speculation import speculative_refiner
+    from jobs import job_manager
+
+    await llm_registry.startup()
+    warm_up_planner_graph()
+    # May download the tokenizer: do it once here, off the event loop
+    await asyncio.to_thread(load_encodings, get_llm_config().get("model"))
+    yield
+    job_manager.close()
+    speculative_refiner.close()
+    await llm_registry.shutdown()
+    response_cache.close()
+    refine_memo.close()
+    ocr_cache.close()
+    task_tree_store.close()
+
+app = FastAPI(
+    title="AI Planning Assistant API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
+
+# Batch OCR: concurrent vision calls per request and images per request
+OCR_BATCH_CONCURRENCY = int(os.getenv("OCR_BATCH_CONCURRENCY", "4"))
+OCR_BATCH_MAX_IMAGES = int(os.getenv("OCR_BATCH_MAX_IMAGES", "20"))
+
+# Multipart framing and form fields around each uploaded image
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Reject oversized image uploads before their body is read
+app.add_middleware(BodyLimitMiddleware, limits={
+    "/api/extract-text-from-image": IMAGE_MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES,
+    "/api/extract-text-from-images": OCR_BATCH_MAX_IMAGES * (IMAGE_MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES),
+})
 
-app = FastAPI(title="AI Planning Assistant API")
+# Compress large responses (gzip, or brotli when installed)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
 
 # Configure CORS
 app.add_middleware(
@@ -22,6 +83,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Speculation-Key"],
 )
 
 # Data models
@@ -29,18 +91,72 @@ class PlanRequest(BaseModel):
     prompt: str
     context: Optional[str] = None
     existing_task_tree: Optional[Dict[str, Any]] = None
+    bypass_cache: bool = False  # Skip the LLM response cache for this request
+    speculative_refine: Optional[bool] = None  # Refine the new tree in the background (None: server default)
 
 class TaskTreeRequest(BaseModel):
     task_tree: Dict[str, Any]
+    bypass_cache: bool = False
+
+class SaveTaskTreeRequest(BaseModel):
+    task_tree: Dict[str, Any]
+    name: Optional[str] = None
 
 class TodoGenerationRequest(BaseModel):
     task_tree: Dict[str, Any]
     custom_prompt: Optional[str] = None
+    bypass_cache: bool = False
 
 class TaskTreeResponse(BaseModel):
-    task_tree: Dict[str, Any]
-    formatted_tree: str
-    stage: str  # "initial" or "refined"
+    # Every field is optional because the fields= parameter can project them away
+    task_tree: Optional[Dict[str, Any]] = None
+    formatted_tree: Optional[str] = None
+    stage: Optional[str] = None  # "initial" or "refined"
+    cached_node_ids: Optional[List[str]] = None  # refined nodes taken from the refine memo
+
+TASK_TREE_FIELDS = ("task_tree", "formatted_tree", "stage", "cached_node_ids")
+
+def task_tree_payload(fields: set, task_tree: Any, stage: str, **extra: Any) -> Dict[str, Any]:
+    """
+    Build a task tree response body with only the requested fields;
+    formatted_tree is only rendered when it was asked for. task_tree is
+    nested JSON or a CompactTree.
+    """
+    from compact_tree import CompactTree
+    from interactive_planner import format_task_tree_for_display
+    
+    payload = {}
+    if "task_tree" in fields:
+        payload["task_tree"] = task_tree.to_dict() if isinstance(task_tree, CompactTree) else task_tree
+    if "formatted_tree" in fields:
+        payload["formatted_tree"] = format_task_tree_for_display(task_tree)
+    if "stage" in fields:
+        payload["stage"] = stage
+    for key, value in extra.items():
+        if key in fields:
+            payload[key] = value
+    return payload
+
+class TaskTreeResult:
+    """
+    A task tree response body kept by a job until it expires, with the tree
+    as a CompactTree; the body is rendered again on each read.
+    """
+    __slots__ = ("fields", "task_tree", "stage", "extra")
+    
+    def __init__(self, fields: set, task_tree: Dict[str, Any], stage: str, **extra: Any):
+        from compact_tree import CompactTree
+        
+        self.fields = fields
+        self.task_tree = CompactTree.from_dict(task_tree) if fields & {"task_tree", "formatted_tree"} else None
+        self.stage = stage
+        self.extra = extra
+    
+    def to_dict(self) -> Dict[str, Any]:
+        payload = task_tree_payload(self.fields, self.task_tree, self.stage, **self.extra)
+        # Extras that are not response fields (speculation_key) are always sent
+        payload.update((key, value) for key, value in self.extra.items() if key not in TASK_TREE_FIELDS)
+        return payload
 
 class PlanResponse(BaseModel):
     plan: str
@@ -61,123 +177,382 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+OCR_PROMPT = "Extract all text from this image. This is likely a handwritten or typed to-do list or brain dump. Return ONLY the extracted text, preserving the structure and line breaks as much as possible. Do not add any commentary, explanations, or formatting - just the raw text content."
+
+# generate-todo orders items locally; this keeps the LLM pass that groups and rewords them
+TODO_LLM_PASS = os.getenv("TODO_LLM_PASS", "true").lower() in ("1", "true", "yes")
+
+# LLM client pool stats
+@app.get("/api/stats/llm-pool")
+async def get_llm_pool_stats():
+    return llm_registry.stats()
+
+# LLM response cache stats
+@app.get("/api/stats/llm-cache")
+async def get_llm_cache_stats():
+    return response_cache.stats()
+
+# Coalesced identical concurrent LLM calls
+@app.get("/api/stats/single-flight")
+async def get_single_flight_stats():
+    return single_flight.stats()
+
+# Speculative background refines: cancel and stats
+@app.delete("/api/speculative-refine/{speculation_key}")
+async def cancel_speculative_refine(speculation_key: str):
+    """Cancel the background refine started for a created tree (X-Speculation-Key)."""
+    from speculation import speculative_refiner
+    return {"cancelled": speculative_refiner.cancel(speculation_key)}
+
+@app.delete("/api/speculative-refine")
+async def cancel_all_speculative_refines():
+    from speculation import speculative_refiner
+    return {"cancelled": speculative_refiner.cancel()}
+
+@app.get("/api/stats/speculation")
+async def get_speculation_stats():
+    from speculation import speculative_refiner
+    return speculative_refiner.stats()
+
+# Job queue stats
+@app.get("/api/stats/jobs")
+async def get_job_stats():
+    from jobs import job_manager
+    return job_manager.stats()
+
+# Refine memo stats
+@app.get("/api/stats/refine-memo")
+async def get_refine_memo_stats():
+    from interactive_planner import refine_memo
+    return refine_memo.stats()
+
+# Token budget stats: predicted vs. actual usage per call kind
+@app.get("/api/stats/token-budget")
+async def get_token_budget_stats():
+    return token_budget.stats()
+
+# Prompt template versions and hashes
+@app.get("/api/stats/prompts")
+async def get_prompt_stats():
+    from prompts import prompt_manifest
+    return prompt_manifest()
+
+# OCR cache stats
+@app.get("/api/stats/ocr-cache")
+async def get_ocr_cache_stats():
+    return ocr_cache.stats()
+
 # Image OCR endpoint
+async def ocr_image(client: Any, image_data: bytes, mime_type: str, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Pre-process one image (see image_preprocessing) and extract its text
+    with the vision model, through the OCR cache. Returns {"text",
+    "preprocessing"}.
+    """
+    from image_preprocessing import IMAGE_PREPROCESSING_ENABLED, preprocess_image
+    
+    preprocessing = None
+    if IMAGE_PREPROCESSING_ENABLED:
+        # Decoding and resizing are CPU-bound; keep them off the event loop
+        processed = await asyncio.to_thread(preprocess_image, image_data, mime_type)
+        image_data, mime_type = processed.data, processed.mime_type
+        preprocessing = processed.stats()
+        print(f"Image pre-processing: {preprocessing['original_bytes']} -> {preprocessing['bytes']} bytes, "
+              f"{preprocessing['original_vision_tokens']} -> {preprocessing['vision_tokens']} vision tokens")
+    
+    # Call the vision API without blocking the event loop; the same image
+    # uploaded again while the first is still being read shares its call
+    flight_key = f"ocr:{client.provider}:{hashlib.sha256(image_data).hexdigest()}" + ("" if use_cache else ":bypass")
+    response_text = await single_flight.do(flight_key, lambda: client.avision_completion(
+        OCR_PROMPT,
+        image_data,
+        mime_type=mime_type,
+        use_cache=use_cache
+    ))
+    
+    return {"text": response_text.strip(), "preprocessing": preprocessing}
+
 @app.post("/api/extract-text-from-image")
-async def extract_text_from_image(file: UploadFile = File(...)):
+async def extract_text_from_image(file: UploadFile = File(...), bypass_cache: bool = Form(False)):
     """
     Extract text from an uploaded image using OpenAI Vision API.
     Better for handwritten text than traditional OCR.
+    The image is downscaled and re-encoded first (see image_preprocessing),
+    and the text of an image seen before comes from the OCR cache.
     """
     try:
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        from ai_client import AIClient
+        from image_preprocessing import ImageTooLargeError, mime_type_for, read_upload
         
-        # Read image file
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Determine image format from filename
-        file_extension = file.filename.lower().split('.')[-1] if '.' in file.filename else 'jpeg'
-        mime_types = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'gif': 'image/gif',
-            'webp': 'image/webp'
-        }
-        mime_type = mime_types.get(file_extension, 'image/jpeg')
-        
-        # Call OpenAI Vision API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Extract all text from this image. This is likely a handwritten or typed to-do list or brain dump. Return ONLY the extracted text, preserving the structure and line breaks as much as possible. Do not add any commentary, explanations, or formatting - just the raw text content."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000
-        )
+        client = AIClient(provider="openai")
         
-        extracted_text = response.choices[0].message.content.strip()
-        
-        return {"text": extracted_text}
+        # Read the upload in chunks, stopping at the size limit; pre-processing
+        # rejects images that would decode to too many pixels
+        try:
+            image_data = await read_upload(file)
+            return await ocr_image(client, image_data, mime_type_for(file.filename), use_cache=not bypass_cache)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to extract text: {str(e)}")
 
+@app.post("/api/extract-text-from-images")
+async def extract_text_from_images(files: List[UploadFile] = File(...), bypass_cache: bool = Form(False)):
+    """
+    Batch OCR: extract text from several images (e.g. notebook pages)
+    concurrently, at most OCR_BATCH_CONCURRENCY at a time. Streams a "page"
+    event ({index, filename, text, preprocessing, seconds}) for each image
+    as soon as it is done, or a "page_error" event ({index, filename,
+    detail}) if that image failed, then a "done" event with the counts.
+    index is the image's position in the upload, so the client can put
+    pages back in order.
+    """
+    from ai_client import AIClient
+    from image_preprocessing import ImageTooLargeError, mime_type_for, read_upload
+    from streaming import sse_event
+    
+    if len(files) > OCR_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {OCR_BATCH_MAX_IMAGES} images per batch")
+    
+    client = AIClient(provider="openai")
+    semaphore = asyncio.Semaphore(OCR_BATCH_CONCURRENCY)
+    
+    async def extract_page(index: int, file: UploadFile) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                image_data = await read_upload(file)
+                result = await ocr_image(
+                    client, image_data, mime_type_for(file.filename), use_cache=not bypass_cache
+                )
+            return {"type": "page", "index": index, "filename": file.filename, **result,
+                    "seconds": round(time.perf_counter() - started, 3)}
+        except ImageTooLargeError as e:
+            return {"type": "page_error", "index": index, "filename": file.filename, "detail": str(e)}
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return {"type": "page_error", "index": index, "filename": file.filename,
+                    "detail": f"Failed to extract text: {str(e)}"}
+    
+    async def event_stream():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(extract_page(index, file)) for index, file in enumerate(files)]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event = await next_done
+                succeeded += event["type"] == "page"
+                yield sse_event(event["type"], event)
+            yield sse_event("done", {
+                "pages": len(files),
+                "succeeded": succeeded,
+                "failed": len(files) - succeeded,
+                "seconds": round(time.perf_counter() - started, 3),
+            })
+        finally:
+            # Client went away mid-batch: stop the remaining vision calls
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def build_initial_task_tree(
+    request: PlanRequest,
+    progress: Optional[Callable[..., None]] = None
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Create the stage 1 task tree (merged into existing_task_tree if given)
+    and maybe start refining it speculatively. Returns (task_tree, speculation key).
+    """
+    from interactive_planner import create_task_tree, no_progress
+    from speculation import speculative_refiner
+    
+    print(f"Received request with existing_task_tree: {request.existing_task_tree is not None}")
+    if request.existing_task_tree:
+        print(f"Existing task tree has {len(request.existing_task_tree.get('categories', []))} categories")
+    
+    # Combine prompt and context if provided
+    brain_dump = request.prompt
+    if request.context:
+        brain_dump = f"{request.context}\n\n{brain_dump}"
+    
+    # Create task tree (with or without existing tree)
+    task_tree = await create_task_tree(
+        brain_dump,
+        request.existing_task_tree,
+        use_cache=not request.bypass_cache,
+        progress=progress or no_progress
+    )
+    
+    # Most trees are refined unchanged next: start on that while the user reviews
+    return task_tree, speculative_refiner.start(task_tree, request.speculative_refine)
+
 # Stage 1: Create initial task tree from brain dump
 @app.post("/api/create-task-tree", response_model=TaskTreeResponse)
-async def create_initial_task_tree(request: PlanRequest):
+async def create_initial_task_tree(request: PlanRequest, fields: Optional[str] = None):
     """
     Stage 1: Convert brain dump into structured task tree.
     Returns task tree for user verification/editing.
     If existing_task_tree is provided, merges new items into it.
+    fields (comma-separated) limits the response to those fields.
     """
+    requested = parse_fields(fields, TASK_TREE_FIELDS)
     try:
-        from interactive_planner import create_task_tree, format_task_tree_for_display
+        task_tree, speculation_key = await build_initial_task_tree(request)
+        headers = {"X-Speculation-Key": speculation_key} if speculation_key else None
         
-        print(f"Received request with existing_task_tree: {request.existing_task_tree is not None}")
-        if request.existing_task_tree:
-            print(f"Existing task tree has {len(request.existing_task_tree.get('categories', []))} categories")
-        
-        # Combine prompt and context if provided
-        brain_dump = request.prompt
-        if request.context:
-            brain_dump = f"{request.context}\n\n{brain_dump}"
-        
-        # Create task tree (with or without existing tree)
-        task_tree = create_task_tree(brain_dump, request.existing_task_tree)
-        formatted = format_task_tree_for_display(task_tree)
-        
-        return TaskTreeResponse(
-            task_tree=task_tree,
-            formatted_tree=formatted,
-            stage="initial"
-        )
+        return FastJSONResponse(task_tree_payload(requested, task_tree, "initial"), headers=headers)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+# Stage 1 (streaming): Server-Sent Events variant of create-task-tree
+@app.post("/api/create-task-tree/stream")
+async def stream_initial_task_tree(request: PlanRequest, fields: Optional[str] = None):
+    """
+    Stage 1, streamed: sends a "category" or "project" event as soon as each
+    one is generated, then a "task_tree" event with the ID-assigned tree
+    (plus formatted_tree and stage, matching /api/create-task-tree,
+    including its fields= projection).
+    """
+    from interactive_planner import stream_task_tree
+    from speculation import speculative_refiner
+    from streaming import sse_event
+    
+    # Combine prompt and context if provided
+    brain_dump = request.prompt
+    if request.context:
+        brain_dump = f"{request.context}\n\n{brain_dump}"
+    
+    requested = parse_fields(fields, TASK_TREE_FIELDS)
+    
+    async def event_stream():
+        try:
+            async for event in stream_task_tree(
+                brain_dump,
+                request.existing_task_tree,
+                use_cache=not request.bypass_cache
+            ):
+                if event["type"] == "task_tree":
+                    payload = task_tree_payload(requested, event["task_tree"], "initial")
+                    speculation_key = speculative_refiner.start(event["task_tree"], request.speculative_refine)
+                    if speculation_key:
+                        payload["speculation_key"] = speculation_key
+                    yield sse_event("task_tree", payload)
+                else:
+                    yield sse_event(event["type"], event)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def build_refined_task_tree(
+    request: TaskTreeRequest,
+    progress: Optional[Callable[..., None]] = None
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Refine a user-edited tree; returns (refined_tree, cached_node_ids)."""
+    from interactive_planner import no_progress, refine_task_tree_incremental
+    from speculation import speculative_refiner
+    
+    # Let any background refine of these tasks finish so they come from the memo
+    if not request.bypass_cache:
+        await speculative_refiner.join(request.task_tree)
+    
+    # Refine the task tree, reusing memoized results for unchanged tasks
+    return await refine_task_tree_incremental(
+        request.task_tree,
+        use_cache=not request.bypass_cache,
+        progress=progress or no_progress
+    )
+
 # Stage 2: Refine task tree with user edits
 @app.post("/api/refine-task-tree", response_model=TaskTreeResponse)
-async def refine_edited_task_tree(request: TaskTreeRequest):
+async def refine_edited_task_tree(request: TaskTreeRequest, fields: Optional[str] = None):
     """
     Stage 2: Take user-edited task tree and break down further.
     Returns refined task tree for final verification.
+    fields (comma-separated) limits the response to those fields.
     """
+    requested = parse_fields(fields, TASK_TREE_FIELDS)
     try:
-        from interactive_planner import refine_task_tree, format_task_tree_for_display
-        
-        # Refine the task tree
-        refined_tree = refine_task_tree(request.task_tree)
-        formatted = format_task_tree_for_display(refined_tree)
-        
-        return TaskTreeResponse(
-            task_tree=refined_tree,
-            formatted_tree=formatted,
-            stage="refined"
-        )
+        refined_tree, cached_node_ids = await build_refined_task_tree(request)
+        
+        return FastJSONResponse(task_tree_payload(
+            requested,
+            refined_tree,
+            "refined",
+            cached_node_ids=cached_node_ids
+        ))
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+async def build_plan(request: PlanRequest, progress: Optional[Callable[..., None]] = None) -> PlanResponse:
+    """Run the LangGraph planner on a brain dump and format its final plan."""
+    from interactive_planner import no_progress
+    from planner_workflow import run_planner
+    
+    # Combine prompt and context if provided
+    brain_dump = request.prompt
+    if request.context:
+        brain_dump = f"{request.context}\n\n{brain_dump}"
+    
+    # Run the LangGraph planner workflow
+    final_state = await run_planner(
+        brain_dump,
+        progress=progress or no_progress,
+        use_cache=not request.bypass_cache
+    )
+    
+    # Extract final plan
+    final_plan = final_state.get("final_plan", [])
+    
+    # Format the plan as text
+    plan_text_lines = [f"Your Daily Plan ({final_state.get('total_time', 0)} minutes total)\n"]
+    plan_text_lines.append("=" * 50 + "\n")
+    
+    ready_tasks = [t for t in final_plan if t.get("status") == "Ready"]
+    blocked_tasks = [t for t in final_plan if t.get("status") == "BLOCKED"]
+    
+    if ready_tasks:
+        plan_text_lines.append("\n✅ READY TO DO:\n")
+        for i, task in enumerate(ready_tasks, 1):
+            plan_text_lines.append(f"{i}. {task['name']} ({task['time']} min)\n")
+    
+    if blocked_tasks:
+        plan_text_lines.append("\n⚠️ BLOCKED (waiting on external dependencies):\n")
+        for task in blocked_tasks:
+            plan_text_lines.append(f"- {task['name']} ({task['time']} min)\n")
+    
+    plan_text = "".join(plan_text_lines)
+    
+    # Extract task names for the tasks list
+    tasks = [f"{t['name']} ({t['time']} min) - {t['status']}" for t in final_plan]
+    
+    return PlanResponse(
+        plan=plan_text,
+        tasks=tasks,
+        timestamp=datetime.now().isoformat()
+    )
+
 # Legacy endpoint - kept for backward compatibility
 @app.post("/api/generate-plan", response_model=PlanResponse)
 async def generate_plan(request: PlanRequest):
@@ -186,47 +561,7 @@ async def generate_plan(request: PlanRequest):
     Use the new interactive endpoints instead.
     """
     try:
-        from datetime import datetime
-        from planner_workflow import run_planner
-        
-        # Combine prompt and context if provided
-        brain_dump = request.prompt
-        if request.context:
-            brain_dump = f"{request.context}\n\n{brain_dump}"
-        
-        # Run the LangGraph planner workflow
-        final_state = run_planner(brain_dump)
-        
-        # Extract final plan
-        final_plan = final_state.get("final_plan", [])
-        
-        # Format the plan as text
-        plan_text_lines = [f"Your Daily Plan ({final_state.get('total_time', 0)} minutes total)\n"]
-        plan_text_lines.append("=" * 50 + "\n")
-        
-        ready_tasks = [t for t in final_plan if t.get("status") == "Ready"]
-        blocked_tasks = [t for t in final_plan if t.get("status") == "BLOCKED"]
-        
-        if ready_tasks:
-            plan_text_lines.append("\n✅ READY TO DO:\n")
-            for i, task in enumerate(ready_tasks, 1):
-                plan_text_lines.append(f"{i}. {task['name']} ({task['time']} min)\n")
-        
-        if blocked_tasks:
-            plan_text_lines.append("\n⚠️ BLOCKED (waiting on external dependencies):\n")
-            for task in blocked_tasks:
-                plan_text_lines.append(f"- {task['name']} ({task['time']} min)\n")
-        
-        plan_text = "".join(plan_text_lines)
-        
-        # Extract task names for the tasks list
-        tasks = [f"{t['name']} ({t['time']} min) - {t['status']}" for t in final_plan]
-        
-        return PlanResponse(
-            plan=plan_text,
-            tasks=tasks,
-            timestamp=datetime.now().isoformat()
-        )
+        return await build_plan(request)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -264,23 +599,17 @@ async def get_tasks():
 
 # Save task tree endpoint
 @app.post("/api/save-task-tree")
-async def save_task_tree(request: TaskTreeRequest):
+def save_task_tree(request: SaveTaskTreeRequest):
     """
     Save a completed task tree.
     """
     try:
-        task_tree_entry = {
-            "id": len(saved_task_trees) + 1,
-            "task_tree": request.task_tree,
-            "timestamp": datetime.now().isoformat(),
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        saved_task_trees.append(task_tree_entry)
+        summary = task_tree_store.save(request.task_tree, name=request.name)
         
         return {
             "message": "Task tree saved successfully",
-            "id": task_tree_entry["id"],
-            "timestamp": task_tree_entry["timestamp"]
+            "id": summary["id"],
+            "timestamp": summary["timestamp"]
         }
     except Exception as e:
         import traceback
@@ -289,103 +618,267 @@ async def save_task_tree(request: TaskTreeRequest):
 
 # Get saved task trees endpoint
 @app.get("/api/saved-task-trees")
-async def get_saved_task_trees():
+def get_saved_task_trees(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
     """
-    Retrieve all saved task trees.
+    List saved task trees, newest first, as summaries (name, counts,
+    timestamps) without the tree bodies. Pass next_cursor back as cursor
+    to get the next page.
     """
     try:
-        return {
-            "task_trees": saved_task_trees
-        }
+        return task_tree_store.list_page(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Get one saved task tree endpoint
+@app.get("/api/task-tree/{tree_id}")
+def get_task_tree(tree_id: int, if_none_match: Optional[str] = Header(None)):
+    """
+    Retrieve a saved task tree, including the full tree.
+    Responds 304 Not Modified when If-None-Match carries the tree's ETag.
+    """
+    headers = {"Cache-Control": "private, no-cache"}
+    try:
+        summary = task_tree_store.get_summary(tree_id)
+        if summary is not None:
+            headers["ETag"] = task_tree_store.etag(summary)
+            if etag_matches(if_none_match, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            raw = task_tree_store.get_raw(tree_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if summary is None or raw is None:
+        raise HTTPException(status_code=404, detail="Task tree not found")
+    
+    # Splice the stored tree JSON in as-is rather than parsing and re-encoding it
+    summary, body = raw
+    content = dumps(summary)[:-1] + b',"task_tree":' + body.encode("utf-8") + b"}"
+    return Response(content=content, media_type="application/json", headers=headers)
 
 # Delete task tree endpoint
 @app.delete("/api/task-tree/{tree_id}")
-async def delete_task_tree(tree_id: int):
+def delete_task_tree(tree_id: int):
     """
     Delete a saved task tree by ID.
     """
     try:
-        global saved_task_trees
-        saved_task_trees = [tree for tree in saved_task_trees if tree["id"] != tree_id]
-        return {"message": "Task tree deleted successfully"}
+        deleted = task_tree_store.delete(tree_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Task tree not found")
+    return {"message": "Task tree deleted successfully"}
 
-# Generate AI to-do list endpoint
-@app.post("/api/generate-todo")
-async def generate_ai_todo_list(request: TodoGenerationRequest):
+async def build_todo_list(
+    request: TodoGenerationRequest,
+    progress: Optional[Callable[..., None]] = None
+) -> Dict[str, Any]:
     """
-    Generate a prioritized to-do list from a task tree using AI.
+    Generate a prioritized to-do list from a task tree: items are put in
+    dependency order locally, then grouped and reworded by the LLM
+    (skipped with TODO_LLM_PASS=false). progress is called as each stage
+    starts.
     """
-    try:
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        # Convert task tree to readable format
-        task_tree_str = json.dumps(request.task_tree, indent=2)
-        
-        # Build prompt
-        system_prompt = """You are a helpful executive functioning coach and personal planning assistant agent that excels in re-organizing structured task trees into more logical to-do lists that can be tackled more easily.
-
-Your primary task is to take an existing, broken down task tree and reorganize it so that it groups similar tasks that can be done at the same time and orders them according to logical dependencies.
-
-For example, if the list includes separate tasks lists for each meal or event to plan and shop for, the meal planning can all be grouped into one task list to be done first and the shopping can all be grouped into another task list that can be tackled at the same time after the planning is complete.
-
-Guidelines:
-- Group similar tasks that can be done together
-- Order tasks based on logical dependencies (what must be done first)
-- Use clear, action-oriented language
-- Keep tasks specific and actionable
-- Consider efficiency and workflow optimization
-
-Return ONLY a JSON object with an "items" key containing an array of strings, where each string is a reorganized to-do item. Example:
-{"items": ["Group 1: Plan all meals for the week", "Group 2: Create consolidated shopping list", "Group 3: Shop for all groceries at once", ...]}
-"""
-        
-        user_prompt = f"Task Tree:\n{task_tree_str}"
-        
-        if request.custom_prompt:
-            user_prompt += f"\n\nAdditional Instructions:\n{request.custom_prompt}"
-        
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
+    from ai_client import AIClient
+    from dependency_graph import DependencyGraph
+    from interactive_planner import no_progress
+    from prompts import GENERATE_TODO
+    from tree_outline import tree_outline
+    
+    progress = progress or no_progress
+    progress("dependency_order")
+    # Fuzzy dependency matching on a large tree is CPU-bound: keep it off the event loop
+    graph = await asyncio.to_thread(DependencyGraph.from_tree, request.task_tree)
+    ordered_items = [graph.label(item_id) for item_id in graph.order(leaves_only=True)]
+    if not TODO_LLM_PASS:
+        return {
+            "todo_items": ordered_items,
+            "count": len(ordered_items)
+        }
+    
+    progress("grouping", items=len(ordered_items))
+    client = AIClient(provider="openai")
+    
+    # Static instructions go in the system message so they form a cacheable prefix;
+    # the tree and any custom instructions follow in the user message
+    system_prompt = GENERATE_TODO.system
+    user_prompt = GENERATE_TODO.format_user(
+        task_tree_outline=tree_outline(request.task_tree),
+        dependency_order="\n".join(f"{number}. {item}" for number, item in enumerate(ordered_items, 1)),
+        additional_instructions=(
+            f"\n\nAdditional Instructions:\n{request.custom_prompt}" if request.custom_prompt else ""
+        ),
+    )
+    
+    # Identical tree + instructions reuse the cached list
+    use_cache = response_cache.enabled and not request.bypass_cache
+    cache_key = response_cache.make_key(
+        "openai", "gpt-4o-mini", 0.3, "json_object", f"{system_prompt}\n\n{user_prompt}"
+    )
+    result = await response_cache.aget(cache_key) if use_cache else None
+    
+    if result is None:
+        if not use_cache and response_cache.enabled:
+            response_cache.record_bypass()
+        
+        # Call OpenAI API without blocking the event loop; identical concurrent requests share the call
+        response_text = await single_flight.do(
+            cache_key + ("" if use_cache else ":bypass"),
+            lambda: client.achat_completion(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,
+                max_tokens=None,
+                response_format={"type": "json_object"},
+                model="gpt-4o-mini"
+            )
         )
         
         # Parse response
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(response_text)
         print(f"AI Response: {result}")
         
-        # Handle different response formats
-        if isinstance(result, dict):
-            todo_items = result.get('items', result.get('todo_items', result.get('tasks', [])))
-        elif isinstance(result, list):
-            todo_items = result
-        else:
-            todo_items = []
-        
-        print(f"Extracted todo_items: {todo_items}")
-        print(f"Count: {len(todo_items)}")
-        
-        return {
-            "todo_items": todo_items,
-            "count": len(todo_items)
-        }
-        
+        if use_cache:
+            await response_cache.aset(cache_key, result)
+    
+    # Handle different response formats
+    if isinstance(result, dict):
+        todo_items = result.get('items', result.get('todo_items', result.get('tasks', [])))
+    elif isinstance(result, list):
+        todo_items = result
+    else:
+        todo_items = []
+    
+    print(f"Extracted todo_items: {todo_items}")
+    print(f"Count: {len(todo_items)}")
+    
+    return {
+        "todo_items": todo_items,
+        "count": len(todo_items)
+    }
+
+# Generate AI to-do list endpoint
+@app.post("/api/generate-todo")
+async def generate_ai_todo_list(request: TodoGenerationRequest):
+    """
+    Generate a prioritized to-do list from a task tree using AI.
+    """
+    try:
+        return await build_todo_list(request)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+# Asynchronous jobs: submit a planning request, then poll or follow it
+def submit_job(kind: str, run) -> FastJSONResponse:
+    """
+    Queue run(progress) as a job and answer 202 with its ID, or 429 when
+    the queue is full. progress records events on the job.
+    """
+    from jobs import JobQueueFullError, job_manager
+    
+    try:
+        job = job_manager.submit(kind, run)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return FastJSONResponse(
+        {"job_id": job.id, "kind": kind, "status": job.status},
+        status_code=202,
+        headers={"Location": f"/api/jobs/{job.id}"}
+    )
+
+@app.post("/api/jobs/create-task-tree", status_code=202)
+async def submit_create_task_tree_job(request: PlanRequest, fields: Optional[str] = None):
+    """Stage 1 as a job; its result is the /api/create-task-tree response body plus speculation_key."""
+    requested = parse_fields(fields, TASK_TREE_FIELDS)
+    
+    async def run(progress):
+        task_tree, speculation_key = await build_initial_task_tree(request, progress)
+        return TaskTreeResult(requested, task_tree, "initial", speculation_key=speculation_key)
+    
+    return submit_job("create-task-tree", run)
+
+@app.post("/api/jobs/refine-task-tree", status_code=202)
+async def submit_refine_task_tree_job(request: TaskTreeRequest, fields: Optional[str] = None):
+    """Stage 2 as a job; its result is the /api/refine-task-tree response body."""
+    requested = parse_fields(fields, TASK_TREE_FIELDS)
+    
+    async def run(progress):
+        refined_tree, cached_node_ids = await build_refined_task_tree(request, progress)
+        return TaskTreeResult(requested, refined_tree, "refined", cached_node_ids=cached_node_ids)
+    
+    return submit_job("refine-task-tree", run)
+
+@app.post("/api/jobs/generate-plan", status_code=202)
+async def submit_generate_plan_job(request: PlanRequest):
+    """The LangGraph planner as a job, with a progress event per node."""
+    async def run(progress):
+        return (await build_plan(request, progress)).model_dump()
+    
+    return submit_job("generate-plan", run)
+
+@app.post("/api/jobs/generate-todo", status_code=202)
+async def submit_generate_todo_job(request: TodoGenerationRequest):
+    """generate-todo as a job, with a progress event for the dependency order and the LLM pass."""
+    async def run(progress):
+        return await build_todo_list(request, progress)
+    
+    return submit_job("generate-todo", run)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, its latest progress event and, once it has succeeded, its result."""
+    from jobs import job_manager
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events for a job: a "progress" event for each stage so far
+    and as it happens, then one "succeeded" (with the result), "failed"
+    (with the error) or "cancelled" event.
+    """
+    from jobs import FINISHED_STATUSES, job_manager
+    from streaming import sse_event
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        async for event in job_manager.events(job_id):
+            if event["stage"] in FINISHED_STATUSES:
+                yield sse_event(event["stage"], job.to_dict())
+            else:
+                yield sse_event("progress", event)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; a finished job is returned unchanged."""
+    from jobs import job_manager
+    
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict(include_result=False)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,218 @@
+"""
+Cache of vision (OCR) results keyed by image content.
+
+The exact tier keys on a SHA-256 of the image bytes sent to the model,
+which are the normalized output of image_preprocessing, so uploading
+the same photo again hits. The key also includes provider, model and
+prompt. Entries live in an LLMResponseCache (memory LRU + SQLite)
+configured by OCR_CACHE_* variables.
+
+With OCR_CACHE_PERCEPTUAL=true a 64-bit difference hash (dHash) of each
+cached image is kept as well. A new image within
+OCR_CACHE_PHASH_DISTANCE bits of a cached one reuses its text, so a
+near-identical re-shot of the same page also hits. It is off by default:
+two different pages with a very similar layout can collide.
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from llm_cache import LLMResponseCache
+
+OCR_CACHE_PERCEPTUAL = os.getenv("OCR_CACHE_PERCEPTUAL", "false").lower() in ("1", "true", "yes")
+OCR_CACHE_PHASH_DISTANCE = int(os.getenv("OCR_CACHE_PHASH_DISTANCE", "4"))
+
+
+def difference_hash(image_data: bytes) -> Optional[int]:
+    """64-bit dHash: is each pixel of a 9x8 grayscale thumbnail brighter than its right neighbour."""
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image.draft("L", (64, 64))
+            pixels = list(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    except (UnidentifiedImageError, OSError):
+        return None
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            value = (value << 1) | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return value
+
+
+class OCRCache:
+    """Exact content-hash cache of vision results, with an optional perceptual-hash index."""
+
+    def __init__(
+        self,
+        store: LLMResponseCache,
+        perceptual: bool = False,
+        max_distance: int = 4
+    ):
+        self.store = store
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        # key -> (scope, phash), oldest first; mirrors the ocr_phash table
+        self._phashes: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._phash_db: Optional[sqlite3.Connection] = None
+        self._phashes_loaded = False
+        self._lock = threading.Lock()
+        self._metrics = {"exact_hits": 0, "perceptual_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+    @classmethod
+    def from_env(cls) -> "OCRCache":
+        return cls(
+            LLMResponseCache.from_env(prefix="OCR_CACHE", default_db_path="ocr_cache.db"),
+            perceptual=OCR_CACHE_PERCEPTUAL,
+            max_distance=OCR_CACHE_PHASH_DISTANCE,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.store.enabled
+
+    def scope(self, provider: str, model: str, prompt: str) -> str:
+        """Everything but the image: results are only reused for the same call."""
+        return self.store.make_key(provider, model, None, "ocr", prompt)
+
+    def key(self, scope: str, image_data: bytes) -> str:
+        return hashlib.sha256(scope.encode("utf-8") + hashlib.sha256(image_data).digest()).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Perceptual index (SQLite table next to the store's, loaded once)
+    # ------------------------------------------------------------------
+    def _get_phash_db(self) -> Optional[sqlite3.Connection]:
+        if self.store.db_path is None:
+            return None
+        if self._phash_db is None:
+            self._phash_db = sqlite3.connect(self.store.db_path, check_same_thread=False)
+            self._phash_db.execute("PRAGMA journal_mode=WAL")
+            self._phash_db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_phash ("
+                " key TEXT PRIMARY KEY,"
+                " scope TEXT NOT NULL,"
+                " phash TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._phash_db.commit()
+        return self._phash_db
+
+    def _load_phashes(self) -> None:
+        if self._phashes_loaded:
+            return
+        self._phashes_loaded = True
+        db = self._get_phash_db()
+        if db is None:
+            return
+        rows = db.execute(
+            "SELECT key, scope, phash FROM ocr_phash ORDER BY created_at DESC LIMIT ?",
+            (self.store.disk_max_entries,)
+        ).fetchall()
+        for key, scope, phash in reversed(rows):
+            self._phashes[key] = (scope, int(phash, 16))
+
+    def _remember_phash(self, key: str, scope: str, phash: int) -> None:
+        self._load_phashes()
+        self._phashes[key] = (scope, phash)
+        self._phashes.move_to_end(key)
+        dropped = []
+        while len(self._phashes) > self.store.disk_max_entries:
+            dropped.append(self._phashes.popitem(last=False)[0])
+        db = self._get_phash_db()
+        if db is not None:
+            db.execute(
+                "INSERT OR REPLACE INTO ocr_phash (key, scope, phash, created_at) VALUES (?, ?, ?, ?)",
+                (key, scope, f"{phash:016x}", time.time())
+            )
+            db.executemany("DELETE FROM ocr_phash WHERE key = ?", [(k,) for k in dropped])
+            db.commit()
+
+    def _forget_phash(self, key: str) -> None:
+        self._phashes.pop(key, None)
+        db = self._get_phash_db()
+        if db is not None:
+            db.execute("DELETE FROM ocr_phash WHERE key = ?", (key,))
+            db.commit()
+
+    def _nearest(self, scope: str, phash: int) -> Optional[str]:
+        """Key of the closest cached image in scope within max_distance bits, if any."""
+        self._load_phashes()
+        best_key, best_distance = None, self.max_distance + 1
+        for key, (entry_scope, entry_phash) in self._phashes.items():
+            if entry_scope == scope:
+                distance = (phash ^ entry_phash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        return best_key
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, scope: str, image_data: bytes) -> Optional[str]:
+        """Cached text for this image (or, if perceptual, a near-identical one)."""
+        text = self.store.get(self.key(scope, image_data))
+        if text is not None:
+            with self._lock:
+                self._metrics["exact_hits"] += 1
+            return text
+
+        if self.perceptual:
+            phash = difference_hash(image_data)
+            with self._lock:
+                near_key = self._nearest(scope, phash) if phash is not None else None
+            if near_key is not None:
+                text = self.store.get(near_key)
+                with self._lock:
+                    if text is not None:
+                        self._metrics["perceptual_hits"] += 1
+                        return text
+                    # Expired or evicted from the store
+                    self._forget_phash(near_key)
+
+        with self._lock:
+            self._metrics["misses"] += 1
+        return None
+
+    def set(self, scope: str, image_data: bytes, text: str) -> None:
+        key = self.key(scope, image_data)
+        self.store.set(key, text)
+        phash = difference_hash(image_data) if self.perceptual else None
+        with self._lock:
+            self._metrics["stores"] += 1
+            if phash is not None:
+                self._remember_phash(key, scope, phash)
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._metrics["bypassed"] += 1
+
+    def close(self) -> None:
+        self.store.close()
+        with self._lock:
+            if self._phash_db is not None:
+                self._phash_db.close()
+                self._phash_db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Exact/perceptual hit counters and hit rate, plus the underlying store's stats."""
+        with self._lock:
+            hits = self._metrics["exact_hits"] + self._metrics["perceptual_hits"]
+            lookups = hits + self._metrics["misses"]
+            return {
+                **self._metrics,
+                "enabled": self.enabled,
+                "perceptual": self.perceptual,
+                "max_distance": self.max_distance,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "phash_entries": len(self._phashes),
+                "store": self.store.stats(),
+            }
+
+
+ocr_cache = OCRCache.from_env()
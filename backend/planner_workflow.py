@@ -4,19 +4,82 @@ Based on the brain dump planning system with task breakdown, refinement, and con
 """
 
 import os
-from typing import List, Literal, TypedDict
+import asyncio
+import threading
+from typing import List, Literal, Optional, TypedDict
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langsmith import traceable
+from llm_registry import registry as llm_registry
+from tree_outline import task_list_outline, tree_outline
+from prompts import (
+    WORKFLOW_BREAKDOWN,
+    WORKFLOW_CONSOLIDATION,
+    WORKFLOW_FUSED_PLAN,
+    WORKFLOW_PRIORITIES,
+    WORKFLOW_REFINEMENT,
+    WORKFLOW_TASK_BREAKDOWN,
+    WORKFLOW_TASK_TREE,
+    Prompt,
+    prompt_text,
+)
+from compact_schema import COMPACT_OUTPUT_SCHEMA, compact_schema_for, expand
+from chunking import count_words, merge_task_trees, split_brain_dump, split_categories
+from token_budget import TokenBudget, token_budget
+from scheduler import DAILY_BUDGET_MINUTES, schedule_tasks
+from dependency_graph import DependencyGraph
+from interactive_planner import (
+    BRAIN_DUMP_CHUNK_CONCURRENCY,
+    REFINE_CONCURRENCY,
+    ProgressCallback,
+    gather_bounded,
+    no_progress,
+)
+from llm_cache import cached_structured_invoke
+
+# "local" fits the day with the knapsack scheduler; "llm" keeps the LLM refinement loop
+PLANNER_SCHEDULER = os.getenv("PLANNER_SCHEDULER", "local").lower()
+# Ask the LLM for 1-5 priority scores to weight the local scheduler
+SCHEDULER_LLM_PRIORITIES = os.getenv("SCHEDULER_LLM_PRIORITIES", "false").lower() in ("1", "true", "yes")
+# "staged": task tree, breakdown and time estimates as three LLM calls; "fused": one call for all three
+PLANNER_MODE = os.getenv("PLANNER_MODE", "staged").lower()
+# Time given to a fused-plan task that came back with neither subtasks nor a time
+DEFAULT_TASK_MINUTES = 30
+# Consolidation orders the plan locally; this adds an LLM pass to polish task wording
+CONSOLIDATION_LLM_PASS = os.getenv("CONSOLIDATION_LLM_PASS", "false").lower() in ("1", "true", "yes")
 
 # Initialize LLM
-def get_llm():
-    """Get configured LLM instance."""
-    return ChatOpenAI(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-        temperature=0.2,
-    )
+def get_llm_config() -> dict:
+    """Get LLM provider/model/options."""
+    return {
+        "provider": "openai",
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "temperature": 0.2,
+    }
+
+def get_structured_llm(schema: type, budget: Optional[TokenBudget] = None):
+    """Get the shared structured-output runnable for the given schema (and budget's max_tokens)."""
+    return llm_registry.get_structured_llm(schema, **token_budget.apply(get_llm_config(), budget))
+
+def plan_budget(kind: str, prompt: Prompt, basis: str) -> TokenBudget:
+    """Pre-flight token budget for a call whose output is derived from basis."""
+    return token_budget.plan(kind, prompt_text(prompt), basis, get_llm_config())
+
+async def invoke_budgeted(schema: type, prompt: Prompt, budget: TokenBudget, use_cache: bool = True):
+    """
+    Invoke the structured-output LLM through the response cache with
+    budget's max_tokens, recording actual usage and retrying once at the
+    output ceiling if the output is cut off; identical concurrent calls
+    share one request.
+    """
+    llm_config = get_llm_config()
+    return await token_budget.invoke(budget, lambda budget: cached_structured_invoke(
+        get_structured_llm(schema, budget), schema, prompt, llm_config, use_cache=use_cache
+    ))
+
+def get_output_schema(schema: type) -> type:
+    """Short-key counterpart of a task tree schema when COMPACT_OUTPUT_SCHEMA is on."""
+    return compact_schema_for(schema) if COMPACT_OUTPUT_SCHEMA else schema
 
 # Pydantic Models for Structured Outputs
 class Subtask(BaseModel):
@@ -47,6 +110,7 @@ class Task(BaseModel):
     name: str
     time: int = Field(..., description="Estimated duration in minutes")
     status: Literal["Ready", "BLOCKED", "Deferred"]
+    dependencies: List[str] = Field(default_factory=list, description="Names of tasks in this list that must be done first")
 
 class BreakdownOutput(BaseModel):
     detailed_tasks: List[Task]
@@ -56,6 +120,39 @@ class RefinementOutput(BaseModel):
     detailed_tasks: List[Task]
     total_time: int
 
+class TaskPriority(BaseModel):
+    number: int = Field(..., description="Number of the task in the list")
+    priority: int = Field(..., ge=1, le=5, description="1 = can easily wait, 5 = must be done today")
+
+class PriorityOutput(BaseModel):
+    priorities: List[TaskPriority]
+
+class PlannedSubtask(BaseModel):
+    name: str
+    time: int = Field(..., description="Estimated duration in minutes")
+    status: Literal["Ready", "BLOCKED", "Deferred"]
+    dependencies: List[str] = Field(default_factory=list)
+
+class PlannedTask(BaseModel):
+    name: str
+    subtasks: List[PlannedSubtask] = Field(..., description="Atomic steps of 15-120 minutes")
+    time: Optional[int] = Field(None, description="Estimated duration in minutes, if the task has no subtasks")
+    status: Optional[Literal["Ready", "BLOCKED", "Deferred"]] = Field(None, description="If the task has no subtasks")
+    dependencies: List[str] = Field(default_factory=list)
+
+class PlannedProject(BaseModel):
+    name: str
+    tasks: List[PlannedTask]
+    dependencies: List[str] = Field(default_factory=list)
+
+class PlannedCategory(BaseModel):
+    name: str
+    projects: List[PlannedProject]
+
+class FusedPlanOutput(BaseModel):
+    """Task tree, breakdown and time/status estimates in one structured output."""
+    categories: List[PlannedCategory]
+
 class ConsolidationOutput(BaseModel):
     final_plan: List[Task]
 
@@ -69,10 +166,87 @@ class PlannerState(TypedDict, total=False):
     final_plan: list  # for consolidation_node
     refinement_passes: int
     blocked_notified: bool
+    use_cache: bool  # False skips the LLM response cache
+
+# Prompt builders (static system message + per-request user message, see prompts.py)
+def build_task_tree_prompt(brain_dump: str) -> Prompt:
+    return WORKFLOW_TASK_TREE.render(brain_dump=brain_dump)
+
+def build_fused_plan_prompt(brain_dump: str) -> Prompt:
+    return WORKFLOW_FUSED_PLAN.render(brain_dump=brain_dump)
+
+def build_task_breakdown_prompt(task_tree_outline: str) -> Prompt:
+    return WORKFLOW_TASK_BREAKDOWN.render(task_tree_outline=task_tree_outline)
+
+def build_breakdown_prompt(task_tree_outline: str) -> Prompt:
+    return WORKFLOW_BREAKDOWN.render(task_tree_outline=task_tree_outline)
+
+def build_refinement_prompt(task_list: str) -> Prompt:
+    return WORKFLOW_REFINEMENT.render(task_list=task_list)
+
+def build_priorities_prompt(task_list: str) -> Prompt:
+    return WORKFLOW_PRIORITIES.render(task_list=task_list)
+
+def build_consolidation_prompt(task_list: str) -> Prompt:
+    return WORKFLOW_CONSOLIDATION.render(task_list=task_list)
+
+def ready_time(tasks: List[dict]) -> int:
+    """Exact total minutes of the Ready tasks (not the LLM's own arithmetic)."""
+    return sum(int(t.get("time") or 0) for t in tasks if t.get("status") == "Ready")
+
+def project_fused_plan(plan: dict) -> PlannerState:
+    """
+    Split a FusedPlanOutput tree into the staged path's state: task_tree
+    (tasks without subtasks), refined_task_tree (with subtasks) and
+    detailed_tasks (one timed task per subtask, or per task that has none).
+    """
+    task_tree = {"categories": []}
+    refined_task_tree = {"categories": []}
+    detailed_tasks = []
+    for category in plan.get("categories", []):
+        projects, refined_projects = [], []
+        for project in category.get("projects", []):
+            tasks, refined_tasks = [], []
+            for task in project.get("tasks", []):
+                tasks.append({"name": task["name"], "subtasks": [], "dependencies": task.get("dependencies", [])})
+                refined_tasks.append({
+                    "name": task["name"],
+                    "subtasks": [
+                        {"name": subtask["name"], "dependencies": subtask.get("dependencies", [])}
+                        for subtask in task.get("subtasks", [])
+                    ],
+                    "dependencies": task.get("dependencies", []),
+                })
+                for subtask in task.get("subtasks", []):
+                    detailed_tasks.append({
+                        "name": subtask["name"],
+                        "time": subtask["time"],
+                        "status": subtask["status"],
+                        "dependencies": subtask.get("dependencies", []),
+                    })
+                if not task.get("subtasks"):
+                    # Already atomic: the task itself is the timed item
+                    detailed_tasks.append({
+                        "name": task["name"],
+                        "time": task.get("time") or DEFAULT_TASK_MINUTES,
+                        "status": task.get("status") or "Ready",
+                        "dependencies": task.get("dependencies", []),
+                    })
+            projects.append({"name": project["name"], "tasks": tasks, "dependencies": project.get("dependencies", [])})
+            refined_projects.append({**projects[-1], "tasks": refined_tasks})
+        task_tree["categories"].append({"name": category["name"], "projects": projects})
+        refined_task_tree["categories"].append({"name": category["name"], "projects": refined_projects})
+
+    return {
+        "task_tree": task_tree,
+        "refined_task_tree": refined_task_tree,
+        "detailed_tasks": detailed_tasks,
+        "total_time": ready_time(detailed_tasks),
+    }
 
 # Node Functions
 @traceable(run_type="chain", name="Task Tree Node")
-def task_tree_node(state: PlannerState) -> PlannerState:
+async def task_tree_node(state: PlannerState) -> PlannerState:
     """
     Convert the brain dump into a structured, hierarchical task tree.
     Organizes items into categories, projects, tasks, and subtasks.
@@ -80,124 +254,128 @@ def task_tree_node(state: PlannerState) -> PlannerState:
     print("NODE: Converting brain dump into structured task tree...")
 
     brain_dump = state["brain_dump"]
-    llm = get_llm()
-
-    structured_llm = llm.with_structured_output(TaskTreeOutput)
+    use_cache = state.get("use_cache", True)
 
-    output: TaskTreeOutput = structured_llm.invoke(
-        f"""
-You are a helpful personal assistant agent who is proficient in organizing to-do list brain dumps into organized and usable task trees that can be used in planning your client's schedule and getting everything on the list done.
+    async def extract(text: str, budget: TokenBudget) -> dict:
+        output = await invoke_budgeted(
+            get_output_schema(TaskTreeOutput), build_task_tree_prompt(text), budget, use_cache=use_cache
+        )
+        return expand(TaskTreeOutput, output).model_dump()
+
+    prompt = build_task_tree_prompt(brain_dump)
+    budget = plan_budget("create", prompt, brain_dump)
+    if budget.fits:
+        task_tree = await extract(brain_dump, budget)
+    else:
+        # Too long for one call: extract chunks in parallel and merge them by name
+        chunks = split_brain_dump(brain_dump, max(1, count_words(brain_dump) // budget.pieces))
+        print(f"Brain dump would not fit one call ({budget}), extracting {len(chunks)} chunks")
+        trees = await gather_bounded(
+            chunks,
+            lambda chunk: extract(chunk, plan_budget("create", build_task_tree_prompt(chunk), chunk)),
+            BRAIN_DUMP_CHUNK_CONCURRENCY
+        )
+        task_tree = merge_task_trees(trees)
 
-Take the following 'brain dump' of things that a user needs to get done and organize it into a structured list.
+    return {
+        "task_tree": task_tree,
+    }
 
-Brain dump:
----
-{brain_dump}
----
+@traceable(run_type="chain", name="Fused Plan Node")
+async def fused_plan_node(state: PlannerState) -> PlannerState:
+    """
+    Build the task tree, break it down and estimate every step in a single
+    LLM call (PLANNER_MODE=fused), in place of the first three nodes.
+    """
+    print("NODE: Planning brain dump in a single pass...")
 
-Instructions:
-- Group related items into projects and categories (e.g. Academic, Household, Meal Prep).
-- Break each project into smaller actionable tasks and subtasks as referenced in the brain dump.
-- Present the output as a clear hierarchy (Category > Project > Task > Subtask).
-- Indicate dependencies or prerequisites where applicable, if referenced in the brain dump.
-- Be thorough and capture ALL items from the brain dump.
-"""
-    )
+    brain_dump = state["brain_dump"]
+    use_cache = state.get("use_cache", True)
+
+    async def plan(text: str, budget: TokenBudget) -> dict:
+        output = await invoke_budgeted(FusedPlanOutput, build_fused_plan_prompt(text), budget, use_cache=use_cache)
+        return output.model_dump()
+
+    prompt = build_fused_plan_prompt(brain_dump)
+    budget = plan_budget("fused_plan", prompt, brain_dump)
+    if budget.fits:
+        fused_plan = await plan(brain_dump, budget)
+    else:
+        # Too long for one call: plan chunks in parallel and merge them by name
+        chunks = split_brain_dump(brain_dump, max(1, count_words(brain_dump) // budget.pieces))
+        print(f"Brain dump would not fit one call ({budget}), planning {len(chunks)} chunks")
+        plans = await gather_bounded(
+            chunks,
+            lambda chunk: plan(chunk, plan_budget("fused_plan", build_fused_plan_prompt(chunk), chunk)),
+            BRAIN_DUMP_CHUNK_CONCURRENCY
+        )
+        fused_plan = merge_task_trees(plans)
 
-    return {
-        "task_tree": output.model_dump(),
-    }
+    return project_fused_plan(fused_plan)
 
 @traceable(run_type="chain", name="Task Breakdown Refinement Node")
-def task_breakdown_node(state: PlannerState) -> PlannerState:
+async def task_breakdown_node(state: PlannerState) -> PlannerState:
     """
     Further break down big and/or vague tasks into more manageable and actionable sub-tasks.
     """
     print("NODE: Breaking down big/vague tasks into more specific subtasks...")
 
     task_tree = state["task_tree"]
-    llm = get_llm()
-
-    structured_llm = llm.with_structured_output(TaskTreeRefinementOutput)
-
-    output: TaskTreeRefinementOutput = structured_llm.invoke(
-        f"""
-You are a helpful executive functioning coach and personal planning assistant agent that excels in breaking down projects and tasks into more manageable sub-lists and sub-tasks.
-
-Your primary task is to take an existing task tree and further break it down into logical, more specific to-do items.
-
-Current task tree:
----
-{task_tree}
----
-
-Instructions:
-- Add, where relevant and/or helpful, breakdowns of big and/or vague tasks.
-- For example, if a task is to 'clean the bathroom', the breakdown might include:
-  * 'clean the toilet'
-  * 'clean the shower'
-  * 'clean the mirror and sink'
-  * 'sweep and mop the floor'
-  * 'take out the trash'
-- Keep the same hierarchical structure (Category > Project > Task > Subtask).
-- Only break down tasks that would benefit from more specificity.
-- Preserve all existing tasks and structure.
-- Maintain any dependencies that were already noted.
-"""
-    )
+
+    async def refine(tree: dict) -> list:
+        outline = tree_outline(tree)
+        prompt = build_task_breakdown_prompt(outline)
+        output = await invoke_budgeted(
+            get_output_schema(TaskTreeRefinementOutput), prompt, plan_budget("refine", prompt, outline),
+            use_cache=state.get("use_cache", True)
+        )
+        return expand(TaskTreeRefinementOutput, output).model_dump()["categories"]
+
+    outline = tree_outline(task_tree)
+    budget = plan_budget("refine", build_task_breakdown_prompt(outline), outline)
+    parts = split_categories(task_tree, budget.pieces) if not budget.fits else [task_tree]
+    if len(parts) > 1:
+        print(f"Task tree would not fit one call ({budget}), refining {len(parts)} parts")
+    results = await gather_bounded(parts, refine, REFINE_CONCURRENCY)
 
     return {
-        "refined_task_tree": output.model_dump(),
+        "refined_task_tree": {"categories": [category for result in results for category in result]},
     }
 
 @traceable(run_type="chain", name="Breakdown Node")
-def breakdown_node(state: PlannerState) -> PlannerState:
+async def breakdown_node(state: PlannerState) -> PlannerState:
     """
     Convert the refined task tree into atomic tasks with time estimates and status.
     """
     print("NODE: Converting refined task tree to atomic tasks with time estimates...")
 
     refined_task_tree = state["refined_task_tree"]
-    llm = get_llm()
-
-    # Ask the LLM to produce structured tasks
-    structured_llm = llm.with_structured_output(BreakdownOutput)
-
-    output: BreakdownOutput = structured_llm.invoke(
-        f"""
-You are a productivity and planning assistant.
-
-Refined task tree with detailed subtasks:
----
-{refined_task_tree}
----
-
-1. Convert this hierarchical task tree into a flat list of atomic tasks that can be done in 15–120 minutes.
-2. For each task (including subtasks), assign:
-   - name: Clear, actionable task name (include project/category context if helpful)
-   - time: Estimated time in minutes (integer)
-   - status: 
-     * "Ready" if it can be done now
-     * "BLOCKED" if waiting on something external or has unfulfilled dependencies
-     * "Deferred" if it should be done another day or is lower priority
-3. Compute total_time as the sum of time for tasks with status "Ready".
-4. Respect dependencies noted in the task tree.
-
-Be thorough - extract ALL tasks and subtasks from the tree.
-"""
-    )
+
+    # Ask the LLM to produce structured tasks, per group of categories if the tree is too big
+    async def break_down(tree: dict) -> BreakdownOutput:
+        outline = tree_outline(tree)
+        prompt = build_breakdown_prompt(outline)
+        return await invoke_budgeted(
+            BreakdownOutput, prompt, plan_budget("task_list", prompt, outline), use_cache=state.get("use_cache", True)
+        )
+
+    outline = tree_outline(refined_task_tree)
+    budget = plan_budget("task_list", build_breakdown_prompt(outline), outline)
+    parts = split_categories(refined_task_tree, budget.pieces) if not budget.fits else [refined_task_tree]
+    if len(parts) > 1:
+        print(f"Task tree would not fit one call ({budget}), breaking down {len(parts)} parts")
+    outputs: List[BreakdownOutput] = await gather_bounded(parts, break_down, REFINE_CONCURRENCY)
 
     # Convert Pydantic objects to plain dicts
-    detailed_tasks = [t.model_dump() for t in output.detailed_tasks]
-    total_time = output.total_time
+    detailed_tasks = [t.model_dump() for output in outputs for t in output.detailed_tasks]
 
     return {
         "detailed_tasks": detailed_tasks,
-        "total_time": total_time,
+        "total_time": ready_time(detailed_tasks),
     }
 
 @traceable(run_type="chain", name="Refinement Node")
-def refinement_node(state: PlannerState) -> PlannerState:
+async def refinement_node(state: PlannerState) -> PlannerState:
     """
     Refine the plan when total time exceeds the daily limit.
     De-prioritize or defer non-urgent tasks.
@@ -205,65 +383,89 @@ def refinement_node(state: PlannerState) -> PlannerState:
     print("NODE: Total time exceeded limit. Running refinement...")
 
     passes = state.get("refinement_passes", 0) + 1
-    llm = get_llm()
 
-    structured_llm = llm.with_structured_output(RefinementOutput)
+    # The whole day's list is needed to prioritize, so this call is never split
+    task_list = task_list_outline(state["detailed_tasks"])
+    prompt = build_refinement_prompt(task_list)
+    output: RefinementOutput = await invoke_budgeted(
+        RefinementOutput, prompt, plan_budget("task_list_edit", prompt, task_list),
+        use_cache=state.get("use_cache", True)
+    )
 
-    output: RefinementOutput = structured_llm.invoke(
-        f"""
-You are refining today's task plan.
+    detailed_tasks = [t.model_dump() for t in output.detailed_tasks]
 
-Here is the current plan (JSON list of tasks):
-{state["detailed_tasks"]}
+    return {
+        "detailed_tasks": detailed_tasks,
+        "total_time": ready_time(detailed_tasks),
+        "refinement_passes": passes,
+    }
 
-User can work at most 480 minutes (8 hours) today.
+async def score_priorities(tasks: List[dict], use_cache: bool = True) -> Optional[List[int]]:
+    """One 1-5 priority per task from the LLM, or None if the call fails."""
+    task_list = task_list_outline(tasks, numbered=True)
+    prompt = build_priorities_prompt(task_list)
+    try:
+        output: PriorityOutput = await invoke_budgeted(
+            PriorityOutput, prompt, plan_budget("priorities", prompt, task_list), use_cache=use_cache
+        )
+    except Exception as e:
+        print(f"Priority scoring failed, scheduling without priorities: {e}")
+        return None
+
+    priorities = [None] * len(tasks)
+    for item in output.priorities:
+        if 1 <= item.number <= len(tasks):
+            priorities[item.number - 1] = item.priority
+    return priorities
+
+@traceable(run_type="chain", name="Schedule Node")
+async def schedule_node(state: PlannerState) -> PlannerState:
+    """
+    Fit the day's Ready tasks into the daily budget locally, deferring the rest.
+    Only calls the LLM (once) if SCHEDULER_LLM_PRIORITIES is on.
+    """
+    print("NODE: Scheduling tasks into the daily budget...")
 
-Instructions:
-- De-prioritize or defer non-urgent or low priority tasks to another day (set status to "Deferred").
-- Keep important/urgent tasks as "Ready".
-- Update each task's status and time if needed.
-- Recalculate total_time as the sum of time for tasks with status "Ready".
+    tasks = state["detailed_tasks"]
+    priorities = None
+    if SCHEDULER_LLM_PRIORITIES and ready_time(tasks) > DAILY_BUDGET_MINUTES:
+        priorities = await score_priorities(tasks, use_cache=state.get("use_cache", True))
 
-Focus on what MUST be done today vs. what can wait.
-"""
-    )
+    # Resolving dependencies is CPU-bound on large task lists: keep it off the event loop
+    schedule = await asyncio.to_thread(schedule_tasks, tasks, DAILY_BUDGET_MINUTES, priorities)
+    print(f"Scheduled {schedule.total_time}/{DAILY_BUDGET_MINUTES} mins, deferred {len(schedule.deferred)} tasks")
 
     return {
-        "detailed_tasks": [t.model_dump() for t in output.detailed_tasks],
-        "total_time": output.total_time,
-        "refinement_passes": passes,
+        "detailed_tasks": schedule.tasks,
+        "total_time": schedule.total_time,
     }
 
 @traceable(run_type="chain", name="Consolidation Node")
-def consolidation_node(state: PlannerState) -> PlannerState:
+async def consolidation_node(state: PlannerState) -> PlannerState:
     """
-    Finalize the plan by consolidating and cleaning up tasks.
+    Finalize the plan: drop Deferred tasks and put the rest in dependency order,
+    then optionally let the LLM polish the wording (CONSOLIDATION_LLM_PASS).
     """
     print("NODE: Finalizing and consolidating remaining tasks...")
 
-    llm = get_llm()
-    structured_llm = llm.with_structured_output(ConsolidationOutput)
-
-    output: ConsolidationOutput = structured_llm.invoke(
-        f"""
-You are finalizing a daily plan.
-
-Current tasks:
-{state["detailed_tasks"]}
-
-Clean up:
-- Remove tasks with status "Deferred" (they're for another day).
-- Keep "Ready" tasks in the final plan.
-- Include "BLOCKED" tasks but clearly mark them.
-- Group or rename tasks if it improves clarity, but don't lose information.
-- Ensure tasks are in a logical order.
-
-Return the final list as 'final_plan'.
-"""
-    )
+    tasks = [t for t in state["detailed_tasks"] if t.get("status") != "Deferred"]
+    graph = await asyncio.to_thread(DependencyGraph.from_tasks, tasks)
+    final_plan = [tasks[index] for index in graph.order()]
+    path, minutes = graph.critical_path()
+    if path:
+        print(f"Critical path: {minutes} mins over {len(path)} tasks")
+
+    if CONSOLIDATION_LLM_PASS and final_plan:
+        task_list = task_list_outline(final_plan)
+        prompt = build_consolidation_prompt(task_list)
+        output: ConsolidationOutput = await invoke_budgeted(
+            ConsolidationOutput, prompt, plan_budget("task_list_edit", prompt, task_list),
+            use_cache=state.get("use_cache", True)
+        )
+        final_plan = [t.model_dump() for t in output.final_plan]
 
     return {
-        "final_plan": [t.model_dump() for t in output.final_plan],
+        "final_plan": final_plan,
         "total_time": state.get("total_time", 0),
         "detailed_tasks": state["detailed_tasks"],
     }
@@ -288,7 +490,7 @@ def router_node(state: PlannerState) -> str:
     """
     Decides the next step based on the plan's current state.
     """
-    MAX_DAILY_TIME_MINUTES = 480  # 8 hours max
+    MAX_DAILY_TIME_MINUTES = DAILY_BUDGET_MINUTES
     MAX_REFINEMENT_PASSES = 3
 
     total_time = state.get("total_time", 0)
@@ -326,44 +528,67 @@ def create_planner_graph():
     """
     workflow = StateGraph(PlannerState)
 
-    # Add the nodes
-    workflow.add_node("task_tree", task_tree_node)
-    workflow.add_node("task_breakdown", task_breakdown_node)
-    workflow.add_node("breakdown", breakdown_node)
-    workflow.add_node("refinement", refinement_node)
+    # Add the nodes; fused mode replaces the first three with one
+    if PLANNER_MODE == "fused":
+        workflow.add_node("plan", fused_plan_node)
+        planned = "plan"
+    else:
+        workflow.add_node("task_tree", task_tree_node)
+        workflow.add_node("task_breakdown", task_breakdown_node)
+        workflow.add_node("breakdown", breakdown_node)
+        planned = "breakdown"
+    # The local scheduler always fits the day, so only the LLM scheduler needs the refinement loop
+    if PLANNER_SCHEDULER == "llm":
+        workflow.add_node("refinement", refinement_node)
+    else:
+        workflow.add_node("schedule", schedule_node)
     workflow.add_node("consolidation", consolidation_node)
     workflow.add_node("notify", notify_blocked_node)
 
-    # Set the start node
-    workflow.set_entry_point("task_tree")
-
-    # Task tree flows to task breakdown refinement
-    workflow.add_edge("task_tree", "task_breakdown")
-    
-    # Task breakdown flows to time estimation
-    workflow.add_edge("task_breakdown", "breakdown")
-
-    # Conditional from breakdown
-    workflow.add_conditional_edges(
-        "breakdown",
-        router_node,
-        {
-            "refine": "refinement",
-            "notify": "notify",
-            "consolidate": "consolidation",
-        }
-    )
+    if PLANNER_MODE == "fused":
+        workflow.set_entry_point("plan")
+    else:
+        # Set the start node
+        workflow.set_entry_point("task_tree")
+
+        # Task tree flows to task breakdown refinement
+        workflow.add_edge("task_tree", "task_breakdown")
+
+        # Task breakdown flows to time estimation
+        workflow.add_edge("task_breakdown", "breakdown")
+
+    # Fit the day locally, or let the router send the plan back to the LLM while over budget
+    if PLANNER_SCHEDULER == "llm":
+        workflow.add_conditional_edges(
+            planned,
+            router_node,
+            {
+                "refine": "refinement",
+                "notify": "notify",
+                "consolidate": "consolidation",
+            }
+        )
 
-    # Loop after refinement
-    workflow.add_conditional_edges(
-        "refinement",
-        router_node,
-        {
-            "refine": "refinement",
-            "notify": "notify",
-            "consolidate": "consolidation",
-        }
-    )
+        # Loop after refinement
+        workflow.add_conditional_edges(
+            "refinement",
+            router_node,
+            {
+                "refine": "refinement",
+                "notify": "notify",
+                "consolidate": "consolidation",
+            }
+        )
+    else:
+        workflow.add_edge(planned, "schedule")
+        workflow.add_conditional_edges(
+            "schedule",
+            router_node,
+            {
+                "notify": "notify",
+                "consolidate": "consolidation",
+            }
+        )
 
     # After notify, go straight to consolidation
     workflow.add_edge("notify", "consolidation")
@@ -374,18 +599,41 @@ def create_planner_graph():
     # Compile
     return workflow.compile()
 
+# Compiled graphs hold no per-run state, so one instance serves every request
+_planner_graph = None
+_planner_graph_lock = threading.Lock()
+
+def get_planner_graph():
+    """
+    Return the process-wide compiled planner graph, building it on first use.
+    """
+    global _planner_graph
+    if _planner_graph is None:
+        with _planner_graph_lock:
+            if _planner_graph is None:
+                _planner_graph = create_planner_graph()
+    return _planner_graph
+
+def warm_up_planner_graph():
+    """
+    Build and compile the planner graph ahead of the first request.
+    """
+    get_planner_graph()
+
 # Main function to run the planner
-def run_planner(brain_dump: str) -> dict:
+async def run_planner(brain_dump: str, progress: ProgressCallback = no_progress, use_cache: bool = True) -> dict:
     """
     Run the planner workflow on a brain dump.
     
     Args:
         brain_dump: The user's brain dump text
+        progress: Called with each node's name (and the plan's total_time) as it finishes
+        use_cache: False skips the LLM response cache
         
     Returns:
         Final state containing the plan
     """
-    app = create_planner_graph()
+    app = get_planner_graph()
     
     initial_state = {
         "brain_dump": brain_dump,
@@ -395,7 +643,13 @@ def run_planner(brain_dump: str) -> dict:
         "total_time": 0,
         "blocked_notified": False,
         "refinement_passes": 0,
+        "use_cache": use_cache,
     }
 
-    final_state = app.invoke(initial_state)
+    # Stream node updates so each node can be reported as it finishes
+    final_state = dict(initial_state)
+    async for update in app.astream(initial_state, stream_mode="updates"):
+        for node, values in update.items():
+            final_state.update(values or {})
+            progress(node, total_time=final_state.get("total_time", 0))
     return final_state
@@ -0,0 +1,370 @@
+"""
+Versioned prompt templates, laid out for provider-side prompt caching.
+
+Every prompt is a static system message (role, instructions, formats)
+followed by a user message that holds only the per-request data. The
+leading bytes of every request made from one template are therefore
+identical, so providers that cache prompt prefixes (OpenAI does so
+automatically above 1024 tokens) can reuse them instead of processing a
+cold prompt. Each template carries a version, bumped by hand when its
+wording changes, and a content hash; PROMPTS lists them all.
+"""
+
+import hashlib
+from typing import Any, Dict, List, Union
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from scheduler import DAILY_BUDGET_MINUTES
+from tree_outline import HANDLE_FORMAT, OUTLINE_FORMAT
+
+Prompt = Union[str, List[BaseMessage]]
+
+
+class PromptTemplate:
+    """A static system message plus a str.format template for the user message."""
+
+    def __init__(self, name: str, version: int, system: str, user: str):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.user = user
+        self.hash = hashlib.sha256(f"{name}\n{version}\n{system}\n{user}".encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@v{self.version}-{self.hash[:8]}"
+
+    def format_user(self, **values: Any) -> str:
+        return self.user.format(**values)
+
+    def render(self, **values: Any) -> List[BaseMessage]:
+        """System and user messages for one request."""
+        return [SystemMessage(content=self.system), HumanMessage(content=self.format_user(**values))]
+
+
+def append_to_system(messages: List[BaseMessage], text: str) -> List[BaseMessage]:
+    """Copy of rendered messages with static text (e.g. an output schema) added to the system message."""
+    return [
+        SystemMessage(content=message.content + text) if isinstance(message, SystemMessage) else message
+        for message in messages
+    ]
+
+
+def prompt_text(prompt: Prompt) -> str:
+    """Flatten a prompt (plain text or messages) into text for cache keys and token counts."""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n\n".join(message.content if isinstance(message.content, str) else str(message.content)
+                       for message in prompt)
+
+
+# ----------------------------------------------------------------------
+# Interactive planner
+# ----------------------------------------------------------------------
+_ORGANIZER_ROLE = (
+    "You are a helpful personal assistant agent who is proficient in organizing to-do list brain dumps "
+    "into organized and usable task trees that can be used in planning your client's schedule and getting "
+    "everything on the list done."
+)
+
+_COACH_ROLE = (
+    "You are a helpful executive functioning coach and personal planning assistant agent that excels in "
+    "breaking down projects and tasks into more manageable sub-lists and sub-tasks."
+)
+
+_BREAKDOWN_EXAMPLE = """- Add, where relevant and/or helpful, breakdowns of big and/or vague tasks.
+- For example, if a task is to 'clean the bathroom', the breakdown might include:
+  * 'clean the toilet'
+  * 'clean the shower'
+  * 'clean the mirror and sink'
+  * 'sweep and mop the floor'
+  * 'take out the trash'
+- Keep the same hierarchical structure (Category > Project > Task > Subtask)."""
+
+CREATE_TASK_TREE = PromptTemplate("create_task_tree", 1, f"""{_ORGANIZER_ROLE}
+
+Take the 'brain dump' of things that a user needs to get done (in the user message) and organize it into a structured list.
+
+Instructions:
+- Group related items into projects and categories (e.g. Academic, Household, Meal Prep).
+- Break each project into smaller actionable tasks and subtasks as referenced in the brain dump.
+- Present the output as a clear hierarchy (Category > Project > Task > Subtask).
+- Indicate dependencies or prerequisites where applicable, if referenced in the brain dump.
+
+⚠️ CRITICAL: Be thorough and capture EVERY SINGLE ITEM from the brain dump. Do not skip or omit anything.
+⚠️ If the brain dump is long, make sure to process the ENTIRE text, not just the beginning.
+⚠️ Count the items in the brain dump and make sure you've included all of them in your output.
+""", """Brain dump:
+---
+{brain_dump}
+---""")
+
+MERGE_TASK_TREE = PromptTemplate("merge_task_tree", 1, f"""{_ORGANIZER_ROLE}
+
+The user has an EXISTING task tree and is adding NEW items to it. Your job is to:
+1. KEEP ALL existing items unchanged
+2. Add the new items from the brain dump
+3. Merge logically - if new items fit into existing categories/projects, add them there
+4. Create new categories/projects only if the new items don't fit existing ones
+
+The existing tree is given as an outline. {OUTLINE_FORMAT}
+
+Instructions:
+- PRESERVE all existing categories, projects, tasks, and subtasks exactly as they are
+- Add new items from the brain dump into appropriate existing categories/projects where they fit
+- Only create new categories/projects if the new items don't logically fit anywhere existing
+- Maintain the clear hierarchy (Category > Project > Task > Subtask)
+- Indicate dependencies or prerequisites where applicable
+
+⚠️ CRITICAL: Include EVERY item from both the existing tree and the new brain dump.
+""", """EXISTING TASK TREE (KEEP ALL OF THIS):
+---
+{existing_outline}
+---
+
+NEW ITEMS TO ADD:
+---
+{brain_dump}
+---""")
+
+DELTA_TASK_TREE = PromptTemplate("delta_task_tree", 1, f"""{_ORGANIZER_ROLE}
+
+The user already has a task tree and is adding NEW items to it. The existing tree is summarized as an outline of its categories and, indented under them, their projects.
+
+Instructions:
+- Return ONLY the new items from the brain dump. Do not repeat anything from the existing outline except as a placement.
+- If a new item fits an existing category/project, place it under that category and project using their EXACT names from the outline.
+- Only create new categories/projects if the new items don't logically fit anywhere existing.
+- Break new items into tasks and subtasks as referenced in the brain dump (Category > Project > Task > Subtask).
+- Indicate dependencies or prerequisites where applicable.
+
+⚠️ CRITICAL: Capture EVERY item from the new brain dump.
+""", """EXISTING CATEGORIES AND PROJECTS:
+---
+{existing_outline}
+---
+
+NEW ITEMS TO ADD:
+---
+{brain_dump}
+---""")
+
+VALIDATE_NAMES = PromptTemplate("validate_names", 1, f"""You are a validation agent ensuring data consistency when merging task trees.
+
+You receive an ORIGINAL tree, whose item names MUST be preserved exactly, and a NEW tree that may have renamed some original items. {OUTLINE_FORMAT}
+
+Your task:
+1. Compare the two trees carefully
+2. Identify any items in the NEW tree that appear to be the same as items in the ORIGINAL tree but have different names
+3. CORRECT those names back to match the ORIGINAL tree EXACTLY
+4. Keep any truly new items with their new names
+5. Preserve all other aspects (structure, dependencies, subtasks)
+
+⚠️ CRITICAL RULES:
+- Original item names must match EXACTLY (character for character)
+- Do NOT rename truly new items that weren't in the original tree
+- If you're unsure whether an item is the same, compare context (parent category/project, similar purpose)
+- Preserve the complete structure - don't drop any items
+
+Return the corrected tree with original names preserved.
+""", """ORIGINAL TREE (these item names MUST be preserved exactly):
+---
+{original_outline}
+---
+
+NEW TREE (may have renamed some original items):
+---
+{new_outline}
+---""")
+
+REFINE_TASK_TREE = PromptTemplate("refine_task_tree", 1, f"""{_COACH_ROLE}
+
+Your primary task is to take an existing task tree (which may contain user edits and only selected tasks) and further break it down into logical, more specific to-do items.
+
+{OUTLINE_FORMAT}
+{HANDLE_FORMAT}
+
+Instructions:
+{_BREAKDOWN_EXAMPLE}
+- Break down ALL tasks provided into specific, actionable subtasks.
+- If a task already has subtasks but they're too vague, add more detail.
+- Maintain any dependencies that were already noted.
+- Fix any typos or formatting issues from user edits.
+
+⚠️ IMPORTANT: You may receive only a subset of tasks that need breakdown. Process all tasks you receive.
+⚠️ Break down each task into clear, specific, actionable steps.
+⚠️ Do not skip any tasks - every task should be broken down further.
+""", """Current task tree:
+---
+{task_tree_outline}
+---""")
+
+STREAMING_JSON_OUTPUT = """
+Respond with a single JSON object that matches this JSON schema. Do not include any text before or after the JSON.
+{schema}
+"""
+
+# ----------------------------------------------------------------------
+# Legacy LangGraph workflow
+# ----------------------------------------------------------------------
+WORKFLOW_TASK_TREE = PromptTemplate("workflow_task_tree", 1, f"""{_ORGANIZER_ROLE}
+
+Take the 'brain dump' of things that a user needs to get done (in the user message) and organize it into a structured list.
+
+Instructions:
+- Group related items into projects and categories (e.g. Academic, Household, Meal Prep).
+- Break each project into smaller actionable tasks and subtasks as referenced in the brain dump.
+- Present the output as a clear hierarchy (Category > Project > Task > Subtask).
+- Indicate dependencies or prerequisites where applicable, if referenced in the brain dump.
+- Be thorough and capture ALL items from the brain dump.
+""", """Brain dump:
+---
+{brain_dump}
+---""")
+
+WORKFLOW_TASK_BREAKDOWN = PromptTemplate("workflow_task_breakdown", 1, f"""{_COACH_ROLE}
+
+Your primary task is to take an existing task tree and further break it down into logical, more specific to-do items.
+
+{OUTLINE_FORMAT}
+
+Instructions:
+{_BREAKDOWN_EXAMPLE}
+- Only break down tasks that would benefit from more specificity.
+- Preserve all existing tasks and structure.
+- Maintain any dependencies that were already noted.
+""", """Current task tree:
+---
+{task_tree_outline}
+---""")
+
+WORKFLOW_FUSED_PLAN = PromptTemplate("workflow_fused_plan", 2, f"""{_ORGANIZER_ROLE}
+
+Take the 'brain dump' of things that a user needs to get done (in the user message) and turn it into a complete, timed plan in one pass.
+
+Instructions:
+- Group related items into projects and categories (e.g. Academic, Household, Meal Prep).
+- Break each project into actionable tasks, and each task into atomic subtasks that can be done in 15–120 minutes. A task that is already that small gets one subtask with the same name.
+{_BREAKDOWN_EXAMPLE}
+- Indicate dependencies or prerequisites by name where applicable, if referenced in the brain dump.
+- Be thorough and capture ALL items from the brain dump.
+- For each subtask (and any task left without subtasks), assign:
+   - time: Estimated time in minutes (integer)
+   - status:
+     * "Ready" if it can be done now
+     * "BLOCKED" if waiting on something external or has unfulfilled dependencies
+     * "Deferred" if it should be done another day or is lower priority
+""", """Brain dump:
+---
+{brain_dump}
+---""")
+
+WORKFLOW_BREAKDOWN = PromptTemplate("workflow_breakdown", 2, f"""You are a productivity and planning assistant.
+
+You receive a refined task tree with detailed subtasks. {OUTLINE_FORMAT}
+
+1. Convert this hierarchical task tree into a flat list of atomic tasks that can be done in 15–120 minutes.
+2. For each task (including subtasks), assign:
+   - name: Clear, actionable task name (include project/category context if helpful)
+   - time: Estimated time in minutes (integer)
+   - status:
+     * "Ready" if it can be done now
+     * "BLOCKED" if waiting on something external or has unfulfilled dependencies
+     * "Deferred" if it should be done another day or is lower priority
+   - dependencies: names of other tasks in this list that must be done first (omit if none)
+3. Compute total_time as the sum of time for tasks with status "Ready".
+4. Respect dependencies noted in the task tree.
+
+Be thorough - extract ALL tasks and subtasks from the tree.
+""", """Refined task tree with detailed subtasks:
+---
+{task_tree_outline}
+---""")
+
+WORKFLOW_REFINEMENT = PromptTemplate("workflow_refinement", 2, f"""You are refining today's task plan.
+
+User can work at most {DAILY_BUDGET_MINUTES} minutes ({DAILY_BUDGET_MINUTES / 60:g} hours) today.
+
+Instructions:
+- De-prioritize or defer non-urgent or low priority tasks to another day (set status to "Deferred").
+- Keep important/urgent tasks as "Ready".
+- Update each task's status and time if needed.
+- Recalculate total_time as the sum of time for tasks with status "Ready".
+
+Focus on what MUST be done today vs. what can wait.
+""", """Here is the current plan (one task per line: name (minutes, status)):
+{task_list}""")
+
+WORKFLOW_PRIORITIES = PromptTemplate("workflow_priorities", 1, """You are helping plan today's work.
+
+Score how important it is that each task gets done today, from 1 (can easily wait) to 5 (must be done today). Consider deadlines, urgency and what other tasks depend on it.
+
+Return one score per task, identified by its number in the list.
+""", """Tasks (one per line: number. name (minutes, status)):
+{task_list}""")
+
+WORKFLOW_CONSOLIDATION = PromptTemplate("workflow_consolidation", 2, """You are finalizing a daily plan.
+
+Deferred tasks have already been removed and the tasks are already in dependency order. Clean up the wording:
+- Rename tasks if it improves clarity, but don't lose information.
+- Keep every task, its time and its status, and keep the order.
+- Include "BLOCKED" tasks but clearly mark them.
+
+Return the final list as 'final_plan'.
+""", """Current tasks (one per line: name (minutes, status)):
+{task_list}""")
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+GENERATE_TODO = PromptTemplate("generate_todo", 2, f"""You are a helpful executive functioning coach and personal planning assistant agent that excels in re-organizing structured task trees into more logical to-do lists that can be tackled more easily.
+
+Your primary task is to take an existing, broken down task tree and reorganize it so that it groups similar tasks that can be done at the same time and orders them according to logical dependencies.
+
+For example, if the list includes separate tasks lists for each meal or event to plan and shop for, the meal planning can all be grouped into one task list to be done first and the shopping can all be grouped into another task list that can be tackled at the same time after the planning is complete.
+
+Guidelines:
+- Group similar tasks that can be done together
+- Order tasks based on logical dependencies (what must be done first); the tree is followed by its items already in dependency order, so keep that order between groups
+- Use clear, action-oriented language
+- Keep tasks specific and actionable
+- Consider efficiency and workflow optimization
+
+The task tree is given as an outline. {OUTLINE_FORMAT}
+
+Return ONLY a JSON object with an "items" key containing an array of strings, where each string is a reorganized to-do item. Example:
+{{"items": ["Group 1: Plan all meals for the week", "Group 2: Create consolidated shopping list", "Group 3: Shop for all groceries at once", ...]}}
+""", """Task Tree:
+{task_tree_outline}
+
+Items in dependency order:
+{dependency_order}{additional_instructions}""")
+
+PROMPTS: Dict[str, PromptTemplate] = {
+    template.name: template
+    for template in (
+        CREATE_TASK_TREE,
+        MERGE_TASK_TREE,
+        DELTA_TASK_TREE,
+        VALIDATE_NAMES,
+        REFINE_TASK_TREE,
+        WORKFLOW_TASK_TREE,
+        WORKFLOW_TASK_BREAKDOWN,
+        WORKFLOW_FUSED_PLAN,
+        WORKFLOW_BREAKDOWN,
+        WORKFLOW_REFINEMENT,
+        WORKFLOW_PRIORITIES,
+        WORKFLOW_CONSOLIDATION,
+        GENERATE_TODO,
+    )
+}
+
+
+def prompt_manifest() -> Dict[str, Dict[str, Any]]:
+    """Name -> version, hash and static system message size for every template."""
+    return {
+        name: {"id": template.id, "version": template.version, "hash": template.hash,
+               "system_chars": len(template.system)}
+        for name, template in PROMPTS.items()
+    }
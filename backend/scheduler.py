@@ -0,0 +1,138 @@
+"""
+Local daily scheduler for the planner workflow.
+
+Decides which Ready tasks fit into the day's budget and defers the rest,
+exactly and deterministically, instead of asking the LLM to do it (and
+its total_time arithmetic) in a refinement loop. Selection is a 0/1
+knapsack over minutes whose value is priority x minutes, so without
+priorities it fills the day as fully as possible. A dependency repair
+follows: a task is only scheduled if every task it depends on is, and
+the minutes freed up are refilled greedily with tasks whose dependencies
+are in. BLOCKED tasks are left alone and, as before, total_time counts
+Ready minutes only.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from dependency_graph import DependencyGraph
+
+DAILY_BUDGET_MINUTES = int(os.getenv("DAILY_BUDGET_MINUTES", "480"))
+
+# Priorities run from 1 (can wait) to 5 (must happen today)
+DEFAULT_PRIORITY = 3
+
+
+class Schedule:
+    """Tasks with their scheduled statuses, and what was deferred to fit the budget."""
+
+    def __init__(self, tasks: List[Dict[str, Any]], total_time: int, deferred: List[str], budget: int):
+        self.tasks = tasks
+        self.total_time = total_time
+        self.deferred = deferred
+        self.budget = budget
+
+    def __repr__(self) -> str:
+        return f"Schedule({self.total_time}/{self.budget} min, {len(self.deferred)} deferred)"
+
+
+def resolve_dependencies(tasks: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    For each task, the indexes of the tasks in the list it depends on
+    (see dependency_graph for matching). Unknown names are dropped, as
+    are edges that would close a cycle.
+    """
+    graph = DependencyGraph.from_tasks(tasks)
+    return [graph.dependencies[index] for index in range(len(tasks))]
+
+
+def knapsack(weights: List[int], values: List[int], capacity: int) -> Set[int]:
+    """Indexes of the subset with the highest total value whose weights fit capacity (exact DP)."""
+    best = [0] * (capacity + 1)
+    taken = []
+    for weight, value in zip(weights, values):
+        row = bytearray(capacity + 1)
+        for remaining in range(capacity, weight - 1, -1):
+            candidate = best[remaining - weight] + value
+            if candidate > best[remaining]:
+                best[remaining] = candidate
+                row[remaining] = 1
+        taken.append(row)
+
+    chosen = set()
+    remaining = capacity
+    for index in range(len(weights) - 1, -1, -1):
+        if taken[index][remaining]:
+            chosen.add(index)
+            remaining -= weights[index]
+    return chosen
+
+
+def schedule_tasks(
+    tasks: List[Dict[str, Any]],
+    budget: int = DAILY_BUDGET_MINUTES,
+    priorities: Optional[List[int]] = None
+) -> Schedule:
+    """
+    Fit the Ready tasks into budget minutes. Tasks that depend on a
+    Deferred or BLOCKED task take that status too; Ready tasks left out
+    of the selection become Deferred. priorities (one per task) weight
+    the selection; missing ones count as DEFAULT_PRIORITY.
+    """
+    tasks = [dict(task) for task in tasks]
+    dependencies = resolve_dependencies(tasks)
+    given = priorities or []
+    priorities = [
+        min(5, max(1, int(given[i]))) if i < len(given) and given[i] else DEFAULT_PRIORITY
+        for i in range(len(tasks))
+    ]
+    times = [max(0, int(task.get("time") or 0)) for task in tasks]
+
+    # A task waits for whatever its dependencies wait for
+    changed = True
+    while changed:
+        changed = False
+        for index, task in enumerate(tasks):
+            if task.get("status") != "Ready":
+                continue
+            for target in dependencies[index]:
+                status = tasks[target].get("status")
+                if status in ("Deferred", "BLOCKED"):
+                    task["status"] = status
+                    changed = True
+                    break
+
+    candidates = [index for index, task in enumerate(tasks) if task.get("status") == "Ready"]
+    chosen_positions = knapsack(
+        [times[i] for i in candidates],
+        [priorities[i] * max(times[i], 1) for i in candidates],
+        max(0, budget)
+    )
+    selected = {candidates[position] for position in chosen_positions}
+
+    # Drop tasks whose dependencies did not make it, then refill with ones whose dependencies did
+    changed = True
+    while changed:
+        changed = False
+        for index in sorted(selected):
+            if any(target not in selected for target in dependencies[index]):
+                selected.discard(index)
+                changed = True
+    remaining = budget - sum(times[i] for i in selected)
+    changed = True
+    while changed:
+        changed = False
+        for index in sorted(candidates, key=lambda i: (-priorities[i], i)):
+            if (index not in selected and times[index] <= remaining
+                    and all(target in selected for target in dependencies[index])):
+                selected.add(index)
+                remaining -= times[index]
+                changed = True
+
+    deferred = []
+    for index in candidates:
+        if index not in selected:
+            tasks[index]["status"] = "Deferred"
+            deferred.append(tasks[index].get("name"))
+    total_time = sum(times[i] for i in selected)
+    return Schedule(tasks, total_time, deferred, budget)
@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing of identical concurrent LLM calls.
+
+When several requests make the same call at the same time (the same
+template brain dump submitted by many users, or a client retrying while
+its first request is still running), only the first one reaches the
+provider. The others wait on its in-flight task and get a copy of its
+result, or the same exception if it fails.
+
+Calls are keyed by the same normalized key as the response cache
+(provider, model, temperature, output schema, normalized prompt). A key
+is only shared while its call is in flight; once it finishes the next
+caller starts a new call (and will usually find the response cache
+filled). A waiter that goes away does not cancel the call for the
+others; the call is cancelled once nobody is waiting on it.
+"""
+
+import asyncio
+import copy
+import os
+from typing import Any, Awaitable, Callable, Dict
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """In-flight calls by key, shared by every concurrent caller with that key."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[str, Flight] = {}
+        self._metrics = {
+            "calls": 0,
+            "coalesced": 0,
+            "failed": 0,
+            "abandoned": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "SingleFlight":
+        return cls(enabled=SINGLE_FLIGHT_ENABLED)
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await call() - or, if a call with this key is already in flight,
+        that one. Callers that joined a flight get a deep copy of its result.
+        """
+        if not self.enabled:
+            return await call()
+
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self._metrics["calls"] += 1
+        else:
+            self._metrics["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            # Shielded: one waiter being cancelled must not cancel the shared call
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                self._metrics["abandoned"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+        return result if leader else copy.deepcopy(result)
+
+    def _finish(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            self._metrics["failed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self._metrics["calls"] + self._metrics["coalesced"]
+        return {
+            **self._metrics,
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "coalesce_rate": round(self._metrics["coalesced"] / requests, 4) if requests else 0.0,
+        }
+
+
+single_flight = SingleFlight.from_env()
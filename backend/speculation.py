@@ -0,0 +1,215 @@
+"""
+Speculative refinement of freshly created task trees.
+
+Most users accept the stage 1 tree as it is and click Refine. With
+SPECULATIVE_REFINE_ENABLED=true the server starts refining the tree in
+the background as soon as create-task-tree returns it, keyed by the
+tree's content hash. The work lands in the refine memo, task by task, so
+when /api/refine-task-tree arrives it waits for any job refining one of
+its tasks and then finds those tasks in the memo. That works for the
+identical tree and for one the user edited.
+
+At most SPECULATIVE_REFINE_MAX_JOBS jobs run at once (more are skipped,
+not queued) and finished jobs are remembered for
+SPECULATIVE_REFINE_TTL_SECONDS so their use can be counted. A job that
+is cancelled or expires without a refine request using it counts as
+wasted.
+"""
+
+import asyncio
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+import interactive_planner
+from tree_hash import tree_hash
+
+SPECULATIVE_REFINE_ENABLED = os.getenv("SPECULATIVE_REFINE_ENABLED", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_REFINE_MAX_JOBS = int(os.getenv("SPECULATIVE_REFINE_MAX_JOBS", "2"))
+SPECULATIVE_REFINE_TTL_SECONDS = float(os.getenv("SPECULATIVE_REFINE_TTL_SECONDS", "900"))
+SPECULATIVE_REFINE_MAX_ENTRIES = 256
+
+
+def refine_memo_keys(task_tree: Dict[str, Any]) -> Set[str]:
+    """Refine memo key of every task in the tree."""
+    return {
+        interactive_planner.refine_memo_key(category, project, task)
+        for category in task_tree.get("categories") or []
+        for project in category.get("projects") or []
+        for task in project.get("tasks") or []
+    }
+
+
+class SpeculativeJob:
+    __slots__ = ("key", "task_keys", "task", "created_at", "used")
+
+    def __init__(self, key: str, task_keys: Set[str], task: "asyncio.Task"):
+        self.key = key
+        self.task_keys = task_keys
+        self.task = task
+        self.created_at = time.time()
+        self.used = False
+
+
+class SpeculativeRefiner:
+    """Background refine jobs for trees the user has not asked to refine yet."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_jobs: int = 2,
+        ttl_seconds: float = 900,
+        max_entries: int = SPECULATIVE_REFINE_MAX_ENTRIES
+    ):
+        self.enabled = enabled
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._jobs: "OrderedDict[str, SpeculativeJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "started": 0,
+            "skipped_at_capacity": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            # Per refine request
+            "used_identical": 0,
+            "used_partial": 0,
+            "joined_in_flight": 0,
+            # Per job
+            "jobs_used": 0,
+            "wasted": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "SpeculativeRefiner":
+        return cls(
+            enabled=SPECULATIVE_REFINE_ENABLED,
+            max_jobs=SPECULATIVE_REFINE_MAX_JOBS,
+            ttl_seconds=SPECULATIVE_REFINE_TTL_SECONDS,
+        )
+
+    def _running(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.task.done())
+
+    def _drop(self, key: str) -> None:
+        job = self._jobs.pop(key)
+        if not job.used:
+            self._metrics["wasted"] += 1
+
+    def _prune(self) -> None:
+        """Forget finished jobs past their TTL, and the oldest finished ones over max_entries."""
+        now = time.time()
+        for key, job in list(self._jobs.items()):
+            if job.task.done() and now - job.created_at > self.ttl_seconds:
+                self._drop(key)
+        for key, job in list(self._jobs.items()):
+            if len(self._jobs) <= self.max_entries:
+                break
+            if job.task.done():
+                self._drop(key)
+
+    def start(self, task_tree: Dict[str, Any], requested: Optional[bool] = None) -> Optional[str]:
+        """
+        Start refining task_tree in the background (requested overrides the
+        server default). Returns the job key (the tree's content hash), or
+        None if no job was started.
+        """
+        if not (self.enabled if requested is None else requested) or not interactive_planner.refine_memo.enabled:
+            return None
+        if not task_tree.get("categories"):
+            return None
+
+        key = tree_hash(task_tree)
+        with self._lock:
+            self._prune()
+            if key in self._jobs:
+                return key
+            if self._running() >= self.max_jobs:
+                self._metrics["skipped_at_capacity"] += 1
+                return None
+            task = asyncio.create_task(self._run(copy.deepcopy(task_tree)))
+            self._jobs[key] = SpeculativeJob(key, refine_memo_keys(task_tree), task)
+            self._metrics["started"] += 1
+        return key
+
+    async def _run(self, task_tree: Dict[str, Any]) -> None:
+        try:
+            await interactive_planner.refine_task_tree_incremental(task_tree, use_cache=True)
+        except Exception as e:
+            print(f"Speculative refine failed: {e}")
+            with self._lock:
+                self._metrics["failed"] += 1
+            return
+        with self._lock:
+            self._metrics["completed"] += 1
+
+    async def join(self, task_tree: Dict[str, Any]) -> Optional[str]:
+        """
+        Before refining task_tree: wait for every job refining any of its
+        tasks, so they come out of the refine memo. Returns "identical",
+        "partial" or None, for how the speculation was used.
+        """
+        with self._lock:
+            self._prune()
+            if not self._jobs:
+                return None
+            key = tree_hash(task_tree)
+            task_keys = refine_memo_keys(task_tree)
+            overlapping = [job for job in self._jobs.values() if job.key == key or job.task_keys & task_keys]
+            if not overlapping:
+                return None
+            usage = "identical" if any(job.key == key for job in overlapping) else "partial"
+            pending = [job.task for job in overlapping if not job.task.done()]
+            for job in overlapping:
+                if not job.used:
+                    job.used = True
+                    self._metrics["jobs_used"] += 1
+            self._metrics[f"used_{usage}"] += 1
+            if pending:
+                self._metrics["joined_in_flight"] += 1
+
+        if pending:
+            # Shielded: a refine request that goes away must not cancel the shared job
+            await asyncio.shield(asyncio.gather(*pending, return_exceptions=True))
+        return usage
+
+    def cancel(self, key: Optional[str] = None) -> int:
+        """Cancel the job for key (or every job); returns how many were still running."""
+        with self._lock:
+            keys = [key] if key is not None else list(self._jobs)
+            cancelled = 0
+            for job_key in keys:
+                if job_key not in self._jobs:
+                    continue
+                job = self._jobs[job_key]
+                if not job.task.done():
+                    job.task.cancel()
+                    cancelled += 1
+                self._drop(job_key)
+            self._metrics["cancelled"] += cancelled
+            return cancelled
+
+    def close(self) -> None:
+        self.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune()
+            used = self._metrics["jobs_used"]
+            settled = used + self._metrics["wasted"]
+            return {
+                **self._metrics,
+                "enabled": self.enabled,
+                "max_jobs": self.max_jobs,
+                "running": self._running(),
+                "retained": len(self._jobs),
+                "use_rate": round(used / settled, 4) if settled else 0.0,
+            }
+
+
+speculative_refiner = SpeculativeRefiner.from_env()
@@ -0,0 +1,104 @@
+"""
+Helpers for streaming planner output to the client.
+
+IncrementalTreeParser watches a task tree being generated as raw JSON text
+and reports each category and project as soon as its object is complete,
+so the server can forward them over Server-Sent Events long before the
+whole tree has been generated.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class IncrementalTreeParser:
+    """
+    Incrementally scan streamed task-tree JSON for completed nodes.
+
+    Tracks string/escape state and the container stack by hand, so each
+    chunk is only scanned once and nothing is re-parsed until an object
+    under categories[i] or categories[i].projects[j] closes. The two keys
+    can be overridden for schemas that use short keys.
+    """
+
+    def __init__(self, categories_key: str = "categories", projects_key: str = "projects"):
+        self.categories_key = categories_key
+        self.projects_key = projects_key
+        self.buffer = ""
+        self._pos = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        # Each frame: [opening char, start offset, key in parent, child count]
+        self._stack: List[list] = []
+        self._category_index = -1
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return any newly completed nodes."""
+        self.buffer += chunk
+        events = []
+        buffer = self.buffer
+
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start:self._pos]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos + 1
+            elif char == ":":
+                self._pending_key = self._last_string
+            elif char in "{[":
+                key = self._pending_key if self._stack and self._stack[-1][0] == "{" else None
+                if self._stack:
+                    self._stack[-1][3] += 1
+                self._stack.append([char, self._pos, key, 0])
+                self._pending_key = None
+            elif char in "}]":
+                frame = self._stack.pop() if self._stack else None
+                if frame is not None and char == "}":
+                    event = self._completed_node(frame)
+                    if event is not None:
+                        events.append(event)
+
+            self._pos += 1
+
+        return events
+
+    def _completed_node(self, frame: list) -> Optional[Dict[str, Any]]:
+        keys = [f[2] for f in self._stack]
+        text = self.buffer[frame[1]:self._pos + 1]
+
+        # root { categories [ <category> }
+        if len(self._stack) == 2 and keys[1] == self.categories_key:
+            self._category_index += 1
+            return {
+                "type": "category",
+                "category_index": self._category_index,
+                "node": json.loads(text),
+            }
+
+        # root { categories [ category { projects [ <project> }
+        if len(self._stack) == 4 and keys[1] == self.categories_key and keys[3] == self.projects_key:
+            return {
+                "type": "project",
+                "category_index": self._category_index + 1,
+                "project_index": self._stack[-1][3] - 1,
+                "node": json.loads(text),
+            }
+
+        return None
@@ -0,0 +1,209 @@
+"""
+SQLite-backed store for saved task trees.
+
+Trees are kept in one WAL-mode table with an INTEGER PRIMARY KEY (so get
+and delete are B-tree lookups) and an index on (created_at, id) for
+newest-first keyset pagination. Node counts and a content hash are stored
+alongside each tree so listings never have to load or parse tree bodies.
+Every uvicorn worker opens its own connection to the same file.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_cache import CACHE_DIR
+from tree_hash import tree_hash
+
+_SUMMARY_COLUMNS = (
+    "id, name, category_count, project_count, task_count, subtask_count, content_hash, created_at"
+)
+
+
+def node_counts(task_tree: Dict[str, Any]) -> Tuple[int, int, int, int]:
+    """Number of categories, projects, tasks and subtasks in a tree."""
+    categories = task_tree.get("categories") or []
+    projects = [project for category in categories for project in category.get("projects") or []]
+    tasks = [task for project in projects for task in project.get("tasks") or []]
+    subtasks = sum(len(task.get("subtasks") or []) for task in tasks)
+    return len(categories), len(projects), len(tasks), subtasks
+
+
+def encode_cursor(created_at: float, tree_id: int) -> str:
+    raw = json.dumps([created_at, tree_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode a pagination cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, tree_id = json.loads(raw)
+        return float(created_at), int(tree_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _timestamps(created_at: float) -> Dict[str, str]:
+    moment = datetime.fromtimestamp(created_at)
+    return {
+        "timestamp": moment.isoformat(),
+        "created_at": moment.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def _summary(row: tuple) -> Dict[str, Any]:
+    tree_id, name, categories, projects, tasks, subtasks, content_hash, created_at = row
+    return {
+        "id": tree_id,
+        "name": name,
+        "counts": {
+            "categories": categories,
+            "projects": projects,
+            "tasks": tasks,
+            "subtasks": subtasks,
+        },
+        "content_hash": content_hash,
+        **_timestamps(created_at),
+    }
+
+
+class TaskTreeStore:
+    """Persistent, paginated store of saved task trees."""
+
+    def __init__(self, db_path: str = "task_trees.db"):
+        self.db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TaskTreeStore":
+        """The default database path is resolved against the backend directory, like the caches'."""
+        return cls(db_path=os.getenv("TASK_TREE_DB_PATH", os.path.join(CACHE_DIR, "task_trees.db")))
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            # AUTOINCREMENT so IDs of deleted trees are never handed out again
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS task_trees ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " name TEXT,"
+                " category_count INTEGER NOT NULL,"
+                " project_count INTEGER NOT NULL,"
+                " task_count INTEGER NOT NULL,"
+                " subtask_count INTEGER NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_trees_created ON task_trees (created_at, id)"
+            )
+            self._db.commit()
+        return self._db
+
+    def save(self, task_tree: Dict[str, Any], name: Optional[str] = None) -> Dict[str, Any]:
+        """Store a tree and return its summary."""
+        counts = node_counts(task_tree)
+        content_hash = tree_hash(task_tree)
+        body = json.dumps(task_tree, ensure_ascii=False, separators=(",", ":"))
+        created_at = time.time()
+
+        with self._lock:
+            db = self._get_db()
+            cursor = db.execute(
+                "INSERT INTO task_trees (name, category_count, project_count, task_count,"
+                " subtask_count, content_hash, body, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, *counts, content_hash, body, created_at)
+            )
+            db.commit()
+            tree_id = cursor.lastrowid
+
+        return _summary((tree_id, name, *counts, content_hash, created_at))
+
+    def get(self, tree_id: int) -> Optional[Dict[str, Any]]:
+        """Summary plus the full tree, or None if there is no such tree."""
+        raw = self.get_raw(tree_id)
+        if raw is None:
+            return None
+        summary, body = raw
+        return {**summary, "task_tree": json.loads(body)}
+
+    def get_raw(self, tree_id: int) -> Optional[Tuple[Dict[str, Any], str]]:
+        """(summary, tree body as stored JSON text), or None."""
+        with self._lock:
+            row = self._get_db().execute(
+                f"SELECT {_SUMMARY_COLUMNS}, body FROM task_trees WHERE id = ?", (tree_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return _summary(row[:-1]), row[-1]
+
+    def get_summary(self, tree_id: int) -> Optional[Dict[str, Any]]:
+        """Summary only (no body), or None."""
+        with self._lock:
+            row = self._get_db().execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM task_trees WHERE id = ?", (tree_id,)
+            ).fetchone()
+        return _summary(row) if row is not None else None
+
+    @staticmethod
+    def etag(summary: Dict[str, Any]) -> str:
+        """
+        Entity tag for a saved tree. Saved trees are never modified in
+        place, so ID plus content hash identifies the representation.
+        """
+        return f'"{summary["id"]}-{summary["content_hash"]}"'
+
+    def delete(self, tree_id: int) -> bool:
+        """Delete a tree; returns False if there was no such tree."""
+        with self._lock:
+            db = self._get_db()
+            cursor = db.execute("DELETE FROM task_trees WHERE id = ?", (tree_id,))
+            db.commit()
+            return cursor.rowcount > 0
+
+    def list_page(self, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of tree summaries, newest first. Pass the returned
+        next_cursor to get the following page; it is None on the last one.
+        """
+        params: List[Any] = []
+        where = ""
+        if cursor:
+            where = "WHERE (created_at, id) < (?, ?)"
+            params.extend(decode_cursor(cursor))
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._get_db().execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM task_trees {where}"
+                " ORDER BY created_at DESC, id DESC LIMIT ?",
+                params
+            ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][7], rows[-1][0]) if has_more else None
+        return {"task_trees": [_summary(row) for row in rows], "next_cursor": next_cursor}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._get_db().execute("SELECT COUNT(*) FROM task_trees").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+task_tree_store = TaskTreeStore.from_env()
@@ -0,0 +1,352 @@
+"""
+Token estimation and pre-flight budgeting for LLM calls.
+
+count_tokens uses tiktoken when its encoding was loaded at startup
+(load_encodings) and otherwise falls back to a characters-per-token
+estimate. TokenBudgeter.plan predicts
+a call's input and output size before it is sent: input from the prompt,
+output from the text the output is derived from (the brain dump or tree
+outline) times a per-kind ratio. It then picks max_tokens to fit and says
+whether the call fits the model at all, so callers can chunk or shard
+instead. max_tokens never goes below TOKEN_BUDGET_MIN_MAX_TOKENS, and
+invoke() retries a call once at the model's output ceiling when its output
+was cut off at max_tokens. measure() records the actual usage the provider reports next to
+the prediction, and the per-kind ratios follow what is observed; input
+tokens the provider served from its prompt cache are counted separately.
+"""
+
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from langchain_core.callbacks import get_usage_metadata_callback
+
+TOKEN_BUDGET_ENABLED = os.getenv("TOKEN_BUDGET_ENABLED", "true").lower() in ("1", "true", "yes")
+TOKEN_BUDGET_HEADROOM = float(os.getenv("TOKEN_BUDGET_HEADROOM", "1.5"))
+# Lowest max_tokens a budget picks, however short the input
+TOKEN_BUDGET_MIN_MAX_TOKENS = int(os.getenv("TOKEN_BUDGET_MIN_MAX_TOKENS", "4096"))
+
+# Heuristic fallback when no tokenizer is available
+CHARS_PER_TOKEN = 4.0
+
+# (context window, max output tokens) by model name prefix; longest prefix wins
+MODEL_LIMITS = {
+    "gpt-4o-mini": (128000, 16384),
+    "gpt-4o": (128000, 16384),
+    "gpt-4.1": (1047576, 32768),
+    "gemini-1.5": (1048576, 8192),
+    "gemini-2.0-flash": (1048576, 8192),
+    "gemini-2.5": (1048576, 65536),
+}
+DEFAULT_MODEL_LIMITS = (128000, 16384)
+
+# Expected output tokens per token of the text a call's output is derived from
+DEFAULT_OUTPUT_RATIOS = {
+    "create": 4.0,      # brain dump -> task tree
+    "merge": 4.0,       # existing outline + brain dump -> whole merged tree
+    "delta": 4.0,       # brain dump -> new items only
+    "validate": 4.0,    # new tree outline -> corrected tree
+    "refine": 8.0,      # shard outline -> tree with subtasks added
+    "task_list": 3.0,   # task tree outline -> flat list of timed tasks
+    "task_list_edit": 1.5,  # task list -> revised task list
+    "priorities": 0.5,  # task list -> one score per task
+    "fused_plan": 8.0,  # brain dump -> task tree with timed subtasks
+}
+DEFAULT_OUTPUT_RATIO = 4.0
+OUTPUT_OVERHEAD_TOKENS = 64
+
+# max_tokens is rounded up to one of these so only a few clients get built
+MAX_TOKENS_STEPS = (1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+# Observed ratios take over after this many samples (exponential moving average)
+RATIO_MIN_SAMPLES = 3
+RATIO_SMOOTHING = 0.2
+
+# Provider errors that mean the output stopped at max_tokens (matched by name,
+# so openai versions without them still work)
+TRUNCATION_ERRORS = ("LengthFinishReasonError",)
+
+# Encoding used for models tiktoken does not know (e.g. Gemini)
+DEFAULT_ENCODING = "o200k_base"
+
+# Loaded tiktoken encodings by name; filled once at startup by load_encodings
+_encodings: Dict[str, Any] = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding_name(model: Optional[str]) -> str:
+    try:
+        from tiktoken.model import encoding_name_for_model
+        return encoding_name_for_model(model) if model else DEFAULT_ENCODING
+    except (ImportError, KeyError):
+        return DEFAULT_ENCODING
+
+
+def load_encodings(*models: Optional[str]) -> None:
+    """
+    Load the tiktoken encodings for these models (and the default one).
+    The first load downloads the encoding file, so this runs once at
+    startup, in a worker thread; on failure tokens are estimated instead.
+    """
+    with _encodings_lock:
+        for name in {DEFAULT_ENCODING, *(_encoding_name(model) for model in models)}:
+            if name in _encodings:
+                continue
+            try:
+                import tiktoken
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                print(f"tiktoken encoding {name} unavailable ({type(e).__name__}), estimating tokens from length")
+
+
+def _encoding(model: Optional[str]) -> Any:
+    """
+    Loaded tiktoken encoding for model, or None. Never loads one itself, so
+    counting tokens on a request path cannot block on a download.
+    """
+    return _encodings.get(_encoding_name(model)) or _encodings.get(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count of text for model, exact with tiktoken, estimated otherwise."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def model_limits(model: Optional[str]) -> Tuple[int, int]:
+    """(context window, max output tokens) for a model name."""
+    best = None
+    for prefix in MODEL_LIMITS:
+        if (model or "").startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return MODEL_LIMITS[best] if best else DEFAULT_MODEL_LIMITS
+
+
+def _output_option(config: Dict[str, Any]) -> str:
+    return "max_output_tokens" if config.get("provider") == "gemini" else "max_tokens"
+
+
+class TokenBudget:
+    """Predicted size of one LLM call and the max_tokens chosen for it."""
+
+    __slots__ = (
+        "kind", "input_tokens", "basis_tokens", "predicted_output",
+        "max_tokens", "context_window", "output_ceiling", "enforced",
+    )
+
+    def __init__(
+        self, kind, input_tokens, basis_tokens, predicted_output, max_tokens, context_window, output_ceiling,
+        enforced=True
+    ):
+        self.kind = kind
+        self.input_tokens = input_tokens
+        self.basis_tokens = basis_tokens
+        self.predicted_output = predicted_output
+        self.max_tokens = max_tokens
+        self.context_window = context_window
+        self.output_ceiling = output_ceiling
+        self.enforced = enforced
+
+    @property
+    def needed_output(self) -> int:
+        return math.ceil(self.predicted_output * TOKEN_BUDGET_HEADROOM)
+
+    @property
+    def pieces(self) -> int:
+        """How many pieces the call has to be split into to fit (1 = fits as is)."""
+        if not self.enforced:
+            return 1
+        by_output = self.needed_output / self.output_ceiling
+        by_context = (self.input_tokens + self.needed_output) / self.context_window
+        return max(1, math.ceil(max(by_output, by_context)))
+
+    @property
+    def fits(self) -> bool:
+        return self.pieces == 1
+
+    def at_ceiling(self) -> "TokenBudget":
+        """The same budget with max_tokens raised to the output ceiling."""
+        return TokenBudget(
+            self.kind, self.input_tokens, self.basis_tokens, self.predicted_output, self.output_ceiling,
+            self.context_window, self.output_ceiling, enforced=self.enforced
+        )
+
+    def __repr__(self) -> str:
+        return (f"TokenBudget({self.kind}: input {self.input_tokens}, predicted output "
+                f"{self.predicted_output}, max_tokens {self.max_tokens}, pieces {self.pieces})")
+
+
+class TokenBudgeter:
+    """Plans max_tokens per call and keeps predicted vs. actual usage per kind."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._ratios: Dict[str, float] = {}
+        self._ratio_samples: Dict[str, list] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls) -> "TokenBudgeter":
+        return cls(enabled=TOKEN_BUDGET_ENABLED)
+
+    def output_ratio(self, kind: str) -> float:
+        with self._lock:
+            return self._ratios.get(kind, DEFAULT_OUTPUT_RATIOS.get(kind, DEFAULT_OUTPUT_RATIO))
+
+    def plan(self, kind: str, prompt: str, basis: str, config: Dict[str, Any]) -> TokenBudget:
+        """
+        Budget for a call of this kind with this prompt, whose output is
+        derived from basis, on the model described by config (an LLM config
+        dict; its max_tokens / max_output_tokens is the output ceiling).
+        """
+        model = config.get("model")
+        context_window, model_max_output = model_limits(model)
+        output_ceiling = min(config.get(_output_option(config)) or model_max_output, model_max_output)
+        input_tokens = count_tokens(prompt, model)
+        basis_tokens = count_tokens(basis, model)
+        predicted_output = math.ceil(basis_tokens * self.output_ratio(kind)) + OUTPUT_OVERHEAD_TOKENS
+
+        if self.enabled:
+            needed = max(math.ceil(predicted_output * TOKEN_BUDGET_HEADROOM), TOKEN_BUDGET_MIN_MAX_TOKENS)
+            max_tokens = next((step for step in MAX_TOKENS_STEPS if step >= needed), needed)
+            max_tokens = min(max_tokens, output_ceiling)
+        else:
+            max_tokens = output_ceiling
+
+        return TokenBudget(
+            kind, input_tokens, basis_tokens, predicted_output, max_tokens, context_window, output_ceiling,
+            enforced=self.enabled
+        )
+
+    def apply(self, config: Dict[str, Any], budget: Optional[TokenBudget]) -> Dict[str, Any]:
+        """Copy of an LLM config with the budget's max_tokens set."""
+        if budget is None or not self.enabled:
+            return config
+        return {**config, _output_option(config): budget.max_tokens}
+
+    @contextmanager
+    def measure(self, budget: Optional[TokenBudget]):
+        """
+        Record the usage reported by LLM calls made inside the block against
+        budget, even if the block fails. Yields a dict whose output_tokens is
+        filled in when the block exits.
+        """
+        measured = {"output_tokens": 0}
+        if budget is None:
+            yield measured
+            return
+        try:
+            with get_usage_metadata_callback() as callback:
+                yield measured
+        finally:
+            usage = callback.usage_metadata
+            if usage:
+                measured["output_tokens"] = sum(u.get("output_tokens", 0) for u in usage.values())
+                self.record(
+                    budget,
+                    sum(u.get("input_tokens", 0) for u in usage.values()),
+                    measured["output_tokens"],
+                    sum((u.get("input_token_details") or {}).get("cache_read", 0) for u in usage.values()),
+                )
+
+    def truncated(self, budget: Optional[TokenBudget], error: Exception, output_tokens: int) -> bool:
+        """
+        Whether a failed call failed because its output hit budget's
+        max_tokens (and a larger max_tokens is possible).
+        """
+        if budget is None or not self.enabled or budget.max_tokens >= budget.output_ceiling:
+            return False
+        return type(error).__name__ in TRUNCATION_ERRORS or output_tokens >= budget.max_tokens
+
+    async def invoke(
+        self,
+        budget: Optional[TokenBudget],
+        call: Callable[[Optional[TokenBudget]], Awaitable[Any]]
+    ) -> Any:
+        """
+        Await call(budget) with its usage measured. If it fails because the
+        output was cut off at max_tokens (a length finish, or a parse error
+        after using every output token), retry once with max_tokens at the
+        model's output ceiling.
+        """
+        try:
+            with self.measure(budget) as measured:
+                return await call(budget)
+        except Exception as e:
+            if not self.truncated(budget, e, measured["output_tokens"]):
+                raise
+            print(f"Output cut off at max_tokens {budget.max_tokens} ({type(e).__name__}), "
+                  f"retrying at {budget.output_ceiling}")
+        with self._lock:
+            self._kind_stats(budget.kind)["retried_at_ceiling"] += 1
+        retry = budget.at_ceiling()
+        with self.measure(retry):
+            return await call(retry)
+
+    def _kind_stats(self, kind: str) -> Dict[str, Any]:
+        return self._stats.setdefault(kind, {
+            "calls": 0,
+            "predicted_input_tokens": 0,
+            "actual_input_tokens": 0,
+            "cached_input_tokens": 0,
+            "predicted_output_tokens": 0,
+            "actual_output_tokens": 0,
+            "hit_max_tokens": 0,
+            "retried_at_ceiling": 0,
+        })
+
+    def record(self, budget: TokenBudget, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> None:
+        """Add one call's actual usage and update the kind's output ratio."""
+        with self._lock:
+            stats = self._kind_stats(budget.kind)
+            stats["calls"] += 1
+            stats["predicted_input_tokens"] += budget.input_tokens
+            stats["actual_input_tokens"] += input_tokens
+            stats["cached_input_tokens"] += cached_input_tokens
+            stats["predicted_output_tokens"] += budget.predicted_output
+            stats["actual_output_tokens"] += output_tokens
+            if output_tokens >= budget.max_tokens:
+                stats["hit_max_tokens"] += 1
+
+            if budget.basis_tokens:
+                observed = max(output_tokens - OUTPUT_OVERHEAD_TOKENS, 0) / budget.basis_tokens
+                if budget.kind in self._ratios:
+                    current = self._ratios[budget.kind]
+                    self._ratios[budget.kind] = current + RATIO_SMOOTHING * (observed - current)
+                else:
+                    samples = self._ratio_samples.setdefault(budget.kind, [])
+                    samples.append(observed)
+                    if len(samples) >= RATIO_MIN_SAMPLES:
+                        self._ratios[budget.kind] = sum(samples) / len(samples)
+                        del self._ratio_samples[budget.kind]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = {}
+            for kind, stats in self._stats.items():
+                predicted = stats["predicted_output_tokens"]
+                kinds[kind] = {
+                    **stats,
+                    "output_ratio": round(
+                        self._ratios.get(kind, DEFAULT_OUTPUT_RATIOS.get(kind, DEFAULT_OUTPUT_RATIO)), 3
+                    ),
+                    "output_prediction_error": (
+                        round(stats["actual_output_tokens"] / predicted - 1, 4) if predicted else None
+                    ),
+                }
+            return {
+                "enabled": self.enabled,
+                "headroom": TOKEN_BUDGET_HEADROOM,
+                "tokenizer": "tiktoken" if any(_encodings.values()) else "estimate",
+                "kinds": kinds,
+            }
+
+
+token_budget = TokenBudgeter.from_env()
@@ -0,0 +1,56 @@
+"""
+Merkle-style content hashes for task tree nodes.
+
+A node's hash covers its kind, name, dependencies and the hashes of its
+children, but not its ID or any UI-only fields, so two subtrees with the
+same content hash identically no matter where their IDs came from, and
+editing one task only changes the hashes on its path to the root.
+
+The refine memo is keyed per task (task_hash, see
+interactive_planner.refine_memo_key); tree_hash keys the task tree store
+and speculative refines.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict
+
+
+def _digest(*parts: Any) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def subtask_hash(subtask: Dict[str, Any]) -> str:
+    return _digest("subtask", subtask.get("name"), subtask.get("dependencies") or [])
+
+
+def task_hash(task: Dict[str, Any]) -> str:
+    return _digest(
+        "task",
+        task.get("name"),
+        task.get("dependencies") or [],
+        [subtask_hash(s) for s in task.get("subtasks") or []],
+    )
+
+
+def project_hash(project: Dict[str, Any]) -> str:
+    return _digest(
+        "project",
+        project.get("name"),
+        project.get("dependencies") or [],
+        [task_hash(t) for t in project.get("tasks") or []],
+    )
+
+
+def category_hash(category: Dict[str, Any]) -> str:
+    return _digest(
+        "category",
+        category.get("name"),
+        [project_hash(p) for p in category.get("projects") or []],
+    )
+
+
+def tree_hash(task_tree: Dict[str, Any]) -> str:
+    return _digest("tree", [category_hash(c) for c in task_tree.get("categories") or []])
+
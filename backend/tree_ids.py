@@ -0,0 +1,88 @@
+"""
+Carrying node IDs over from one task tree to another.
+
+When a tree is regenerated (merged, refined), nodes keep the ID of the
+node with the same name path (category > project > task > subtask) in the
+previous tree. The previous tree is indexed once as nested dicts, name ->
+[ID, children index], so matching a node is one lookup of its (already
+hashed) name in its parent's children instead of formatting and hashing
+the whole path. A CompactTree caches its index, so it is built only once
+however many trees take IDs from it.
+"""
+
+import uuid
+from typing import Any, Dict, List, Optional, Union
+
+from compact_tree import CompactTree
+
+# name -> [node ID, index of the node's children]
+NameIndex = Dict[Optional[str], List[Any]]
+
+_EMPTY: NameIndex = {}
+
+
+def name_index(task_tree: Dict[str, Any]) -> NameIndex:
+    """Index every node ID of task_tree by its name path; the last ID seen on a path wins."""
+    index: NameIndex = {}
+    # Explicit loops per level: this runs on every merge and refine of large trees
+    for category in task_tree.get("categories") or []:
+        cat_entry = index.get(category.get("name"))
+        if cat_entry is None:
+            cat_entry = index[category.get("name")] = [None, {}]
+        cat_entry[0] = category.get("id")
+        projects = cat_entry[1]
+        for project in category.get("projects") or []:
+            proj_entry = projects.get(project.get("name"))
+            if proj_entry is None:
+                proj_entry = projects[project.get("name")] = [None, {}]
+            proj_entry[0] = project.get("id")
+            tasks = proj_entry[1]
+            for task in project.get("tasks") or []:
+                task_entry = tasks.get(task.get("name"))
+                if task_entry is None:
+                    task_entry = tasks[task.get("name")] = [None, {}]
+                task_entry[0] = task.get("id")
+                subtasks = task_entry[1]
+                for subtask in task.get("subtasks") or []:
+                    sub_entry = subtasks.get(subtask.get("name"))
+                    if sub_entry is None:
+                        sub_entry = subtasks[subtask.get("name")] = [None, None]
+                    sub_entry[0] = subtask.get("id")
+    return index
+
+
+def assign_ids(
+    task_tree: Dict[str, Any],
+    existing_tree: Union[Dict[str, Any], CompactTree, None] = None,
+    keep_ids: bool = False
+) -> Dict[str, Any]:
+    """
+    Assign IDs to every node of task_tree in place, keeping the ID of the
+    node at the same name path in existing_tree (nested JSON or a
+    CompactTree); other nodes (and every descendant of an unmatched node)
+    get a fresh UUID. With keep_ids, nodes that already have an ID keep it.
+    """
+    if isinstance(existing_tree, CompactTree):
+        index = existing_tree.name_index()
+    else:
+        index = name_index(existing_tree) if existing_tree else _EMPTY
+    for category in task_tree.get("categories") or []:
+        cat_entry = index.get(category.get("name"))
+        if not (keep_ids and category.get("id")):
+            category["id"] = (cat_entry and cat_entry[0]) or str(uuid.uuid4())
+        projects = cat_entry[1] if cat_entry else _EMPTY
+        for project in category.get("projects") or []:
+            proj_entry = projects.get(project.get("name"))
+            if not (keep_ids and project.get("id")):
+                project["id"] = (proj_entry and proj_entry[0]) or str(uuid.uuid4())
+            tasks = proj_entry[1] if proj_entry else _EMPTY
+            for task in project.get("tasks") or []:
+                task_entry = tasks.get(task.get("name"))
+                if not (keep_ids and task.get("id")):
+                    task["id"] = (task_entry and task_entry[0]) or str(uuid.uuid4())
+                subtasks = task_entry[1] if task_entry else _EMPTY
+                for subtask in task.get("subtasks") or []:
+                    sub_entry = subtasks.get(subtask.get("name"))
+                    if not (keep_ids and subtask.get("id")):
+                        subtask["id"] = (sub_entry and sub_entry[0]) or str(uuid.uuid4())
+    return task_tree
@@ -0,0 +1,107 @@
+"""
+Token-efficient outline encoding of task trees for prompts.
+
+Trees are written one item per line, with the level given by a short
+marker instead of nested JSON; empty fields are dropped. When the model
+needs to refer back to existing items, each one gets a short handle
+(c1, p3, t12, s40) in place of its UUID, and restore_ids maps the handles
+in the model's output back to the original IDs.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+OUTLINE_FORMAT = (
+    "Outline format: '#' = category, '##' = project, '-' = task, indented '-' = subtask; "
+    "'(after: ...)' lists an item's dependencies."
+)
+
+HANDLE_FORMAT = (
+    "The [handle] after an item's name identifies it: copy it into that item's id field "
+    "(use an empty id for new items)."
+)
+
+_MARKERS = ("# ", "## ", "- ", "  - ")
+_HANDLE_PREFIXES = ("c", "p", "t", "s")
+_CHILD_KEYS = ("projects", "tasks", "subtasks", None)
+
+
+def _line(level: int, node: Dict[str, Any], handle: Optional[str]) -> str:
+    line = f"{_MARKERS[level]}{node.get('name')}"
+    if handle:
+        line += f" [{handle}]"
+    dependencies = node.get("dependencies")
+    if dependencies:
+        line += f" (after: {'; '.join(dependencies)})"
+    return line
+
+
+def _encode(task_tree: Dict[str, Any], with_handles: bool) -> Tuple[str, Dict[str, str]]:
+    lines: List[str] = []
+    handles: Dict[str, str] = {}
+    counters = [0, 0, 0, 0]
+
+    def visit(node: Dict[str, Any], level: int) -> None:
+        handle = None
+        if with_handles and node.get("id"):
+            counters[level] += 1
+            handle = f"{_HANDLE_PREFIXES[level]}{counters[level]}"
+            handles[handle] = node["id"]
+        lines.append(_line(level, node, handle))
+        child_key = _CHILD_KEYS[level]
+        if child_key:
+            for child in node.get(child_key) or []:
+                visit(child, level + 1)
+
+    for category in task_tree.get("categories") or []:
+        visit(category, 0)
+    return "\n".join(lines), handles
+
+
+def tree_outline(task_tree: Dict[str, Any]) -> str:
+    """Outline of a task tree with names and dependencies only (no IDs)."""
+    return _encode(task_tree, with_handles=False)[0]
+
+
+def tree_outline_with_handles(task_tree: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+    """Outline plus a {handle: id} map for every item that has an ID."""
+    return _encode(task_tree, with_handles=True)
+
+
+def restore_ids(task_tree: Dict[str, Any], handles: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Replace handles the model echoed in id fields with the original IDs, in
+    place. Unknown handles, handles on the wrong level and repeats of a
+    handle already used are cleared to None so fresh IDs get assigned.
+    """
+    used = set()
+
+    def visit(node: Dict[str, Any], level: int) -> None:
+        handle = node.get("id")
+        if (
+            handle in handles
+            and handle not in used
+            and handle.startswith(_HANDLE_PREFIXES[level])
+        ):
+            node["id"] = handles[handle]
+            used.add(handle)
+        else:
+            node["id"] = None
+        child_key = _CHILD_KEYS[level]
+        if child_key:
+            for child in node.get(child_key) or []:
+                visit(child, level + 1)
+
+    for category in task_tree.get("categories") or []:
+        visit(category, 0)
+    return task_tree
+
+
+def task_list_outline(tasks: List[Dict[str, Any]], numbered: bool = False) -> str:
+    """One line per planned task: name (minutes, status), bulleted or numbered from 1."""
+    lines = []
+    for number, task in enumerate(tasks, 1):
+        details = [f"{task['time']} min" if task.get("time") is not None else None, task.get("status")]
+        details = ", ".join(d for d in details if d)
+        marker = f"{number}." if numbered else "-"
+        lines.append(f"{marker} {task.get('name')} ({details})" if details else f"{marker} {task.get('name')}")
+    return "\n".join(lines)
@@ -275,6 +275,7 @@ function addBrainDump() {
     const fileInput = document.createElement('input');
     fileInput.type = 'file';
     fileInput.accept = 'image/*';
+    fileInput.multiple = true;
     fileInput.style.display = 'none';
     
     const deleteBtn = document.createElement('button');
@@ -461,9 +462,79 @@ function deleteBrainDump(id) {
     });
 }
 
+async function extractTextFromImage(file) {
+    // Create FormData to send the file
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    // Send to backend API
+    const response = await fetch(`${API_BASE_URL}/api/extract-text-from-image`, {
+        method: 'POST',
+        body: formData
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Failed to extract text');
+    }
+    
+    const data = await response.json();
+    return data.text.trim();
+}
+
+async function extractTextFromImages(files, onProgress) {
+    // Batch endpoint: pages are extracted concurrently and streamed back as they finish
+    const formData = new FormData();
+    files.forEach(file => formData.append('files', file));
+    
+    const response = await fetch(`${API_BASE_URL}/api/extract-text-from-images`, {
+        method: 'POST',
+        body: formData
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Failed to extract text');
+    }
+    
+    const texts = new Array(files.length).fill('');
+    const failed = [];
+    let finished = 0;
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Server-sent events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const block of events) {
+            const type = (block.match(/^event: (.*)$/m) || [])[1];
+            const data = (block.match(/^data: (.*)$/m) || [])[1];
+            if (!data) continue;
+            const payload = JSON.parse(data);
+            if (type === 'page') {
+                texts[payload.index] = payload.text.trim();
+            } else if (type === 'page_error') {
+                failed.push(payload.filename || `image ${payload.index + 1}`);
+            } else {
+                continue;
+            }
+            finished += 1;
+            onProgress(finished);
+        }
+    }
+    
+    return { texts, failed };
+}
+
 async function handleImageUpload(event, brainDump) {
-    const file = event.target.files[0];
-    if (!file) return;
+    const files = Array.from(event.target.files);
+    if (files.length === 0) return;
     
     // Reset the file input so the same file can be uploaded again if needed
     event.target.value = '';
@@ -475,23 +546,18 @@ async function handleImageUpload(event, brainDump) {
     brainDump.uploadBtn.title = 'Extracting text...';
     
     try {
-        // Create FormData to send the file
-        const formData = new FormData();
-        formData.append('file', file);
-        
-        // Send to backend API
-        const response = await fetch(`${API_BASE_URL}/api/extract-text-from-image`, {
-            method: 'POST',
-            body: formData
-        });
-        
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.detail || 'Failed to extract text');
+        let texts = [];
+        let failed = [];
+        if (files.length === 1) {
+            texts = [await extractTextFromImage(files[0])];
+        } else {
+            ({ texts, failed } = await extractTextFromImages(files, (finished) => {
+                brainDump.uploadBtn.title = `Extracting text (${finished}/${files.length})...`;
+            }));
         }
         
-        const data = await response.json();
-        const extractedText = data.text.trim();
+        // Pages are appended in upload order, whatever order they finished in
+        const extractedText = texts.filter(text => text).join('\n\n');
         
         if (extractedText) {
             // Append to existing text with a newline if there's already content
@@ -504,10 +570,14 @@ async function handleImageUpload(event, brainDump) {
             brainDump.autoResize();
             
             showSuccess('Text extracted successfully!');
-        } else {
+        } else if (failed.length === 0) {
             alert('No text found in the image. Please try another image.');
         }
         
+        if (failed.length > 0) {
+            alert(`Failed to extract text from: ${failed.join(', ')}`);
+        }
+        
     } catch (error) {
         console.error('Error processing image:', error);
         alert(`Failed to extract text from image: ${error.message}`);
@@ -567,7 +637,7 @@ async function generatePlan() {
             existing_task_tree: currentTaskTree // Include existing task tree if loaded
         };
 
-        const response = await fetch(`${API_BASE_URL}/api/create-task-tree`, {
+        const response = await fetch(`${API_BASE_URL}/api/create-task-tree?fields=task_tree,stage`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -640,7 +710,7 @@ async function refineTaskTree(mode = 'all') {
     outputArea.style.display = 'none';
 
     try {
-        const response = await fetch(`${API_BASE_URL}/api/refine-task-tree`, {
+        const response = await fetch(`${API_BASE_URL}/api/refine-task-tree?fields=task_tree,stage,cached_node_ids`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -728,7 +798,7 @@ async function oldRefineTaskTree() {
     outputArea.style.display = 'none';
 
     try {
-        const response = await fetch(`${API_BASE_URL}/api/refine-task-tree`, {
+        const response = await fetch(`${API_BASE_URL}/api/refine-task-tree?fields=task_tree,stage,cached_node_ids`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',